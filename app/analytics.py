@@ -0,0 +1,425 @@
+"""
+Разовые аналитические отчёты по заявкам на NumPy.
+
+Вопросы вроде «средний чек по размеру и возрасту питомца» или «доля
+отмен по дню недели и часу» не ложатся на дневную сводку
+(app/rollup.py): им нужны поля питомца и доп. услуги каждой заявки.
+Поэтому колонки orders, pets и order_extra_services один раз читаются
+порциями по ANALYTICS_CHUNK строк в массивы NumPy, а группировки и
+гистограммы считаются векторно — bincount по составному ключу, без
+ORM-объекта на строку.
+
+Снимок колонок привязан к версии данных — сумме счётчиков
+change_counters для orders, pets, age_groups и order_extra_services.
+Пока она не изменилась, отчёты считаются по тому же снимку, а готовые
+результаты берутся из LRU-кэша по (отчёт, параметры, версия).
+
+После записи снимок не читается заново: из базы берутся только заявки
+с orders.version больше номера снимка (правка доп. услуг меняет версию
+заявки, app/changes.py) и надгробия удалённых, а колонки собираются в
+копии — отчёты по прежнему снимку в других потоках не замечают замены.
+Все питомцы перечитываются после правки pets, весь снимок — только в
+первый раз и если надгробия после его номера уже вычищены.
+
+    ANALYTICS_CHUNK       строк в порции при загрузке (100000)
+    ANALYTICS_CACHE_SIZE  результатов в кэше (64)
+"""
+import os
+import threading
+from collections import OrderedDict
+from copy import copy
+from datetime import date
+from itertools import chain
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.catalog import Catalog
+from app.changes import TOMBSTONES_TABLE, counters_state, read_counters, tombstones_floor
+from app.database import SessionLocal
+from app.models import OrderStatus, PetSize
+
+ANALYTICS_CHUNK = int(os.environ.get("ANALYTICS_CHUNK", "100000"))
+ANALYTICS_CACHE_SIZE = int(os.environ.get("ANALYTICS_CACHE_SIZE", "64"))
+
+ANALYTICS_TABLES = ("orders", "pets", "age_groups", "order_extra_services")
+
+# коды перечислений в массивах — порядковый номер члена Enum
+STATUSES = list(OrderStatus)
+SIZES = list(PetSize)
+STATUS_CODE = {s: i for i, s in enumerate(STATUSES)}
+CANCELED = STATUS_CODE[OrderStatus.canceled]
+
+# 1970-01-01 — четверг
+EPOCH_WEEKDAY = 3
+
+
+def _code(column: str, members: list) -> str:
+    # Enum хранится в SQLite по имени члена
+    cases = " ".join(f"WHEN '{m.name}' THEN {i}" for i, m in enumerate(members))
+    return f"CASE {column} {cases} ELSE -1 END"
+
+
+ORDERS_SELECT = (
+    "SELECT id, pet_id, master_id,"
+    " CAST(julianday(date) - 2440587.5 AS INTEGER),"
+    " CAST(substr(start_time, 1, 2) AS INTEGER),"
+    f" {_code('status', STATUSES)}, price"
+    " FROM orders"
+)
+PETS_SELECT = f"SELECT id, {_code('size', SIZES)}, age_group_id FROM pets"
+
+ORDERS_SQL = ORDERS_SELECT + " ORDER BY id"
+PETS_SQL = PETS_SELECT + " ORDER BY id"
+EXTRAS_SQL = (
+    "SELECT order_id, extra_service_id FROM order_extra_services"
+    " WHERE order_id IS NOT NULL AND extra_service_id IS NOT NULL"
+)
+
+# изменения после номера ? счётчика orders; без ORDER BY id — иначе
+# SQLite обходит всю таблицу по первичному ключу вместо ix_orders_version
+CHANGED_ORDERS_SQL = ORDERS_SELECT + " WHERE version > ?"
+CHANGED_PETS_SQL = (
+    PETS_SELECT + " WHERE id IN (SELECT pet_id FROM orders WHERE version > ?) ORDER BY id"
+)
+CHANGED_EXTRAS_SQL = (
+    "SELECT e.order_id, e.extra_service_id FROM order_extra_services e"
+    " JOIN orders o ON o.id = e.order_id"
+    " WHERE o.version > ? AND e.extra_service_id IS NOT NULL"
+)
+DELETED_SQL = f"SELECT DISTINCT order_id FROM {TOMBSTONES_TABLE} WHERE version > ?"
+
+ORDER_FIELDS = ("id", "pet_id", "master_id", "day", "hour", "status", "price")
+ORDER_DTYPES = [np.int64, np.int64, np.int32, np.int32, np.int8, np.int8, np.int64]
+PET_DTYPES = [np.int64, np.int8, np.int32]
+EXTRA_DTYPES = [np.int64, np.int64]
+
+
+def data_counters(db: Session) -> dict:
+    return read_counters(db, ANALYTICS_TABLES)
+
+
+def load_columns(
+    db: Session, sql: str, dtypes: list, params: tuple = (), chunk: int = ANALYTICS_CHUNK
+) -> list:
+    """
+    Результат запроса из целых чисел — список массивов по колонкам.
+    Строки читаются порциями: в памяти Python не больше chunk кортежей.
+    Курсор DBAPI, а не Result: обёртка Row на строку — треть времени.
+    """
+    width = len(dtypes)
+    parts = []
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk)
+            if not rows:
+                break
+            block = np.fromiter(
+                chain.from_iterable(rows), dtype=np.int64, count=len(rows) * width
+            ).reshape(len(rows), width)
+            parts.append([block[:, i].astype(dt) for i, dt in enumerate(dtypes)])
+    finally:
+        cursor.close()
+
+    if not parts:
+        return [np.empty(0, dtype=dt) for dt in dtypes]
+    return [np.concatenate(column) for column in zip(*parts)]
+
+
+# =====================================================
+# SNAPSHOT
+# =====================================================
+class OrderColumns:
+    """
+    Колонки всех заявок, отсортированные по id, с размером и возрастной
+    группой питомца на заявке; counters — номера изменений таблиц
+    ANALYTICS_TABLES, прочитанные до данных
+    """
+
+    def __init__(self, db: Session, counters: dict):
+        self.counters = counters
+        self.version = counters_state(counters)[0]
+
+        orders = load_columns(db, ORDERS_SQL, ORDER_DTYPES)
+        for name, column in zip(ORDER_FIELDS, orders):
+            setattr(self, name, column)
+        self.weekday = _weekday(self.day)
+        self._map_pets(*load_columns(db, PETS_SQL, PET_DTYPES))
+        self._set_extras(*_unique_pairs(*load_columns(db, EXTRAS_SQL, EXTRA_DTYPES)))
+
+    def updated(self, db: Session, counters: dict) -> "OrderColumns":
+        """
+        Снимок версии counters. Перечитываются только заявки с
+        orders.version больше номера снимка (правка доп. услуг тоже
+        меняет версию заявки), их питомцы и доп. услуги; удалённые
+        убираются по надгробиям. Питомцы всех заявок перечитываются,
+        только если менялась таблица pets. Сам снимок не меняется:
+        по нему в это время считают отчёты другие потоки.
+        """
+        since = self.counters["orders"][0]
+        changed = load_columns(db, CHANGED_ORDERS_SQL, ORDER_DTYPES, (since,))
+        order = np.argsort(changed[0])
+        changed = [column[order] for column in changed]
+        pets = load_columns(db, CHANGED_PETS_SQL, PET_DTYPES, (since,))
+        extras = load_columns(db, CHANGED_EXTRAS_SQL, EXTRA_DTYPES, (since,))
+        deleted, = load_columns(db, DELETED_SQL, [np.int64], (since,))
+
+        columns = copy(self)
+        columns.counters = counters
+        columns.version = counters_state(counters)[0]
+
+        # изменённые строки вставляются заново на место по id
+        touched = np.union1d(changed[0], deleted)
+        index, found = _positions(self.id, touched)
+        keep = np.ones(len(self), dtype=bool)
+        keep[index[found]] = False
+        at = np.searchsorted(self.id[keep], changed[0])
+        size, age_group_id = _pet_columns(*pets, changed[1])
+        fields = ORDER_FIELDS + ("size", "age_group_id")
+        for name, column in zip(fields, changed + [size, age_group_id]):
+            setattr(columns, name, np.insert(getattr(self, name)[keep], at, column))
+        columns.weekday = _weekday(columns.day)
+
+        if counters["pets"][0] != self.counters["pets"][0]:
+            columns._map_pets(*load_columns(db, PETS_SQL, PET_DTYPES))
+
+        _, found = _positions(touched, self._extra_order_id)
+        extra_order_id, extra_id = _unique_pairs(*extras)
+        at = np.searchsorted(self._extra_order_id[~found], extra_order_id)
+        columns._set_extras(
+            np.insert(self._extra_order_id[~found], at, extra_order_id),
+            np.insert(self._extra_service_id[~found], at, extra_id),
+        )
+        return columns
+
+    def _map_pets(self, pets_id: np.ndarray, pets_size: np.ndarray, pets_age: np.ndarray):
+        self.size, self.age_group_id = _pet_columns(pets_id, pets_size, pets_age, self.pet_id)
+
+    def _set_extras(self, order_id: np.ndarray, extra_id: np.ndarray):
+        """
+        Доп. услуги по id заявки и по позиции заявки в колонках —
+        по возрастанию позиции
+        """
+        self._extra_order_id = order_id
+        self._extra_service_id = extra_id
+        index, known = _positions(self.id, order_id)
+        self.extra_order = index[known]
+        self.extra_id = extra_id[known]
+
+    def __len__(self):
+        return len(self.id)
+
+    def select(
+        self,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        master_id: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Маска заявок периода и мастера
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if date_from:
+            mask &= self.day >= _epoch_day(date_from)
+        if date_to:
+            mask &= self.day <= _epoch_day(date_to)
+        if master_id:
+            mask &= self.master_id == master_id
+        return mask
+
+
+def _positions(ids: np.ndarray, keys: np.ndarray):
+    """
+    Позиции keys в отсортированном ids и маска найденных
+    """
+    if not len(ids):
+        return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+    index = np.searchsorted(ids, keys).clip(0, len(ids) - 1)
+    return index, ids[index] == keys
+
+
+def _pet_columns(pets_id, pets_size, pets_age, pet_id: np.ndarray):
+    """
+    Размер и возрастная группа питомца для каждой заявки; -1 и 0 —
+    питомца нет
+    """
+    index, found = _positions(pets_id, pet_id)
+    return (
+        np.where(found, pets_size[index], -1).astype(np.int8),
+        np.where(found, pets_age[index], 0).astype(np.int32),
+    )
+
+
+def _unique_pairs(order_id: np.ndarray, extra_id: np.ndarray):
+    """
+    Пары (заявка, услуга) без повторов, по возрастанию id заявки
+    """
+    width = int(extra_id.max(initial=0)) + 1
+    order_id, extra_id = np.divmod(np.unique(order_id * width + extra_id), width)
+    return order_id, extra_id.astype(np.int32)
+
+
+def _weekday(day: np.ndarray) -> np.ndarray:
+    return ((day + EPOCH_WEEKDAY) % 7).astype(np.int8)
+
+
+def _epoch_day(day: date) -> int:
+    return (day - date(1970, 1, 1)).days
+
+
+# =====================================================
+# REPORTS
+# =====================================================
+def average_ticket(columns: OrderColumns, catalog: Catalog, **params) -> list:
+    """
+    Средний чек (цена с доп. услугами) по размеру и возрастной группе
+    питомца; отменённые заявки не учитываются
+    """
+    mask = columns.select(**params) & (columns.status != CANCELED) & (columns.size >= 0)
+    # id возрастных групп малы: ключ размер * width + id без перекодировки
+    width = int(columns.age_group_id.max(initial=0)) + 1
+    key = columns.size[mask].astype(np.int64) * width + columns.age_group_id[mask]
+    orders = np.bincount(key, minlength=len(SIZES) * width)
+    revenue = np.bincount(key, weights=columns.price[mask], minlength=len(SIZES) * width)
+
+    result = []
+    for cell in np.flatnonzero(orders):
+        size, age_group_id = divmod(int(cell), width)
+        age_group = catalog.age_groups.get(age_group_id)
+        result.append({
+            "size": SIZES[size],
+            "age_group_id": age_group_id,
+            "age_group_name": age_group.name if age_group else None,
+            "orders": int(orders[cell]),
+            "revenue": int(revenue[cell]),
+            "average_ticket": round(float(revenue[cell] / orders[cell]), 2),
+        })
+    return result
+
+
+def extras_attach(columns: OrderColumns, catalog: Catalog, **params) -> dict:
+    """
+    Доля заявок с доп. услугами — всего и по каждой услуге;
+    отменённые заявки не учитываются
+    """
+    mask = columns.select(**params) & (columns.status != CANCELED)
+    orders = int(np.count_nonzero(mask))
+    attached = mask[columns.extra_order]
+    extra_order = columns.extra_order[attached]
+
+    # позиции отсортированы: заявка с доп. услугами — смена позиции
+    with_extras = int(np.count_nonzero(np.diff(extra_order))) + 1 if len(extra_order) else 0
+    counts = np.bincount(columns.extra_id[attached])
+    by_service = []
+    for extra_service_id in np.flatnonzero(counts).tolist():
+        count = int(counts[extra_service_id])
+        extra = catalog.extras.get(extra_service_id)
+        by_service.append({
+            "extra_service_id": extra_service_id,
+            "name": extra.name if extra else None,
+            "orders": count,
+            "attach_rate": round(count / orders, 4),
+        })
+    return {
+        "orders": orders,
+        "with_extras": with_extras,
+        "attach_rate": round(with_extras / orders, 4) if orders else 0.0,
+        "by_service": by_service,
+    }
+
+
+def cancellations(columns: OrderColumns, catalog: Catalog, **params) -> list:
+    """
+    Доля отмен по дню недели (0 — понедельник) и часу начала
+    """
+    mask = columns.select(**params)
+    key = columns.weekday[mask].astype(np.int64) * 24 + columns.hour[mask]
+    total = np.bincount(key, minlength=7 * 24)
+    canceled = np.bincount(key, weights=columns.status[mask] == CANCELED, minlength=7 * 24)
+
+    return [
+        {
+            "weekday": int(cell) // 24,
+            "hour": int(cell) % 24,
+            "orders": int(total[cell]),
+            "canceled": int(canceled[cell]),
+            "cancel_rate": round(float(canceled[cell] / total[cell]), 4),
+        }
+        for cell in np.flatnonzero(total)
+    ]
+
+
+REPORTS: Dict[str, Callable] = {
+    "average_ticket": average_ticket,
+    "extras_attach": extras_attach,
+    "cancellations": cancellations,
+}
+
+
+# =====================================================
+# CACHE
+# =====================================================
+class AnalyticsCache:
+    def __init__(self, size: int = ANALYTICS_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._columns: Optional[OrderColumns] = None
+        self._results: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def columns(self, db: Session, counters: dict) -> OrderColumns:
+        """
+        Снимок колонок версии counters; обновление — одно на все потоки.
+        Целиком заново снимок читается в первый раз, а также если
+        надгробия удалений после него уже вычищены (prune_tombstones)
+        """
+        version = counters_state(counters)[0]
+        columns = self._columns
+        if columns is not None and columns.version == version:
+            return columns
+
+        with self._load_lock:
+            columns = self._columns
+            if columns is None or columns.version != version:
+                # счётчики прочитаны до данных: снимок не старее их
+                since = columns.counters["orders"][0] if columns is not None else -1
+                if since < 0 or since > counters["orders"][0] or tombstones_floor(db) > since:
+                    columns = OrderColumns(db, counters)
+                else:
+                    columns = columns.updated(db, counters)
+                self._columns = columns
+            return columns
+
+    def report(self, name: str, catalog: Catalog, db: Optional[Session] = None, **params):
+        if db is None:
+            with SessionLocal() as db:
+                return self.report(name, catalog, db, **params)
+
+        counters = data_counters(db)
+        key = (name, tuple(sorted(params.items())), counters_state(counters)[0], catalog.changes)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return self._results[key]
+
+        result = REPORTS[name](self.columns(db, counters), catalog, **params)
+        with self._lock:
+            self.misses += 1
+            self._results[key] = result
+            while len(self._results) > self.size:
+                self._results.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._columns = None
+            self._results.clear()
+
+
+analytics_cache = AnalyticsCache()
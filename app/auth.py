@@ -1,12 +1,22 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from collections import OrderedDict, namedtuple
 from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import jwt, JWTError
 from passlib.context import CryptContext
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
+from app.changes import AUTH_TABLES, read_counters
 from app.database import SessionLocal
 from app.models import User
 
@@ -17,21 +27,31 @@ SECRET_KEY = "SECRET_KEY_CHANGE_ME"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# стоимость bcrypt: хэши с другой стоимостью пересчитываются при входе
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
+# отдельный пул для bcrypt, чтобы вход не занимал общий threadpool
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", "2"))
+HASH_QUEUE_LIMIT = int(os.environ.get("HASH_QUEUE_LIMIT", "16"))
+
+# кэш проверенных токенов
+AUTH_CACHE_SIZE = 1024
+AUTH_CACHE_TTL = 60  # секунд, не дольше exp токена
+# секунд между сверками счётчика users: правка пользователя в другом
+# процессе или прямым SQL снимает его токены из кэша не позже
+AUTH_CHECK_INTERVAL = float(os.environ.get("AUTH_CHECK_INTERVAL", "1"))
+
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-# =====================================================
-# DB
-# =====================================================
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # =====================================================
 # PASSWORD UTILS
 # =====================================================
@@ -42,6 +62,41 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+
+class HashingPool:
+    """
+    Пул для bcrypt с ограниченной очередью: если заняты все потоки
+    и очередь, запрос сразу получает 503, а не ждёт.
+
+    Место занимается на весь вход (slot), до поиска пользователя:
+    отклонённый запрос не берёт поток из общего threadpool, где его
+    ждали бы чтения расписания.
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, queue_limit: int = HASH_QUEUE_LIMIT):
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+
+    @asynccontextmanager
+    async def slot(self):
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервер перегружен, повторите вход через несколько секунд",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+
+hashing_pool = HashingPool()
+
 # =====================================================
 # AUTH UTILS
 # =====================================================
@@ -56,6 +111,24 @@ def authenticate_user(db: Session, login: str, password: str) -> Optional[User]:
     return user
 
 
+# короткие сессии: соединение не держится, пока идёт bcrypt
+def find_active_user(login: str) -> Optional[tuple]:
+    """
+    (Principal, хэш пароля) активного пользователя или None
+    """
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.login == login).first()
+        if not user or not user.active:
+            return None
+        return Principal(user.id, user.login, user.role, user.full_name), user.password
+
+
+def save_password_hash(user_id: int, password_hash: str):
+    with SessionLocal() as db:
+        db.query(User).filter(User.id == user_id).update({"password": password_hash})
+        db.commit()
+
+
 def create_access_token(
     data: dict,
     expires_delta: Optional[timedelta] = None
@@ -67,13 +140,133 @@ def create_access_token(
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# =====================================================
+# PRINCIPAL CACHE
+# =====================================================
+Principal = namedtuple("Principal", "id login role full_name")
+
+
+class PrincipalCache:
+    """
+    LRU: токен -> пользователь. Запись живёт до exp токена (но не дольше
+    AUTH_CACHE_TTL) и до смены версии пользователя: изменение строки
+    users через сессию этого процесса сразу делает его токены
+    недействительными. Правки из других процессов и прямым SQL видны
+    по счётчику users (app/changes.py): sync() раз в check_interval
+    сверяет его и при смене очищает весь кэш.
+    """
+
+    def __init__(
+        self,
+        size: int = AUTH_CACHE_SIZE,
+        ttl: float = AUTH_CACHE_TTL,
+        check_interval: float = AUTH_CHECK_INTERVAL,
+    ):
+        self.size = size
+        self.ttl = ttl
+        self.check_interval = check_interval
+        # номер очистки: пользователь, прочитанный до неё, не кэшируется
+        self.generation = 0
+        self._items = OrderedDict()
+        self._versions = {}
+        self._users_version = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def stale(self) -> bool:
+        return time.monotonic() - self._checked_at >= self.check_interval
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            item = self._items.get(token)
+            if item is None:
+                return None
+
+            principal, expires, version = item
+            if expires <= time.time() or version != self._versions.get(principal.login, 0):
+                del self._items[token]
+                return None
+
+            self._items.move_to_end(token)
+            return principal
+
+    def put(self, token: str, principal: Principal, exp: float, generation: int):
+        with self._lock:
+            if generation != self.generation:
+                return
+            version = self._versions.get(principal.login, 0)
+            self._items[token] = (principal, min(exp, time.time() + self.ttl), version)
+            self._items.move_to_end(token)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def bump(self, login: str):
+        with self._lock:
+            self._versions[login] = self._versions.get(login, 0) + 1
+
+    def sync(self):
+        """
+        Сверить счётчик users; вызывается из threadpool
+        """
+        with SessionLocal() as db:
+            version = read_counters(db, AUTH_TABLES).get("users", (0, None))[0]
+        with self._lock:
+            if version != self._users_version:
+                self._users_version = version
+                self._items.clear()
+                self.generation += 1
+            self._checked_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.generation += 1
+
+
+principal_cache = PrincipalCache()
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_user_changes(session: Session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, User):
+            session.info.setdefault("changed_users", set()).add(obj.login)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_user_versions(session: Session):
+    for login in session.info.pop("changed_users", ()):
+        principal_cache.bump(login)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_user_changes(session: Session):
+    session.info.pop("changed_users", None)
+
 # =====================================================
 # DEPENDENCY: CURRENT USER
 # =====================================================
-def get_current_user(
+def load_principal(login: str) -> Principal:
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.login == login).first()
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+        if not user.active:
+            raise HTTPException(status_code=403, detail="User inactive")
+        return Principal(user.id, user.login, user.role, user.full_name)
+
+
+async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-) -> User:
+) -> Principal:
+    # попадание в кэш обходится без потока из threadpool; счётчик users
+    # читается не чаще раза в AUTH_CHECK_INTERVAL
+    if principal_cache.stale():
+        await run_in_threadpool(principal_cache.sync)
+    principal = principal_cache.get(token)
+    if principal:
+        return principal
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         login: str = payload.get("sub")
@@ -82,25 +275,43 @@ def get_current_user(
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user = db.query(User).filter(User.login == login).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
-    if not user.active:
-        raise HTTPException(status_code=403, detail="User inactive")
+    generation = principal_cache.generation
+    principal = await run_in_threadpool(load_principal, login)
+    principal_cache.put(token, principal, payload.get("exp") or 0, generation)
 
-    return user
+    return principal
+
+def require_roles(*roles: str):
+    """
+    Dependency: текущий пользователь с одной из ролей, иначе 403
+    """
+    async def check_role(user: Principal = Depends(get_current_user)) -> Principal:
+        if user.role not in roles:
+            raise HTTPException(status_code=403, detail="Недостаточно прав")
+        return user
+
+    return check_role
 
 # =====================================================
 # ENDPOINTS
 # =====================================================
 @router.post("/login")
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    # БД — в общем threadpool, bcrypt — в своём ограниченном пуле;
+    # при полной очереди 503 до обращения к БД
+    async with hashing_pool.slot():
+        found = await run_in_threadpool(find_active_user, form_data.username)
 
-    if not user:
+        valid, new_hash = False, None
+        if found:
+            user, password_hash = found
+            valid, new_hash = await hashing_pool.run(
+                pwd_context.verify_and_update, form_data.password, password_hash
+            )
+
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный логин или пароль",
@@ -113,6 +324,10 @@ def login(
         }
     )
 
+    # хэш со старой стоимостью bcrypt — пересчитан, сохраняем
+    if new_hash:
+        await run_in_threadpool(save_password_hash, user.id, new_hash)
+
     return {
         "access_token": token,
         "token_type": "bearer",
@@ -120,26 +335,11 @@ def login(
 
 
 @router.get("/me")
-def read_me(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
+async def read_me(
+    user: Principal = Depends(get_current_user),
 ):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        login = payload.get("sub")
-
-        user = db.query(User).filter(User.login == login).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        return {
-            "login": user.login,
-            "full_name": user.full_name,
-            "role": user.role,
-        }
-
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Недействительный токен",
-        )
+    return {
+        "login": user.login,
+        "full_name": user.full_name,
+        "role": user.role,
+    }
@@ -0,0 +1,91 @@
+"""
+Поиск свободного времени мастеров.
+
+Рабочий день мастера — битовая маска из 5-минутных слотов (9:00–20:00,
+132 бита в обычном int). Занятые заявками слоты выставляются в 1, после
+чего допустимые начала услуги длительностью k слотов находятся
+несколькими сдвигами и AND по всей маске сразу, без перебора кандидатов.
+"""
+from datetime import date, datetime, time
+from typing import Dict, Iterable, List
+
+SLOT_MINUTES = 5
+WORK_START = time(9, 0)
+WORK_END = time(20, 0)
+
+DAY_START = WORK_START.hour * 60 + WORK_START.minute
+DAY_SLOTS = (WORK_END.hour * 60 + WORK_END.minute - DAY_START) // SLOT_MINUTES
+FULL_DAY = (1 << DAY_SLOTS) - 1
+
+
+def slot_of(t: time) -> int:
+    return (t.hour * 60 + t.minute - DAY_START) // SLOT_MINUTES
+
+
+def slot_time(slot: int) -> str:
+    minutes = DAY_START + slot * SLOT_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def busy_mask(start: time, end: time) -> int:
+    """
+    Маска слотов, которые задевает интервал [start, end)
+    """
+    first = max(slot_of(start), 0)
+    minutes = end.hour * 60 + end.minute - DAY_START
+    last = min(-(-minutes // SLOT_MINUTES), DAY_SLOTS)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def free_starts(busy: int, length: int) -> int:
+    """
+    Маска слотов, с которых помещается length свободных слотов подряд.
+    Бит i остаётся 1, только если свободны слоты i .. i+length-1.
+    """
+    acc = FULL_DAY & ~busy
+    covered = 1
+    while covered < length and acc:
+        step = min(covered, length - covered)
+        acc &= acc >> step
+        covered += step
+    return acc
+
+
+def mask_slots(mask: int) -> List[str]:
+    result = []
+    while mask:
+        low = mask & -mask
+        result.append(slot_time(low.bit_length() - 1))
+        mask ^= low
+    return result
+
+
+def day_availability(
+    busy_by_day: Dict[date, int],
+    days: Iterable[date],
+    duration: int,
+    now: datetime,
+) -> Dict[date, List[str]]:
+    """
+    Свободные времена начала по дням для одного мастера
+    """
+    length = -(-duration // SLOT_MINUTES)
+    result = {}
+
+    for day in days:
+        if day < now.date():
+            continue
+
+        starts = free_starts(busy_by_day.get(day, 0), length)
+
+        # сегодня — только будущие слоты
+        if day == now.date():
+            passed = -(-(now.hour * 60 + now.minute - DAY_START) // SLOT_MINUTES)
+            if passed > 0:
+                starts &= ~((1 << passed) - 1)
+
+        result[day] = mask_slots(starts)
+
+    return result
@@ -1,28 +1,22 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, Request, Response
 
-from app.database import SessionLocal
-from app.models import Breed
 from app.auth import get_current_user
+from app.catalog import Catalog, get_catalog
 
 router = APIRouter(prefix="/breeds", tags=["Breeds"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.get("")
-def get_breeds(
+async def get_breeds(
+    request: Request,
+    response: Response,
     species: str = Query(..., description="dog или cat"),
-    db: Session = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
     user=Depends(get_current_user),
 ):
-    breeds = db.query(Breed).filter(Breed.species == species).all()
+    not_modified = catalog.validator("breeds", species).apply(request, response)
+    if not_modified:
+        return not_modified
 
     return [
         {
@@ -30,5 +24,5 @@ def get_breeds(
             "name": b.name,
             "default_size": b.default_size,
         }
-        for b in breeds
+        for b in catalog.breeds.get(species, [])
     ]
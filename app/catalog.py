@@ -0,0 +1,181 @@
+"""
+Кэш справочников: услуги, тарифы, доп. услуги, возрастные группы,
+мастера и породы, а также собранная из них таблица цен (app/pricing.py).
+
+Справочники маленькие и меняются редко, поэтому процесс держит в памяти
+неизменяемый снимок и отдаёт его роутерам и расчёту цены без обращения
+к SQLite. Снимок сбрасывается:
+- явно, после коммита сессии, изменившей строки справочников;
+- по TTL — на случай правок из другого процесса или прямым SQL.
+"""
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.changes import CATALOG_TABLES, Validator, counters_state, read_counters
+from app.database import SessionLocal
+from app.pricing import PriceTable
+from app.models import (
+    Master,
+    Service,
+    ServiceTariff,
+    ExtraService,
+    AgeGroup,
+    Breed,
+    PetSize,
+)
+
+CACHE_TTL = 300  # секунд
+
+CATALOG_MODELS = (Master, Service, ServiceTariff, ExtraService, AgeGroup, Breed)
+
+MasterRef = namedtuple("MasterRef", "id name group active")
+ServiceRef = namedtuple("ServiceRef", "id name")
+TariffRef = namedtuple("TariffRef", "id service_id size price duration")
+ExtraRef = namedtuple("ExtraRef", "id name price")
+AgeGroupRef = namedtuple("AgeGroupRef", "id name price_factor")
+BreedRef = namedtuple("BreedRef", "id name species default_size")
+
+
+class Catalog:
+    def __init__(self, db: Session, version: int):
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        # счётчики читаются до данных: снимок не может оказаться
+        # старее своего ETag
+        self.changes, self.changed_at = counters_state(
+            read_counters(db, CATALOG_TABLES)
+        )
+
+        self.masters: Dict[int, MasterRef] = {
+            m.id: MasterRef(m.id, m.name, m.group, bool(m.active))
+            for m in db.query(Master).order_by(Master.id)
+        }
+        self.services: Dict[int, ServiceRef] = {
+            s.id: ServiceRef(s.id, s.name)
+            for s in db.query(Service).order_by(Service.id)
+        }
+        self.tariffs: Dict[Tuple[int, PetSize], TariffRef] = {
+            (t.service_id, t.size): TariffRef(
+                t.id, t.service_id, t.size, t.price, t.duration
+            )
+            for t in db.query(ServiceTariff).order_by(ServiceTariff.id)
+        }
+        self.extras: Dict[int, ExtraRef] = {
+            e.id: ExtraRef(e.id, e.name, e.price)
+            for e in db.query(ExtraService).order_by(ExtraService.id)
+        }
+        self.age_groups: Dict[int, AgeGroupRef] = {
+            a.id: AgeGroupRef(a.id, a.name, a.price_factor)
+            for a in db.query(AgeGroup).order_by(AgeGroup.id)
+        }
+        self.breeds: Dict[str, List[BreedRef]] = {}
+        self.breeds_by_id: Dict[int, BreedRef] = {}
+        for b in db.query(Breed).order_by(Breed.id):
+            breed = BreedRef(b.id, b.name, b.species, b.default_size)
+            self.breeds.setdefault(b.species, []).append(breed)
+            self.breeds_by_id[b.id] = breed
+
+        self.prices = PriceTable(self)
+
+    def active_masters(self) -> List[MasterRef]:
+        return [m for m in self.masters.values() if m.active]
+
+    def tariff(self, service_id: int, size) -> Optional[TariffRef]:
+        return self.tariffs.get((service_id, PetSize(size)))
+
+    def breed_name(self, breed_id: Optional[int]) -> Optional[str]:
+        breed = self.breeds_by_id.get(breed_id)
+        return breed.name if breed else None
+
+    def extras_by_ids(self, ids) -> List[ExtraRef]:
+        return [self.extras[i] for i in dict.fromkeys(ids or []) if i in self.extras]
+
+    def validator(self, *parts) -> Validator:
+        """
+        ETag ответа, построенного из снимка: без обращения к БД
+        """
+        return Validator((*parts, self.changes), self.changed_at)
+
+
+class ReferenceCache:
+    def __init__(self, ttl: float = CACHE_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self._catalog: Optional[Catalog] = None
+        self._lock = threading.Lock()
+
+    def fresh(self) -> Optional[Catalog]:
+        """
+        Текущий снимок, если он не устарел, без загрузки
+        """
+        catalog = self._catalog
+        if catalog is not None and time.monotonic() - catalog.loaded_at < self.ttl:
+            return catalog
+        return None
+
+    def get(self, db: Optional[Session] = None) -> Catalog:
+        catalog = self.fresh()
+        if catalog is not None:
+            return catalog
+
+        with self._lock:
+            catalog = self._catalog
+            if catalog is None or time.monotonic() - catalog.loaded_at >= self.ttl:
+                catalog = self._load(db)
+                self._catalog = catalog
+            return catalog
+
+    def _load(self, db: Optional[Session]) -> Catalog:
+        if db is not None:
+            return Catalog(db, self.version)
+
+        db = SessionLocal()
+        try:
+            return Catalog(db, self.version)
+        finally:
+            db.close()
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._catalog = None
+
+
+reference_cache = ReferenceCache()
+
+
+async def get_catalog() -> Catalog:
+    """
+    Dependency: текущий снимок справочников.
+    Загрузка из БД (раз в CACHE_TTL) — в threadpool.
+    """
+    return reference_cache.fresh() or await run_in_threadpool(reference_cache.get)
+
+
+# =====================================================
+# INVALIDATION
+# =====================================================
+@event.listens_for(Session, "after_flush")
+def _mark_catalog_changes(session: Session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, CATALOG_MODELS):
+            session.info["catalog_changed"] = True
+            return
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session):
+    if session.info.pop("catalog_changed", False):
+        reference_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session: Session):
+    session.info.pop("catalog_changed", None)
@@ -0,0 +1,321 @@
+"""
+Счётчики изменений таблиц и условные запросы (ETag / Last-Modified).
+
+Таблица change_counters хранит для каждой отслеживаемой таблицы номер
+версии и время последнего изменения. Номер увеличивают триггеры на
+INSERT / UPDATE / DELETE (миграция 5; у клиентов и питомцев — только
+UPDATE / DELETE, миграция 10), поэтому счётчик общий для всех
+процессов uvicorn и учитывает правки прямым SQL.
+
+Заявка при каждой записи получает orders.version — текущий номер
+счётчика orders. Валидатор расписания за период — максимальная версия
+и число заявок в нём: правка заявки увеличивает максимум, удаление
+или перенос за пределы периода меняет число.
+
+Запись доп. услуг заявки тоже увеличивает счётчик orders и версию
+самой заявки (миграция 11).
+
+Тот же номер — последовательность изменений для синхронизации
+расписания: заявки с version > since изменены после since. Удалённая
+заявка, а также прежние дата и мастер перенесённой, остаются в
+order_tombstones с номером изменения.
+
+Надгробия хранятся за TOMBSTONES_KEEP последних изменений заявок
+(prune_tombstones). Граница удалённых хранится в change_counters
+строкой order_tombstones: since ниже неё синхронизация не может
+восстановить удаления, и клиент загружает расписание целиком.
+
+    TOMBSTONES_KEEP  изменений заявок, за которые хранятся надгробия (100000)
+"""
+import hashlib
+import os
+from datetime import date, datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+COUNTERS_TABLE = "change_counters"
+TOMBSTONES_TABLE = "order_tombstones"
+
+CATALOG_TABLES = (
+    "masters", "services", "service_tariffs", "extra_services", "age_groups", "breeds",
+)
+# таблицы, из которых расписание берёт имена и вхождения серий
+SCHEDULE_TABLES = ("clients", "pets", "order_series", "order_series_exceptions")
+# прочие таблицы, по которым строятся отчёты (app/analytics.py)
+REPORT_TABLES = ("order_extra_services",)
+
+# пользователи: кэш токенов (app/auth.py) сверяет счётчик, чтобы
+# замечать правки из других процессов
+AUTH_TABLES = ("users",)
+
+TRACKED_TABLES = ("orders",) + CATALOG_TABLES + SCHEDULE_TABLES + REPORT_TABLES + AUTH_TABLES
+
+# новый клиент или питомец не меняет ни одной строки расписания — в
+# него попадает только заявка, а её учитывает счётчик orders. Счётчик
+# этих таблиц растёт только при UPDATE / DELETE (смена имени, клички),
+# иначе каждая запись с новым клиентом сбрасывала бы ETag и
+# синхронизацию всех открытых расписаний
+UPDATE_ONLY_TABLES = ("clients", "pets")
+
+# клиент всегда перепроверяет ответ, но может получить 304
+CACHE_CONTROL = "private, no-cache"
+
+# не меньше SYNC_MAX_CHANGES из app/intervals.py: индекс интервалов
+# догоняет изменения по надгробиям
+TOMBSTONES_KEEP = int(os.environ.get("TOMBSTONES_KEEP", "100000"))
+
+
+# =====================================================
+# DDL (миграция 5)
+# =====================================================
+def _bump(table: str) -> str:
+    return (
+        f"UPDATE {COUNTERS_TABLE} SET version = version + 1,"
+        f" changed_at = strftime('%Y-%m-%d %H:%M:%f', 'now')"
+        f" WHERE name = '{table}';"
+    )
+
+
+def _stamp_order(order_id: str) -> str:
+    return (
+        f"UPDATE orders SET version ="
+        f" (SELECT version FROM {COUNTERS_TABLE} WHERE name = 'orders')"
+        f" WHERE id = {order_id};"
+    )
+
+
+def _tombstone(condition: str = "1") -> str:
+    return (
+        f"INSERT INTO {TOMBSTONES_TABLE} (order_id, date, master_id, version)"
+        f" SELECT old.id, old.date, old.master_id, version FROM {COUNTERS_TABLE}"
+        f" WHERE name = 'orders' AND {condition};"
+    )
+
+
+def _counter_triggers(table: str) -> list:
+    events = (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE"))
+    if table in UPDATE_ONLY_TABLES:
+        events = events[1:]
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_changes_{suffix}"
+        f" AFTER {event} ON {table} BEGIN\n{_bump(table)}\nEND"
+        for suffix, event in events
+    ]
+
+
+CHANGES_DDL = [
+    f"CREATE TABLE IF NOT EXISTS {COUNTERS_TABLE} ("
+    " name TEXT PRIMARY KEY,"
+    " version INTEGER NOT NULL DEFAULT 0,"
+    " changed_at TEXT NOT NULL)",
+
+    f"CREATE TABLE IF NOT EXISTS {TOMBSTONES_TABLE} ("
+    " order_id INTEGER NOT NULL,"
+    " date DATE NOT NULL,"
+    " master_id INTEGER NOT NULL,"
+    " version INTEGER NOT NULL)",
+
+    f"CREATE INDEX IF NOT EXISTS ix_{TOMBSTONES_TABLE}_date"
+    f" ON {TOMBSTONES_TABLE} (date, version)",
+
+    f"CREATE INDEX IF NOT EXISTS ix_{TOMBSTONES_TABLE}_version"
+    f" ON {TOMBSTONES_TABLE} (version)",
+
+    # заявка: счётчик + версия строки; WHEN не даёт триггеру
+    # сработать на собственный UPDATE версии
+    f"CREATE TRIGGER IF NOT EXISTS orders_changes_ai AFTER INSERT ON orders BEGIN\n"
+    f"{_bump('orders')}\n{_stamp_order('new.id')}\nEND",
+
+    f"CREATE TRIGGER IF NOT EXISTS orders_changes_au AFTER UPDATE ON orders"
+    f" WHEN new.version IS old.version BEGIN\n"
+    f"{_bump('orders')}\n{_stamp_order('new.id')}\n"
+    f"{_tombstone('(old.date IS NOT new.date OR old.master_id IS NOT new.master_id)')}\nEND",
+
+    f"CREATE TRIGGER IF NOT EXISTS orders_changes_ad AFTER DELETE ON orders BEGIN\n"
+    f"{_bump('orders')}\n{_tombstone()}\nEND",
+]
+for _table in CATALOG_TABLES + SCHEDULE_TABLES + REPORT_TABLES + AUTH_TABLES:
+    CHANGES_DDL += _counter_triggers(_table)
+
+# доп. услуги — часть заявки: их правка получает номер изменения
+# заявки, даже если строка orders не менялась (миграция 11)
+CHANGES_DDL += [
+    f"CREATE TRIGGER IF NOT EXISTS order_extra_services_stamp_ai"
+    f" AFTER INSERT ON order_extra_services BEGIN\n"
+    f"{_bump('orders')}\n{_stamp_order('new.order_id')}\nEND",
+
+    f"CREATE TRIGGER IF NOT EXISTS order_extra_services_stamp_au"
+    f" AFTER UPDATE ON order_extra_services BEGIN\n"
+    # одним UPDATE: вторая запись той же заявки включила бы orders_changes_au
+    f"{_bump('orders')}\n{_stamp_order('old.order_id OR id = new.order_id')}\nEND",
+
+    f"CREATE TRIGGER IF NOT EXISTS order_extra_services_stamp_ad"
+    f" AFTER DELETE ON order_extra_services BEGIN\n"
+    f"{_bump('orders')}\n{_stamp_order('old.order_id')}\nEND",
+]
+
+# триггеры orders, изменённые после миграции 5
+CHANGES_REPLACED_TRIGGERS = ("orders_changes_au", "orders_changes_ad")
+# триггеры вставки, снятые миграцией 10
+CHANGES_DROPPED_TRIGGERS = tuple(f"{t}_changes_ai" for t in UPDATE_ONLY_TABLES)
+
+CHANGES_SEED = (
+    f"INSERT OR IGNORE INTO {COUNTERS_TABLE} (name, version, changed_at)"
+    f" VALUES (:name, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'))"
+)
+
+
+# =====================================================
+# COUNTERS
+# =====================================================
+def read_counters(db: Session, tables: Iterable[str]) -> Dict[str, Tuple[int, datetime]]:
+    """
+    {таблица: (версия, время изменения UTC)}
+    """
+    tables = list(tables)
+    rows = db.execute(
+        text(
+            f"SELECT name, version, changed_at FROM {COUNTERS_TABLE}"
+            f" WHERE name IN ({', '.join(f':t{i}' for i in range(len(tables)))})"
+        ),
+        {f"t{i}": t for i, t in enumerate(tables)},
+    )
+    return {
+        r.name: (r.version, _parse_time(r.changed_at))
+        for r in rows
+    }
+
+
+def counters_state(counters: Dict[str, Tuple[int, datetime]]) -> Tuple[int, Optional[datetime]]:
+    """
+    (сумма версий, последнее изменение): сумма растёт при любом
+    изменении любой из таблиц
+    """
+    return (
+        sum(v for v, _ in counters.values()),
+        max((t for _, t in counters.values()), default=None),
+    )
+
+
+def deleted_order_ids(
+    db: Session,
+    since: int,
+    date_from: date,
+    date_to: date,
+    master_id: Optional[int] = None,
+) -> List[int]:
+    """
+    id заявок, удалённых из периода (или мастера) после изменения since
+    """
+    sql = (
+        f"SELECT DISTINCT order_id FROM {TOMBSTONES_TABLE}"
+        f" WHERE date >= :date_from AND date <= :date_to AND version > :since"
+    )
+    params = {"date_from": date_from.isoformat(), "date_to": date_to.isoformat(), "since": since}
+    if master_id:
+        sql += " AND master_id = :master_id"
+        params["master_id"] = master_id
+
+    return [r.order_id for r in db.execute(text(sql), params)]
+
+
+def tombstones_floor(db: Session) -> int:
+    """
+    Номер изменения, до которого (включительно) надгробия удалены
+    """
+    return db.execute(
+        text(f"SELECT version FROM {COUNTERS_TABLE} WHERE name = :name"),
+        {"name": TOMBSTONES_TABLE},
+    ).scalar() or 0
+
+
+def prune_tombstones(db: Session, keep: int = TOMBSTONES_KEEP):
+    """
+    Удалить надгробия старше keep последних изменений заявок и сдвинуть
+    границу — в одной транзакции, поэтому читатель, не нашедший
+    удалённое надгробие, увидит и новую границу
+    """
+    seq = db.execute(
+        text(f"SELECT version FROM {COUNTERS_TABLE} WHERE name = 'orders'")
+    ).scalar() or 0
+    floor = seq - keep
+    if floor <= tombstones_floor(db):
+        return
+
+    db.execute(text(f"DELETE FROM {TOMBSTONES_TABLE} WHERE version <= :floor"), {"floor": floor})
+    # граница только растёт, даже если чистят два процесса сразу
+    db.execute(
+        text(
+            f"INSERT INTO {COUNTERS_TABLE} (name, version, changed_at)"
+            f" VALUES (:name, :floor, strftime('%Y-%m-%d %H:%M:%f', 'now'))"
+            f" ON CONFLICT (name) DO UPDATE SET version = max(version, excluded.version)"
+        ),
+        {"name": TOMBSTONES_TABLE, "floor": floor},
+    )
+    db.commit()
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+def _current_second() -> datetime:
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+class Validator:
+    """
+    ETag и Last-Modified одного представления ресурса
+    """
+
+    def __init__(
+        self,
+        parts: Iterable,
+        last_modified: Optional[datetime],
+        extra_headers: Optional[dict] = None,
+    ):
+        digest = hashlib.sha1(repr(tuple(parts)).encode()).hexdigest()[:20]
+        self.etag = f'"{digest}"'
+        self.last_modified = last_modified.replace(microsecond=0) if last_modified else None
+        self.extra_headers = extra_headers or {}
+
+    def headers(self) -> dict:
+        headers = {"ETag": self.etag, "Cache-Control": CACHE_CONTROL, **self.extra_headers}
+        # Last-Modified с точностью до секунды: если изменение было в
+        # текущей секунде, следующее могло бы получить ту же отметку
+        if self.last_modified and self.last_modified < _current_second():
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+    def matches(self, request: Request) -> bool:
+        """
+        Представление клиента актуально: If-None-Match, а при его
+        отсутствии — If-Modified-Since
+        """
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+            return "*" in tags or self.etag in tags
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if not if_modified_since or not self.last_modified:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return since.tzinfo is not None and self.last_modified <= since
+
+    def apply(self, request: Request, response: Response) -> Optional[Response]:
+        """
+        304, если у клиента актуальная версия; иначе заголовки
+        валидатора добавляются к ответу и возвращается None
+        """
+        if self.matches(request):
+            return Response(status_code=304, headers=self.headers())
+        response.headers.update(self.headers())
+        return None
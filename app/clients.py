@@ -1,66 +1,125 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
 
-from app.database import SessionLocal
-from app.models import Client
-from app.schemas import ClientSearchResult, ClientRead, PetRead
-from app.auth import oauth2_scheme
-from jose import jwt, JWTError
-
-SECRET_KEY = "SECRET_KEY_CHANGE_ME"
-ALGORITHM = "HS256"
+from app.database import get_runner
+from app.models import Client, normalize_phone
+from app.schemas import ClientSearchResult, ClientSearchPage
+from app.auth import get_current_user
+from app.catalog import Catalog, get_catalog
+from app.pagination import DEFAULT_LIMIT, MAX_LIMIT, decode_cursor, page
+from app.pets import pet_read
+from app.search import (
+    MAX_TYPEAHEAD_LIMIT,
+    TYPEAHEAD_LIMIT,
+    matching_clients,
+    search_client_ids,
+)
 
 router = APIRouter(prefix="/clients", tags=["Clients"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def client_result(client: Client, catalog: Catalog) -> dict:
+    return {
+        "client": client,
+        "pets": [pet_read(p, catalog) for p in client.pets],
+    }
+
+
+def find_by_phone(db: Session, phone: str, catalog: Catalog) -> Optional[dict]:
+    key = normalize_phone(phone)
+    client = key and db.query(Client).filter(Client.phone_key == key).first()
+    return client_result(client, catalog) if client else None
+
+
+def find_by_name(
+    db: Session,
+    name: str,
+    limit: int,
+    next: Optional[str],
+    catalog: Catalog,
+) -> dict:
+    # слова имени — префиксы в любом порядке, через индекс FTS5
+    matches = matching_clients(name)
+    if matches is None:
+        return {"items": [], "next": None}
+
+    q = db.query(Client).filter(Client.id.in_(matches))
+
+    # сортировка (full_name, id), курсор — ключ последней строки
+    cursor = decode_cursor(next, 2)
+    if cursor:
+        q = q.filter(or_(
+            Client.full_name > cursor[0],
+            and_(Client.full_name == cursor[0], Client.id > cursor[1]),
+        ))
+
+    # питомцы всей страницы — одним запросом
+    clients, next_cursor = page(
+        q.options(selectinload(Client.pets))
+        .order_by(Client.full_name, Client.id)
+        .limit(limit + 1)
+        .all(),
+        limit,
+        lambda c: (c.full_name, c.id),
+    )
 
+    return {
+        "items": [client_result(c, catalog) for c in clients],
+        "next": next_cursor,
+    }
+
+
+def typeahead(db: Session, q: str, limit: int, catalog: Catalog) -> list:
+    ids = search_client_ids(db, q, limit)
+    if not ids:
+        return []
+
+    clients = {
+        c.id: c
+        for c in db.query(Client)
+        .options(selectinload(Client.pets))
+        .filter(Client.id.in_(ids))
+    }
+    return [client_result(clients[i], catalog) for i in ids if i in clients]
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+
+# 🔍 TYPE-AHEAD: ФИО, телефон или кличка, по релевантности
+@router.get("/search", response_model=List[ClientSearchResult])
+async def search_clients(
+    q: str,
+    limit: int = Query(TYPEAHEAD_LIMIT, ge=1, le=MAX_TYPEAHEAD_LIMIT),
+    db=Depends(get_runner),
+    catalog: Catalog = Depends(get_catalog),
+    user=Depends(get_current_user),
+):
+    return await db.run(typeahead, q, limit, catalog)
 
 
 # 🔍 SEARCH BY PHONE
 @router.get("/search/phone", response_model=ClientSearchResult)
-def search_by_phone(
+async def search_by_phone(
     phone: str,
-    db: Session = Depends(get_db),
+    db=Depends(get_runner),
+    catalog: Catalog = Depends(get_catalog),
     user=Depends(get_current_user),
 ):
-    client = db.query(Client).filter(Client.phone == phone).first()
-    if not client:
+    result = await db.run(find_by_phone, phone, catalog)
+    if not result:
         raise HTTPException(status_code=404, detail="Client not found")
 
-    return {
-        "client": client,
-        "pets": client.pets,
-    }
+    return result
 
 
 # 🔍 SEARCH BY NAME (partial)
-@router.get("/search/name", response_model=List[ClientSearchResult])
-def search_by_name(
+@router.get("/search/name", response_model=ClientSearchPage)
+async def search_by_name(
     name: str,
-    db: Session = Depends(get_db),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    next: Optional[str] = None,
+    db=Depends(get_runner),
+    catalog: Catalog = Depends(get_catalog),
     user=Depends(get_current_user),
 ):
-    clients = db.query(Client).filter(
-        Client.full_name.ilike(f"%{name}%")
-    ).all()
-
-    return [
-        {
-            "client": c,
-            "pets": c.pets
-        }
-        for c in clients
-    ]
+    return await db.run(find_by_name, name, limit, next, catalog)
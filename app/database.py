@@ -1,12 +1,257 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+"""
+Подключение к БД.
 
-DATABASE_URL = "sqlite:///./database.db"
+Настройки берутся из окружения:
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+    DATABASE_URL         sqlite:///./database.db
+    DB_POOL_SIZE         постоянных соединений в пуле (10)
+    DB_MAX_OVERFLOW      сверх пула под пиковую нагрузку (20)
+    DB_POOL_TIMEOUT      секунд ожидания свободного соединения (30)
+    SQLITE_BUSY_TIMEOUT  мс ожидания блокировки записи (5000)
+    SQLITE_CACHE_KB      кэш страниц на соединение (16384)
+    SQLITE_MMAP_MB       отображение файла в память (256)
+    DB_ASYNC             1 — читающие эндпоинты работают через aiosqlite (0)
+
+Для файла SQLite включается WAL: читатели не блокируются записью и друг
+другом, несколько процессов uvicorn работают с одним файлом, а писатели
+ждут друг друга до busy_timeout вместо немедленного "database is locked".
+
+Читающие эндпоинты объявлены как async def и обращаются к БД через
+get_runner(). В синхронном режиме функция с запросами выполняется
+в threadpool, в асинхронном — на соединении aiosqlite через
+AsyncSession.run_sync, и число одновременных запросов ограничено пулом
+соединений, а не пулом потоков Starlette.
+"""
+import os
+from contextlib import contextmanager
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./database.db")
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "30"))
+
+SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT", "5000"))
+SQLITE_CACHE_KB = int(os.environ.get("SQLITE_CACHE_KB", "16384"))
+SQLITE_MMAP_MB = int(os.environ.get("SQLITE_MMAP_MB", "256"))
+
+DB_ASYNC = os.environ.get("DB_ASYNC", "0") == "1"
+
+
+def sqlite_pragmas(in_memory: bool) -> list:
+    pragmas = [
+        f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT}",
+        "PRAGMA foreign_keys = ON",
+        f"PRAGMA cache_size = -{SQLITE_CACHE_KB}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    if not in_memory:
+        pragmas += [
+            "PRAGMA journal_mode = WAL",
+            # в WAL достаточно: коммит не теряется при падении процесса,
+            # только при отключении питания
+            "PRAGMA synchronous = NORMAL",
+            f"PRAGMA mmap_size = {SQLITE_MMAP_MB * 1024 * 1024}",
+        ]
+    return pragmas
+
+
+def make_engine(url: str = DATABASE_URL, **kwargs) -> Engine:
+    """
+    Engine с настройками пула и, для SQLite, PRAGMA на каждом соединении
+    """
+    if not url.startswith("sqlite"):
+        return create_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=True,
+            **kwargs,
+        )
+
+    in_memory = url in ("sqlite://", "sqlite:///:memory:")
+    options = {} if in_memory else {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+    engine = create_engine(
+        url,
+        connect_args={
+            "check_same_thread": False,
+            "timeout": SQLITE_BUSY_TIMEOUT / 1000,
+        },
+        **options,
+        **kwargs,
+    )
+    set_sqlite_pragmas(engine, in_memory)
+    return engine
+
+
+def make_async_engine(url: str = DATABASE_URL, **kwargs):
+    """
+    AsyncEngine на aiosqlite с теми же PRAGMA и размерами пула
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    if not url.startswith("sqlite"):
+        return create_async_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=True,
+            **kwargs,
+        )
+
+    in_memory = url in ("sqlite://", "sqlite:///:memory:")
+    options = {} if in_memory else {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+    engine = create_async_engine(
+        url.replace("sqlite:", "sqlite+aiosqlite:", 1),
+        connect_args={"timeout": SQLITE_BUSY_TIMEOUT / 1000},
+        **options,
+        **kwargs,
+    )
+    set_sqlite_pragmas(engine.sync_engine, in_memory)
+    return engine
+
+
+def set_sqlite_pragmas(engine: Engine, in_memory: bool):
+    pragmas = sqlite_pragmas(in_memory)
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+engine = make_engine()
 
 SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
+
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = make_async_engine()
+    AsyncSessionLocal = async_sessionmaker(async_engine)
+else:
+    async_engine = AsyncSessionLocal = None
+
+
+def begin_write(db: Session):
+    """
+    Открыть транзакцию сессии на SQLite явным BEGIN IMMEDIATE, если она
+    ещё не открыта.
+
+    pysqlite сам выполняет BEGIN только перед INSERT / UPDATE / DELETE:
+    SAVEPOINT (begin_nested) первым запросом транзакции выполняется вне
+    её, и RELEASE сразу фиксирует запись. IMMEDIATE берёт блокировку
+    записи на старте: следующий писатель ждёт её до busy_timeout, а
+    проверки внутри транзакции видят последнее зафиксированное состояние.
+    """
+    connection = db.connection()
+    if connection.dialect.name != "sqlite":
+        return
+    if not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+@contextmanager
+def begin_immediate(engine: Engine):
+    """
+    engine.begin(), но на SQLite транзакция сразу берёт блокировку записи
+    (BEGIN IMMEDIATE): шаги, которые должен выполнить один процесс из
+    нескольких (схема, миграции), идут по очереди, и каждый следующий
+    видит результат предыдущего
+    """
+    with engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        else:
+            conn.begin()
+        yield conn
+        conn.commit()
+
+
+@contextmanager
+def write_transaction(db: Session):
+    """
+    Транзакция записи (begin_write); при исключении — откат сразу, а не
+    при закрытии сессии в конце запроса: блокировка записи не держится,
+    пока формируется ответ об ошибке
+    """
+    begin_write(db)
+    try:
+        yield
+    except Exception:
+        db.rollback()
+        raise
+
+
+def get_db():
+    """
+    Dependency: сессия на время запроса
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# =====================================================
+# ASYNC ENDPOINTS
+# =====================================================
+class SyncRunner:
+    """
+    Синхронная сессия: функция выполняется в threadpool
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    async def run(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+
+class AsyncRunner:
+    """
+    AsyncSession: та же функция выполняется в greenlet на соединении
+    aiosqlite, без потока из threadpool
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    async def run(self, fn, *args, **kwargs):
+        return await self.session.run_sync(fn, *args, **kwargs)
+
+
+async def get_runner():
+    """
+    Dependency для async def эндпоинтов: await db.run(fn, ...) вызывает
+    fn(session, ...) в выбранном DB_ASYNC режиме
+    """
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as session:
+            yield AsyncRunner(session)
+        return
+
+    db = SessionLocal()
+    try:
+        yield SyncRunner(db)
+    finally:
+        db.close()
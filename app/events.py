@@ -0,0 +1,235 @@
+"""
+Push-уведомления об изменениях заявок (Server-Sent Events).
+
+Эндпоинты записи публикуют событие после commit, подписчики
+GET /orders/events получают его, если заявка (или её прежнее место при
+переносе) попадает в их период и мастера. Событие — только уведомление:
+id, дата, мастер, статус; сами строки клиент берёт через
+/orders/schedule/changes.
+
+Брокер выбирается переменной окружения:
+
+    EVENTS_BROKER         memory — подписчики и публикации в одном процессе;
+                          sqlite — несколько процессов uvicorn: каждый опрашивает
+                          последовательность изменений orders в общей базе (memory)
+    EVENTS_QUEUE_LIMIT    событий в очереди подписчика (100)
+    EVENTS_POLL_INTERVAL  секунд между опросами базы в режиме sqlite (1)
+
+Переполнение очереди значит, что клиент не успевает читать: его поток
+закрывается, EventSource переподключается и догоняет через changes.
+"""
+import asyncio
+import json
+import os
+from datetime import date
+from typing import Optional, Set
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+from app.changes import COUNTERS_TABLE, TOMBSTONES_TABLE
+from app.database import SessionLocal
+from app.models import OrderStatus
+
+EVENTS_BROKER = os.environ.get("EVENTS_BROKER", "memory")
+EVENTS_QUEUE_LIMIT = int(os.environ.get("EVENTS_QUEUE_LIMIT", "100"))
+EVENTS_POLL_INTERVAL = float(os.environ.get("EVENTS_POLL_INTERVAL", "1"))
+
+# комментарий в поток, чтобы прокси не закрывали простаивающее соединение
+HEARTBEAT_INTERVAL = 15
+
+
+def order_event(order_id: int, day, master_id: int, status=None, previous=None) -> dict:
+    """
+    previous — (дата, мастер) до переноса; status — как в OrderRead
+    """
+    if isinstance(status, str) and status in OrderStatus.__members__:
+        status = OrderStatus[status]
+    event = {
+        "type": "order",
+        "id": order_id,
+        "date": str(day),
+        "master_id": master_id,
+        "status": getattr(status, "value", status),
+    }
+    if previous and (str(previous[0]), previous[1]) != (event["date"], master_id):
+        event["previous"] = {"date": str(previous[0]), "master_id": previous[1]}
+    return event
+
+
+# =====================================================
+# SUBSCRIPTION
+# =====================================================
+class Subscription:
+    def __init__(
+        self,
+        broker: "MemoryBroker",
+        date_from: date,
+        date_to: date,
+        master_id: Optional[int] = None,
+        queue_limit: int = EVENTS_QUEUE_LIMIT,
+    ):
+        self.broker = broker
+        self.date_from = date_from.isoformat()
+        self.date_to = date_to.isoformat()
+        self.master_id = master_id
+        self.queue = asyncio.Queue(queue_limit)
+        self.dropped = False
+
+    def _covers(self, day: str, master_id: int) -> bool:
+        return (
+            self.date_from <= day <= self.date_to
+            and (not self.master_id or self.master_id == master_id)
+        )
+
+    def matches(self, event: dict) -> bool:
+        previous = event.get("previous")
+        return self._covers(event["date"], event["master_id"]) or bool(
+            previous and self._covers(previous["date"], previous["master_id"])
+        )
+
+    def push(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped = True
+            self.close()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    async def stream(self, request: Request):
+        """
+        Тело ответа text/event-stream
+        """
+        try:
+            yield "retry: 3000\n\n"
+            while not self.dropped:
+                try:
+                    event = await asyncio.wait_for(self.queue.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+
+                if self.dropped:
+                    return
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            self.close()
+
+
+# =====================================================
+# BROKERS
+# =====================================================
+class MemoryBroker:
+    """
+    Подписчики и публикации одного процесса. publish можно вызывать из
+    потока threadpool: раздача идёт в event loop подписчиков.
+    """
+
+    def __init__(self, queue_limit: int = EVENTS_QUEUE_LIMIT):
+        self.queue_limit = queue_limit
+        self.subscribers: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, date_from: date, date_to: date, master_id: Optional[int] = None) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(self, date_from, date_to, master_id, self.queue_limit)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+
+    def publish(self, event: dict):
+        if not self.subscribers or self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self.dispatch, event)
+
+    def dispatch(self, event: dict):
+        for subscription in list(self.subscribers):
+            if subscription.matches(event):
+                subscription.push(event)
+
+
+class SqliteBroker(MemoryBroker):
+    """
+    Замена внешнего брокера для нескольких процессов: события берутся
+    из orders.version и order_tombstones общей базы, поэтому их видят
+    подписчики всех процессов, включая изменения прямым SQL. Локальный
+    publish не нужен — запись найдёт опрос.
+    """
+
+    def __init__(self, queue_limit: int = EVENTS_QUEUE_LIMIT, interval: float = EVENTS_POLL_INTERVAL):
+        super().__init__(queue_limit)
+        self.interval = interval
+        self._poller: Optional[asyncio.Task] = None
+
+    def subscribe(self, date_from: date, date_to: date, master_id: Optional[int] = None) -> Subscription:
+        subscription = super().subscribe(date_from, date_to, master_id)
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.get_running_loop().create_task(self._poll())
+        return subscription
+
+    def publish(self, event: dict):
+        pass
+
+    async def _poll(self):
+        since = await run_in_threadpool(self._current_seq)
+        while self.subscribers:
+            await asyncio.sleep(self.interval)
+            since, events = await run_in_threadpool(self._events_since, since)
+            for event in events:
+                self.dispatch(event)
+
+    @staticmethod
+    def _orders_seq(db) -> int:
+        return db.execute(text(
+            f"SELECT version FROM {COUNTERS_TABLE} WHERE name = 'orders'"
+        )).scalar() or 0
+
+    def _current_seq(self) -> int:
+        with SessionLocal() as db:
+            return self._orders_seq(db)
+
+    def _events_since(self, since: int):
+        with SessionLocal() as db:
+            seq = self._orders_seq(db)
+            if seq <= since:
+                return since, []
+
+            params = {"since": since, "seq": seq}
+            moved = {
+                r.order_id: (r.date, r.master_id)
+                for r in db.execute(text(
+                    f"SELECT order_id, date, master_id FROM {TOMBSTONES_TABLE}"
+                    f" WHERE version > :since AND version <= :seq ORDER BY version"
+                ), params)
+            }
+            events = [
+                order_event(r.id, r.date, r.master_id, r.status, moved.pop(r.id, None))
+                for r in db.execute(text(
+                    "SELECT id, date, master_id, status FROM orders"
+                    " WHERE version > :since AND version <= :seq ORDER BY version"
+                ), params)
+            ]
+            # удалённые заявки: только прежнее место
+            events += [
+                order_event(order_id, day, master_id, "deleted")
+                for order_id, (day, master_id) in moved.items()
+            ]
+            return seq, events
+
+
+def make_broker(kind: str = EVENTS_BROKER) -> MemoryBroker:
+    if kind == "sqlite":
+        return SqliteBroker()
+    if kind == "memory":
+        return MemoryBroker()
+    raise ValueError(f"Неизвестный EVENTS_BROKER: {kind}")
+
+
+broker = make_broker()
@@ -0,0 +1,479 @@
+"""
+Синтетические данные для нагрузочных прогонов.
+
+Поверх справочников из app/init_data.py создаёт клиентов, питомцев и
+заявки с доп. услугами:
+
+- питомец получает породу из breeds (собаки 3:1 к кошкам), размер — по
+  умолчанию для породы, возрастную группу — по долям GROUP_WEIGHTS;
+- на каждый день и мастера — до --orders-per-day заявок подряд без
+  пересечений в рабочее время; цена и длительность — из таблицы цен
+  (app/pricing.py);
+- статусы: в прошлом (до --today) выполнена или отменена, в будущем
+  запланирована или отменена;
+- день мастера, на который уже есть неотменённые заявки, пропускается.
+
+Данные полностью определяются --seed и аргументами, включая --today и
+--batch. Строки генерируются пачками на NumPy и пишутся executemany по
+--batch клиентов (с их питомцами) или заявок на транзакцию. На время
+загрузки триггеры clients, pets, orders и order_extra_services
+снимаются; после неё (в том числе после ошибки) они восстанавливаются
+(DROP / CREATE TRIGGER), а поиск клиентов, дневная сводка и счётчики
+изменений пересчитываются одним проходом.
+
+Поэтому генератор — только для отдельной базы прогонов, не для рабочей:
+пока он идёт, записи других процессов не попадают в поиск и счётчики
+изменений, а synchronous = OFF не защищает от сбоя. В базе, где уже есть
+клиенты или заявки, он не запускается без --allow-existing.
+
+    python -m app.generate_data --clients 10000 --days 365
+    python -m app.generate_data --clients 1000000 --masters 300 \\
+        --days 3650 --orders-per-day 9 --seed 7
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.availability import WORK_END, WORK_START
+from app.catalog import Catalog
+from app.changes import COUNTERS_TABLE
+from app.database import SessionLocal, engine
+from app.init_data import init_all
+from app.models import Master, OrderStatus, PetSize
+from app.rollup import rebuild_rollup
+from app.search import search_backfill
+
+GENERATED_TABLES = ("clients", "pets", "orders", "order_extra_services")
+
+# доли возрастных групп в порядке id: щенки, взрослые, пожилые
+GROUP_WEIGHTS = (0.15, 0.65, 0.20)
+# питомцев у клиента: 1, 2, 3
+PETS_PER_CLIENT = (0.70, 0.22, 0.08)
+CAT_SHARE = 0.25
+# перерыв перед заявкой, минут
+GAPS = np.array([0, 0, 0, 15, 30, 60])
+
+FIRST_NAMES = (
+    "Александр", "Дмитрий", "Сергей", "Андрей", "Алексей", "Иван", "Михаил",
+    "Елена", "Ольга", "Анна", "Мария", "Наталья", "Татьяна", "Светлана",
+)
+LAST_NAMES = (
+    "Иванов", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев", "Козлов",
+    "Новиков", "Морозов", "Петров", "Волков", "Соловьёв", "Васильев", "Зайцев",
+)
+PET_NAMES = (
+    "Барсик", "Мурка", "Шарик", "Бобик", "Рекс", "Лайма", "Тузик", "Белка",
+    "Граф", "Джек", "Соня", "Марта", "Персик", "Ричи", "Бим", "Ёжик",
+)
+
+
+def _minutes(t) -> int:
+    return t.hour * 60 + t.minute
+
+
+TIMES = np.array(
+    [f"{m // 60:02d}:{m % 60:02d}:00.000000" for m in range(24 * 60)], dtype=object
+)
+
+
+# =====================================================
+# GENERATION
+# =====================================================
+class Generator:
+    def __init__(self, catalog: Catalog, seed: int):
+        self.rng = np.random.default_rng(seed)
+
+        self.sizes = list(PetSize)
+        self.groups = sorted(catalog.age_groups)
+        self.services = sorted(catalog.services)
+        self.masters = [m.id for m in catalog.active_masters()]
+        self.extras = np.array(sorted(catalog.extras))
+        self.extra_prices = np.array([catalog.extras[i].price for i in self.extras])
+
+        # цена и длительность по (услуга, размер, группа) из таблицы цен;
+        # -1 — нет тарифа
+        shape = (len(self.services), len(self.sizes), len(self.groups))
+        self.price = np.full(shape, -1)
+        self.duration = np.full(shape[:2], -1)
+        for s, service_id in enumerate(self.services):
+            for z, size in enumerate(self.sizes):
+                for g, group_id in enumerate(self.groups):
+                    quote = catalog.prices.quote(service_id, size, group_id)
+                    if quote:
+                        self.price[s, z, g] = quote.price
+                        self.duration[s, z] = quote.duration
+        # услуги, доступные для размера
+        self.size_services = [
+            np.flatnonzero(self.duration[:, z] > 0) for z in range(len(self.sizes))
+        ]
+        missing = [s.value for s, options in zip(self.sizes, self.size_services) if not len(options)]
+        if missing:
+            raise RuntimeError(f"Нет тарифов для размеров: {', '.join(missing)}")
+
+        self.breeds = {
+            species: [(b.id, b.default_size) for b in breeds]
+            for species, breeds in catalog.breeds.items()
+        }
+
+    def clients(self, first_id: int, count: int) -> list:
+        rng = self.rng
+        ids = np.arange(first_id, first_id + count)
+        first = rng.integers(len(FIRST_NAMES), size=count)
+        last = rng.integers(len(LAST_NAMES), size=count)
+        # номер — перестановка id в 9 цифрах: уникален для всех клиентов
+        numbers = (ids * 7919 + 1_000_003) % 10 ** 9
+
+        rows = []
+        for client_id, f, l, n in zip(ids.tolist(), first.tolist(), last.tolist(), numbers.tolist()):
+            # фамилия в женском роде для женских имён
+            last_name = LAST_NAMES[l] + ("а" if FIRST_NAMES[f][-1] == "а" else "")
+            rows.append(
+                (client_id, f"{last_name} {FIRST_NAMES[f]}", f"+79{n:09d}", f"79{n:09d}")
+            )
+        return rows
+
+    def pets(self, first_id: int, client_ids: np.ndarray):
+        """
+        Строки pets и массивы размера и группы (индексы) по питомцам
+        """
+        rng = self.rng
+        per_client = rng.choice(len(PETS_PER_CLIENT), size=len(client_ids), p=PETS_PER_CLIENT) + 1
+        owner = np.repeat(client_ids, per_client)
+        count = len(owner)
+
+        is_cat = rng.random(count) < CAT_SHARE
+        size = np.empty(count, dtype=np.int64)
+        breed = np.empty(count, dtype=np.int64)
+        for species, mask in (("cat", is_cat), ("dog", ~is_cat)):
+            options = self.breeds.get(species) or [(None, None)]
+            pick = rng.integers(len(options), size=int(mask.sum()))
+            breed[mask] = [options[i][0] or 0 for i in pick.tolist()]
+            # порода без размера по умолчанию — любой размер
+            random_size = rng.integers(len(self.sizes), size=len(pick))
+            size[mask] = [
+                self.sizes.index(options[i][1]) if options[i][1] else r
+                for i, r in zip(pick.tolist(), random_size.tolist())
+            ]
+
+        # другой набор групп — поровну
+        weights = GROUP_WEIGHTS if len(self.groups) == len(GROUP_WEIGHTS) else None
+        group = rng.choice(len(self.groups), size=count, p=weights)
+        names = rng.integers(len(PET_NAMES), size=count)
+
+        ids = np.arange(first_id, first_id + count)
+        rows = list(zip(
+            ids.tolist(),
+            [PET_NAMES[i] for i in names.tolist()],
+            np.where(is_cat, "cat", "dog").tolist(),
+            [b or None for b in breed.tolist()],
+            [self.groups[g] for g in group.tolist()],
+            [self.sizes[z].name for z in size.tolist()],
+            owner.tolist(),
+        ))
+        return rows, ids, owner, size, group
+
+    def orders(
+        self, first_id: int, days: list, today: date, per_day: int, extras_rate: float, pets,
+        busy: np.ndarray,
+    ):
+        """
+        Заявки на дни days по всем мастерам: строки orders и
+        order_extra_services. busy[день, мастер] — день мастера занят,
+        заявки на него не создаются
+        """
+        rng = self.rng
+        pet_ids, pet_owner, pet_size, pet_group = pets
+        slots = len(days) * len(self.masters)
+
+        pet = rng.integers(len(pet_ids), size=(slots, per_day))
+        size = pet_size[pet]
+        # услуга — случайная из доступных для размера
+        service = np.empty_like(pet)
+        for z, options in enumerate(self.size_services):
+            mask = size == z
+            if not mask.any():
+                continue
+            service[mask] = options[rng.integers(len(options), size=int(mask.sum()))]
+        duration = self.duration[service, size]
+
+        # заявки мастера за день идут подряд с перерывами; не
+        # поместившиеся до конца рабочего дня отбрасываются
+        gaps = GAPS[rng.integers(len(GAPS), size=pet.shape)]
+        end = _minutes(WORK_START) + np.cumsum(gaps + duration, axis=1)
+        start = end - duration
+        keep = (end <= _minutes(WORK_END)).ravel() & ~np.repeat(busy.ravel(), per_day)
+
+        day_index = np.repeat(np.arange(len(days)), len(self.masters) * per_day)[keep]
+        master = np.repeat(np.tile(self.masters, len(days)), per_day)[keep]
+        pet, service, start, end = (a.ravel()[keep] for a in (pet, service, start, end))
+        count = len(pet)
+
+        price = self.price[service, pet_size[pet], pet_group[pet]]
+        ids = np.arange(first_id, first_id + count)
+
+        # доп. услуги: одна, у 30% из них — ещё одна другая
+        extra_order, extra_index = self._extras(count, extras_rate)
+        np.add.at(price, extra_order, self.extra_prices[extra_index])
+
+        # в прошлом: выполнена / отменена; в будущем: запланирована / отменена
+        past = np.array([d < today for d in days])[day_index]
+        canceled = rng.random(count) < np.where(past, 0.15, 0.10)
+        status = np.where(
+            canceled,
+            OrderStatus.canceled.name,
+            np.where(past, OrderStatus.done.name, OrderStatus.planned.name),
+        )
+
+        day_names = np.array([d.isoformat() for d in days], dtype=object)
+        rows = zip(
+            ids.tolist(),
+            pet_owner[pet].tolist(),
+            pet_ids[pet].tolist(),
+            master.tolist(),
+            (np.array(self.services)[service]).tolist(),
+            price.tolist(),
+            day_names[day_index].tolist(),
+            TIMES[start].tolist(),
+            TIMES[end].tolist(),
+            status.tolist(),
+        )
+        extras = zip(ids[extra_order].tolist(), self.extras[extra_index].tolist())
+        return rows, extras, count, len(extra_order)
+
+    def _extras(self, count: int, rate: float):
+        """
+        Позиции заявок и индексы доп. услуг, без повторов в заявке
+        """
+        n = len(self.extras)
+        if not n:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        rng = self.rng
+        orders = np.flatnonzero(rng.random(count) < rate)
+        first = rng.integers(n, size=len(orders))
+        two = (rng.random(len(orders)) < 0.3) & (n > 1)
+        second = (first[two] + 1 + rng.integers(max(n - 1, 1), size=int(two.sum()))) % n
+        return np.concatenate([orders, orders[two]]), np.concatenate([first, second])
+
+
+# =====================================================
+# LOAD
+# =====================================================
+def _next_id(cursor, table: str) -> int:
+    return cursor.execute(f"SELECT coalesce(max(id), 0) + 1 FROM {table}").fetchone()[0]
+
+
+def existing_data(cursor) -> dict:
+    return {
+        table: cursor.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+        for table in ("clients", "orders")
+    }
+
+
+def busy_days(cursor, days: list, masters: list) -> np.ndarray:
+    """
+    [день, мастер]: есть неотменённые заявки
+    """
+    busy = np.zeros((len(days), len(masters)), dtype=bool)
+    day_index = {d.isoformat(): i for i, d in enumerate(days)}
+    master_index = {m: i for i, m in enumerate(masters)}
+    for day, master_id in cursor.execute(
+        "SELECT DISTINCT date, master_id FROM orders"
+        " WHERE date BETWEEN ? AND ? AND status != ?",
+        (days[0].isoformat(), days[-1].isoformat(), OrderStatus.canceled.name),
+    ):
+        if master_id in master_index:
+            busy[day_index[day], master_index[master_id]] = True
+    return busy
+
+
+def ensure_masters(count: int):
+    """
+    Дополнить активных мастеров до count
+    """
+    with SessionLocal() as db:
+        active = db.query(Master).filter(Master.active.is_(True)).count()
+        for n in range(active, count):
+            db.add(Master(name=f"Мастер {n + 1}", group="AB"[n % 2], active=True))
+        db.commit()
+
+
+def generate(
+    engine: Engine,
+    clients: int,
+    days: int,
+    start: date,
+    today: date,
+    per_day: int,
+    masters: int = 0,
+    extras_rate: float = 0.25,
+    seed: int = 1,
+    batch: int = 200_000,
+    allow_existing: bool = False,
+    log=print,
+) -> dict:
+    """
+    Загрузить данные; today отделяет прошлые заявки от будущих.
+    RuntimeError, если в базе уже есть клиенты или заявки, а
+    allow_existing не задан
+    """
+    with engine.connect() as conn:
+        found = existing_data(conn.connection.cursor())
+    if any(found.values()) and not allow_existing:
+        raise RuntimeError(
+            f"В базе уже есть данные ({found}): генератор не для рабочей базы,"
+            " для дозаписи — allow_existing / --allow-existing"
+        )
+
+    if masters:
+        ensure_masters(masters)
+    with SessionLocal() as db:
+        catalog = Catalog(db, 0)
+    gen = Generator(catalog, seed)
+    if not gen.masters or not gen.groups:
+        raise RuntimeError("Нет мастеров или возрастных групп: сначала python -m app.init_data")
+
+    started = time.perf_counter()
+    stats = {"clients": 0, "pets": 0, "orders": 0, "extras": 0}
+
+    raw = engine.raw_connection()
+    cursor = raw.cursor()
+    triggers = cursor.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"
+        f" AND tbl_name IN ({', '.join(repr(t) for t in GENERATED_TABLES)})"
+    ).fetchall()
+    try:
+        # ключи генерируются согласованно; соединение потом не вернётся в пул
+        cursor.execute("PRAGMA foreign_keys = OFF")
+        cursor.execute("PRAGMA synchronous = OFF")
+        cursor.execute("PRAGMA cache_size = -524288")
+        for name, _ in triggers:
+            cursor.execute(f"DROP TRIGGER {name}")
+        raw.commit()
+
+        first_client = _next_id(cursor, "clients")
+        orders_version = cursor.execute(
+            f"SELECT version + 1 FROM {COUNTERS_TABLE} WHERE name = 'orders'"
+        ).fetchone()[0]
+
+        # ---------- CLIENTS & PETS ----------
+        # номер уже занят клиентом не из генератора — без телефона
+        taken = {r[0] for r in cursor.execute(
+            "SELECT phone_key FROM clients WHERE phone_key IS NOT NULL"
+        )}
+        next_pet = _next_id(cursor, "pets")
+        pets = []
+        for first in range(first_client, first_client + clients, batch):
+            count = min(batch, first_client + clients - first)
+            cursor.executemany(
+                "INSERT INTO clients (id, full_name, phone, phone_key) VALUES (?, ?, ?, ?)",
+                (
+                    row if row[3] not in taken else (*row[:2], None, None)
+                    for row in gen.clients(first, count)
+                ),
+            )
+            pet_rows, *columns = gen.pets(next_pet, np.arange(first, first + count))
+            cursor.executemany(
+                "INSERT INTO pets (id, name, species, breed_id, age_group_id, size, client_id)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                pet_rows,
+            )
+            raw.commit()
+            next_pet += len(pet_rows)
+            pets.append(columns)
+            stats["clients"] += count
+            stats["pets"] += len(pet_rows)
+            log(f"clients: {stats['clients']} ({time.perf_counter() - started:.0f} s)")
+        # (id, владелец, размер, группа) питомцев всех пачек
+        if pets:
+            pets = tuple(np.concatenate(column) for column in zip(*pets))
+        else:
+            pets = tuple(gen.pets(next_pet, np.arange(0))[1:])
+
+        # ---------- ORDERS ----------
+        next_id = _next_id(cursor, "orders")
+        all_days = [start + timedelta(days=i) for i in range(days)]
+        days_per_batch = max(1, batch // max(1, per_day * len(gen.masters)))
+        for i in range(0, days, days_per_batch):
+            batch_days = all_days[i:i + days_per_batch]
+            rows, extras, count, extra_count = gen.orders(
+                next_id, batch_days, today, per_day, extras_rate, pets,
+                busy_days(cursor, batch_days, gen.masters),
+            )
+            cursor.executemany(
+                "INSERT INTO orders (id, client_id, pet_id, master_id, service_id, price,"
+                f" date, start_time, end_time, status, version)"
+                f" VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {orders_version})",
+                rows,
+            )
+            cursor.executemany(
+                "INSERT INTO order_extra_services (order_id, extra_service_id) VALUES (?, ?)",
+                extras,
+            )
+            raw.commit()
+            next_id += count
+            stats["orders"] += count
+            stats["extras"] += extra_count
+            log(f"orders: {stats['orders']} ({time.perf_counter() - started:.0f} s)")
+    finally:
+        # sqlite_master хранит CREATE TRIGGER без IF NOT EXISTS
+        raw.rollback()
+        existing = {r[0] for r in cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+        )}
+        for name, sql in triggers:
+            if name not in existing:
+                cursor.execute(sql)
+        raw.commit()
+        raw.invalidate()
+
+        # производные данные — одним проходом по вставленному
+        with engine.begin() as conn:
+            if stats["clients"]:
+                conn.execute(text(search_backfill(f"c.id >= {first_client}")))
+            rebuild_rollup(conn)
+            conn.execute(text(
+                f"UPDATE {COUNTERS_TABLE} SET version = version + 1,"
+                f" changed_at = strftime('%Y-%m-%d %H:%M:%f', 'now')"
+                f" WHERE name IN ({', '.join(repr(t) for t in GENERATED_TABLES)})"
+            ))
+
+    stats["seconds"] = round(time.perf_counter() - started, 1)
+    stats["orders_per_s"] = round(stats["orders"] / max(stats["seconds"], 0.1))
+    return stats
+
+
+if __name__ == "__main__":
+    from app.migrations import upgrade_database
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=10_000)
+    parser.add_argument("--masters", type=int, default=0,
+                        help="дополнить активных мастеров до этого числа")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--today", type=date.fromisoformat, default=date.today(),
+                        help="граница прошлых и будущих заявок (по умолчанию — сегодня)")
+    parser.add_argument("--start", type=date.fromisoformat,
+                        help="первый день (по умолчанию — чтобы 30 дней были после --today)")
+    parser.add_argument("--orders-per-day", type=int, default=8,
+                        help="заявок на мастера в день, не больше чем помещается")
+    parser.add_argument("--extras-rate", type=float, default=0.25)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=200_000, help="клиентов или заявок на транзакцию")
+    parser.add_argument("--allow-existing", action="store_true",
+                        help="дописать в базу, где уже есть клиенты или заявки")
+    args = parser.parse_args()
+
+    upgrade_database(engine)
+    init_all()
+
+    start = args.start or args.today - timedelta(days=max(args.days - 30, 0))
+    print(generate(
+        engine, args.clients, args.days, start, args.today, args.orders_per_day,
+        masters=args.masters, extras_rate=args.extras_rate, seed=args.seed, batch=args.batch,
+        allow_existing=args.allow_existing,
+    ))
@@ -1,6 +1,24 @@
+"""
+Начальные данные: пользователи и справочники.
+
+Наполнение версионировано: номер SEED_VERSION хранится в таблице
+seed_state, и если база уже на этой версии, init_all() ограничивается
+одним запросом. Иначе каждая таблица дополняется недостающими строками
+(один SELECT существующих ключей и один INSERT на таблицу).
+
+Наполнение идёт внутри BEGIN IMMEDIATE: при запуске нескольких воркеров
+наполняет один, остальные дожидаются блокировки, видят новую версию
+и ничего не делают.
+
+    python -m app.init_data   # миграции и наполнение без запуска сервера
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import insert, text
 from sqlalchemy.orm import Session
 
-from app.database import SessionLocal
+from app.database import SessionLocal, begin_write, engine
 from app.models import (
     User,
     Master,
@@ -8,21 +26,45 @@ from app.models import (
     AgeGroup,
     Service,
     ServiceTariff,
-    ExtraService
+    ExtraService,
+    PetSize,
 )
 
 from app.auth import get_password_hash
 
+# увеличить при изменении данных ниже
+SEED_VERSION = 1
+
 
 # =====================================================
 # HELPERS
 # =====================================================
-def get_db() -> Session:
-    return SessionLocal()
-
-
-def exists(db: Session, model, **kwargs) -> bool:
-    return db.query(model).filter_by(**kwargs).first() is not None
+def insert_missing(db: Session, model, key_columns, rows: list) -> int:
+    """
+    Вставить строки, ключей которых ещё нет в таблице.
+    rows — словари значений; ключ строки — значения key_columns.
+    """
+    columns = [getattr(model, c) for c in key_columns]
+    existing = set(db.query(*columns).all())
+
+    missing = {}
+    for row in rows:
+        key = tuple(row[c] for c in key_columns)
+        if key not in existing:
+            missing.setdefault(key, row)
+
+    if missing:
+        db.execute(insert(model), list(missing.values()))
+    return len(missing)
+
+
+def seed_version(db: Session) -> int:
+    db.execute(text(
+        "CREATE TABLE IF NOT EXISTS seed_state ("
+        " version INTEGER PRIMARY KEY,"
+        " applied_at TEXT NOT NULL)"
+    ))
+    return db.execute(text("SELECT MAX(version) FROM seed_state")).scalar() or 0
 
 
 # =====================================================
@@ -44,19 +86,20 @@ def init_users(db: Session):
         ("master4", "master123", "master", "Попов Алексей Сергеевич"),
     ]
 
-    for login, password, role, full_name in users:
-        if exists(db, User, login=login):
-            continue
+    existing = {login for login, in db.query(User.login)}
+    missing = [u for u in users if u[0] not in existing]
+    if not missing:
+        return
 
-        db.add(User(
-            login=login,
-            password=get_password_hash(password),
-            role=role,
-            full_name=full_name,
-            active=True
-        ))
+    # bcrypt отпускает GIL — хэши считаются параллельно
+    with ThreadPoolExecutor(len(missing)) as pool:
+        hashes = list(pool.map(get_password_hash, [u[1] for u in missing]))
 
-    db.commit()
+    db.execute(insert(User), [
+        dict(login=login, password=password_hash, role=role,
+             full_name=full_name, active=True)
+        for (login, _, role, full_name), password_hash in zip(missing, hashes)
+    ])
 
 
 # =====================================================
@@ -70,17 +113,10 @@ def init_masters(db: Session):
         ("Попов Алексей Сергеевич", "B"),
     ]
 
-    for name, group in masters:
-        if exists(db, Master, name=name):
-            continue
-
-        db.add(Master(
-            name=name,
-            group=group,
-            active=True
-        ))
-
-    db.commit()
+    insert_missing(db, Master, ("name",), [
+        dict(name=name, group=group, active=True)
+        for name, group in masters
+    ])
 
 
 # =====================================================
@@ -93,16 +129,10 @@ def init_age_groups(db: Session):
         ("Пожилой", 110),
     ]
 
-    for name, factor in groups:
-        if exists(db, AgeGroup, name=name):
-            continue
-
-        db.add(AgeGroup(
-            name=name,
-            price_factor=factor
-        ))
-
-    db.commit()
+    insert_missing(db, AgeGroup, ("name",), [
+        dict(name=name, price_factor=factor)
+        for name, factor in groups
+    ])
 
 
 # =====================================================
@@ -145,17 +175,10 @@ def init_breeds(db: Session):
         ("Сфинкс", "cat", "medium"),
     ]
 
-    for name, species, size in dog_breeds + cat_breeds:
-        if exists(db, Breed, name=name, species=species):
-            continue
-
-        db.add(Breed(
-            name=name,
-            species=species,
-            default_size=size
-        ))
-
-    db.commit()
+    insert_missing(db, Breed, ("name", "species"), [
+        dict(name=name, species=species, default_size=size)
+        for name, species, size in dog_breeds + cat_breeds
+    ])
 
 
 # =====================================================
@@ -170,13 +193,9 @@ def init_services(db: Session):
         "Экспресс-линька",
     ]
 
-    for name in services:
-        if exists(db, Service, name=name):
-            continue
-
-        db.add(Service(name=name))
-
-    db.commit()
+    insert_missing(db, Service, ("name",), [
+        dict(name=name) for name in services
+    ])
 
 
 # =====================================================
@@ -213,24 +232,12 @@ def init_tariffs(db: Session):
         ("Стрижка", "extra_large", 8000, 210),
     ]
 
-    for service_name, size, price, duration in tariffs:
-        service_id = service_map.get(service_name)
-        if not service_id:
-            continue
-
-        if exists(db, ServiceTariff,
-                  service_id=service_id,
-                  size=size):
-            continue
-
-        db.add(ServiceTariff(
-            service_id=service_id,
-            size=size,
-            price=price,
-            duration=duration
-        ))
-
-    db.commit()
+    insert_missing(db, ServiceTariff, ("service_id", "size"), [
+        dict(service_id=service_map[service_name], size=PetSize[size],
+             price=price, duration=duration)
+        for service_name, size, price, duration in tariffs
+        if service_name in service_map
+    ])
 
 
 # =====================================================
@@ -246,30 +253,53 @@ def init_extra_services(db: Session):
         ("Сухой уход для щенков/котят до 3 месяцев", 500),
     ]
 
-    for name, price in extras:
-        if exists(db, ExtraService, name=name):
-            continue
-
-        db.add(ExtraService(
-            name=name,
-            price=price
-        ))
-
-    db.commit()
+    insert_missing(db, ExtraService, ("name",), [
+        dict(name=name, price=price) for name, price in extras
+    ])
 
 
 # =====================================================
 # MAIN ENTRY
 # =====================================================
-def init_all():
-    db = get_db()
-
-    init_users(db)
-    init_masters(db)
-    init_age_groups(db)
-    init_breeds(db)
-    init_services(db)
-    init_tariffs(db)
-    init_extra_services(db)
-
-    db.close()
+def init_all() -> bool:
+    """
+    Наполнить базу до SEED_VERSION. Возвращает True, если что-то делалось.
+    """
+    db = SessionLocal()
+    try:
+        if seed_version(db) >= SEED_VERSION:
+            return False
+        db.rollback()
+
+        # блокировка записи на всю базу: второй процесс ждёт здесь
+        begin_write(db)
+        if seed_version(db) >= SEED_VERSION:
+            db.rollback()
+            return False
+
+        init_users(db)
+        init_masters(db)
+        init_age_groups(db)
+        init_breeds(db)
+        init_services(db)
+        init_tariffs(db)
+        init_extra_services(db)
+
+        db.execute(
+            text(
+                "INSERT INTO seed_state (version, applied_at) "
+                "VALUES (:version, :applied_at)"
+            ),
+            {"version": SEED_VERSION, "applied_at": datetime.utcnow().isoformat()},
+        )
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    from app.migrations import upgrade_database
+
+    upgrade_database(engine)
+    print("seeded:", f"version {SEED_VERSION}" if init_all() else "up to date")
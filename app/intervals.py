@@ -0,0 +1,277 @@
+"""
+Индекс занятости мастеров в памяти процесса.
+
+Для каждой пары (мастер, дата) хранятся отсортированные по началу
+интервалы неотменённых заявок и несозданных вхождений серий. Проверка
+пересечения — бинарный поиск и короткий проход назад (DayIntervals).
+Источник истины — таблица orders: день загружается из неё при первом
+обращении, а invalidate() сбрасывает индекс целиком или частично.
+
+Заявки пишут и другие процессы uvicorn, поэтому перед проверкой запись
+вызывает sync() внутри своей транзакции BEGIN IMMEDIATE: по счётчику
+изменений orders (app/changes.py) в загруженные дни подтягиваются
+заявки с version больше уже учтённого номера, а удалённые и
+перенесённые убираются по order_tombstones. Пока транзакция держит
+блокировку записи, никто другой не может зафиксировать заявку, и
+проверка по индексу равносильна проверке по таблице.
+
+Запись заявки выполняется под блокировкой мастера (master_lock), поэтому
+два параллельных запроса одного процесса не могут одновременно пройти
+проверку и занять одно и то же время.
+"""
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import date, time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.changes import TOMBSTONES_TABLE, counters_state, read_counters
+from app.models import Order, OrderStatus
+from app.recurrence import pending_occurrences
+
+# таблицы серий: их изменение сбрасывает индекс целиком
+SERIES_TABLES = ("order_series", "order_series_exceptions")
+
+# больше изменений с прошлой сверки — индекс сбрасывается, а не догоняется
+SYNC_MAX_CHANGES = 1000
+
+
+def to_minutes(t: time) -> int:
+    return t.hour * 60 + t.minute
+
+
+class DayIntervals:
+    """
+    Интервалы одного мастера за один день, упорядоченные по началу.
+
+    Интервалы могут пересекаться: старые заявки, записанные до проверки
+    под блокировкой, или вхождения серий дальше SERIES_CHECK_DAYS.
+    reach[i] — наибольший конец среди первых i + 1 интервалов: поиск
+    идёт назад от последнего начавшегося до end, пока более ранние
+    интервалы ещё могут доходить до start.
+    """
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.order_ids: List[int] = []
+        self.reach: List[int] = []
+
+    def add(self, start: int, end: int, order_id: int):
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.order_ids.insert(i, order_id)
+        self.reach.insert(i, 0)
+        self._update_reach(i)
+
+    def remove(self, order_id: int):
+        if order_id in self.order_ids:
+            i = self.order_ids.index(order_id)
+            del self.starts[i], self.ends[i], self.order_ids[i], self.reach[i]
+            self._update_reach(i)
+
+    def _update_reach(self, i: int):
+        reach = self.reach[i - 1] if i else 0
+        for k in range(i, len(self.ends)):
+            reach = max(reach, self.ends[k])
+            self.reach[k] = reach
+
+    def find_conflict(
+        self, start: int, end: int, exclude_id: Optional[int] = None
+    ) -> Optional[int]:
+        i = bisect_left(self.starts, end) - 1
+        while i >= 0 and self.reach[i] > start:
+            if self.ends[i] > start and self.order_ids[i] != exclude_id:
+                return self.order_ids[i]
+            i -= 1
+        return None
+
+
+class IntervalIndex:
+    def __init__(self):
+        self._days: Dict[Tuple[int, date], DayIntervals] = {}
+        self._keys: Dict[int, Tuple[int, date]] = {}
+        self._master_locks: Dict[int, threading.Lock] = {}
+        self._lock = threading.Lock()
+        # номер изменения заявок и версия серий, с которыми сверен индекс
+        self._seq: Optional[int] = None
+        self._series: Optional[int] = None
+        self._sync_lock = threading.Lock()
+
+    # ---------- LOCKS ----------
+    @contextmanager
+    def master_lock(self, *master_ids: int):
+        """
+        Блокировка записи для одного или нескольких мастеров.
+        Захватываются в порядке id, чтобы перенос между мастерами
+        не приводил к взаимной блокировке.
+        """
+        with self._lock:
+            locks = [
+                self._master_locks.setdefault(m, threading.Lock())
+                for m in sorted(set(master_ids))
+            ]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    # ---------- LOAD ----------
+    def preload(self, db: Session, keys: Iterable[Tuple[int, date]]):
+        """
+        Загрузить недостающие дни одним запросом
+        """
+        with self._lock:
+            missing = {key for key in keys if key not in self._days}
+        if not missing:
+            return
+
+        rows = db.query(
+            Order.id, Order.master_id, Order.date, Order.start_time, Order.end_time
+        ).filter(
+            Order.master_id.in_({master_id for master_id, _ in missing}),
+            Order.date.in_({day for _, day in missing}),
+            Order.status != OrderStatus.canceled,
+        )
+
+        loaded = {key: DayIntervals() for key in missing}
+        for r in rows:
+            intervals = loaded.get((r.master_id, r.date))
+            if intervals is not None:
+                intervals.add(to_minutes(r.start_time), to_minutes(r.end_time), r.id)
+
+        # несозданные вхождения серий тоже занимают время (id < 0)
+        days = [day for _, day in missing]
+        for series, day in pending_occurrences(
+            db, min(days), max(days), {master_id for master_id, _ in missing}
+        ):
+            intervals = loaded.get((series.master_id, day))
+            if intervals is not None:
+                intervals.add(
+                    to_minutes(series.start_time), to_minutes(series.end_time), -series.id
+                )
+
+        with self._lock:
+            for key, intervals in loaded.items():
+                # другой поток мог успеть загрузить тот же день
+                intervals = self._days.setdefault(key, intervals)
+                for order_id in intervals.order_ids:
+                    self._keys[order_id] = key
+
+    def _day(self, db: Session, master_id: int, day: date) -> DayIntervals:
+        key = (master_id, day)
+        while True:
+            with self._lock:
+                intervals = self._days.get(key)
+            if intervals is not None:
+                return intervals
+            self.preload(db, [key])
+
+    # ---------- QUERIES ----------
+    def find_conflict(
+        self,
+        db: Session,
+        master_id: int,
+        day: date,
+        start: time,
+        end: time,
+        exclude_id: Optional[int] = None,
+    ) -> Optional[int]:
+        """
+        id заявки, пересекающейся с [start, end), или None
+        """
+        intervals = self._day(db, master_id, day)
+        with self._lock:
+            return intervals.find_conflict(
+                to_minutes(start), to_minutes(end), exclude_id
+            )
+
+    # ---------- SYNC ----------
+    def sync(self, db: Session):
+        """
+        Учесть изменения заявок и серий, сделанные после прошлой сверки,
+        в том числе другими процессами
+        """
+        counters = read_counters(db, ("orders",) + SERIES_TABLES)
+        seq = counters.pop("orders", (0, None))[0]
+        series = counters_state(counters)[0]
+
+        with self._sync_lock:
+            if (
+                self._seq is None
+                or series != self._series
+                or seq < self._seq
+                or seq - self._seq > SYNC_MAX_CHANGES
+            ):
+                self.invalidate()
+            elif seq > self._seq:
+                self._apply_changes(db, self._seq)
+            self._seq, self._series = seq, series
+
+    def _apply_changes(self, db: Session, since: int):
+        removed = db.execute(
+            text(f"SELECT DISTINCT order_id FROM {TOMBSTONES_TABLE} WHERE version > :since"),
+            {"since": since},
+        ).scalars().all()
+        rows = db.query(
+            Order.id, Order.master_id, Order.date, Order.start_time, Order.end_time, Order.status
+        ).filter(Order.version > since).all()
+
+        with self._lock:
+            for order_id in removed:
+                self._remove_locked(order_id)
+            for r in rows:
+                self._remove_locked(r.id)
+                if r.status != OrderStatus.canceled:
+                    self._add_locked((r.master_id, r.date), r.start_time, r.end_time, r.id)
+
+    # ---------- UPDATES ----------
+    def add(self, order: Order):
+        if order.status == OrderStatus.canceled:
+            return self.remove(order.id)
+
+        with self._lock:
+            self._remove_locked(order.id)
+            self._add_locked(
+                (order.master_id, order.date), order.start_time, order.end_time, order.id
+            )
+
+    def _add_locked(self, key: Tuple[int, date], start: time, end: time, order_id: int):
+        intervals = self._days.get(key)
+        # незагруженный день подтянется из БД при первом обращении
+        if intervals is None:
+            return
+        intervals.add(to_minutes(start), to_minutes(end), order_id)
+        self._keys[order_id] = key
+
+    def remove(self, order_id: int):
+        with self._lock:
+            self._remove_locked(order_id)
+
+    def _remove_locked(self, order_id: int):
+        key = self._keys.pop(order_id, None)
+        if key and key in self._days:
+            self._days[key].remove(order_id)
+
+    def invalidate(self, master_id: Optional[int] = None, day: Optional[date] = None):
+        """
+        Сбросить индекс (весь, по мастеру или по мастеру и дню)
+        """
+        with self._lock:
+            for key in list(self._days):
+                if master_id is not None and key[0] != master_id:
+                    continue
+                if day is not None and key[1] != day:
+                    continue
+                for order_id in self._days.pop(key).order_ids:
+                    self._keys.pop(order_id, None)
+
+
+order_intervals = IntervalIndex()
@@ -1,20 +1,28 @@
+import os
+
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
-from app.database import Base, engine
 from app.auth import router as auth_router
 from app.clients import router as clients_router
 from app.pets import router as pets_router
 from app.orders import router as orders_router
+from app.series import router as series_router
 from app.init_data import init_all
+from app.migrations import upgrade_database
 from app.masters import router as masters_router
 from app.services import router as services_router
 from app.breeds import router as breeds_router
+from app.reports import router as reports_router
+
 
+# схема и миграции — под блокировкой записи, см. app/migrations.py
+upgrade_database()
 
-Base.metadata.create_all(bind=engine)
-init_all()
+# в проде наполнение запускается отдельно: python -m app.init_data
+if os.environ.get("SEED_ON_STARTUP", "1") != "0":
+    init_all()
 
 app = FastAPI(title="Grooming IS")
 
@@ -37,7 +45,9 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 app.include_router(auth_router)
 app.include_router(clients_router)
 app.include_router(pets_router)
+app.include_router(series_router)
 app.include_router(orders_router)
 app.include_router(masters_router)
 app.include_router(services_router)
 app.include_router(breeds_router)
+app.include_router(reports_router)
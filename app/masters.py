@@ -1,35 +1,29 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Request, Response
 
-from app.database import SessionLocal
-from app.models import Master
 from app.auth import get_current_user
+from app.catalog import Catalog, get_catalog
 
 router = APIRouter(prefix="/masters", tags=["Masters"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.get("")
-def get_masters(
-    db: Session = Depends(get_db),
+async def get_masters(
+    request: Request,
+    response: Response,
+    catalog: Catalog = Depends(get_catalog),
     user=Depends(get_current_user),
 ):
     """
     Получить список активных мастеров
     """
-    masters = db.query(Master).filter(Master.active == True).all()
+    not_modified = catalog.validator("masters").apply(request, response)
+    if not_modified:
+        return not_modified
 
     return [
         {
             "id": m.id,
             "name": m.name,
         }
-        for m in masters
+        for m in catalog.active_masters()
     ]
@@ -0,0 +1,352 @@
+"""
+Версионированные миграции схемы.
+
+Base.metadata.create_all создаёт только отсутствующие таблицы и не трогает
+уже существующий database.db. Всё, что меняет существующие таблицы
+(индексы, колонки, перенос данных), оформляется здесь шагом с номером версии.
+
+upgrade_database() выполняет оба этапа при старте каждого воркера uvicorn.
+create_all и каждая миграция идут в транзакции BEGIN IMMEDIATE: воркеры
+на новой базе выполняют их по очереди, и следующий видит уже созданные
+таблицы и записанные версии.
+
+    python -m app.migrations          # применить миграции
+    python -m app.migrations --check  # EXPLAIN QUERY PLAN горячих запросов
+"""
+import sys
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.database import Base, begin_immediate, engine as default_engine
+from app import models  # noqa: F401  — индексы объявлены в моделях
+from app.models import normalize_phone
+from app.search import SEARCH_BACKFILL, SEARCH_DDL, SEARCH_TABLE
+from app.changes import (
+    CHANGES_DDL,
+    CHANGES_DROPPED_TRIGGERS,
+    CHANGES_REPLACED_TRIGGERS,
+    CHANGES_SEED,
+    TRACKED_TABLES,
+)
+from app.rollup import ROLLUP_DDL, rebuild_rollup
+
+
+MIGRATIONS = []
+
+
+def migration(version: int, description: str):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+# =====================================================
+# HELPERS
+# =====================================================
+def create_indexes(conn: Connection, *names: str):
+    """
+    Создать индексы, объявленные в моделях, если их ещё нет
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in names:
+                index.create(conn, checkfirst=True)
+
+
+def add_column(conn: Connection, table: str, column: str, ddl: str):
+    """
+    ALTER TABLE ... ADD COLUMN, если колонки ещё нет
+    (на новой базе её уже создал create_all)
+    """
+    columns = {r.name for r in conn.execute(text(f"PRAGMA table_info({table})"))}
+    if column not in columns:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def applied_versions(conn: Connection) -> set:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY,"
+        " description TEXT NOT NULL,"
+        " applied_at TEXT NOT NULL)"
+    ))
+    rows = conn.execute(text("SELECT version FROM schema_migrations"))
+    return {r.version for r in rows}
+
+
+# =====================================================
+# MIGRATIONS
+# =====================================================
+@migration(1, "Индексы для заявок, клиентов и питомцев")
+def add_hot_query_indexes(conn: Connection):
+    create_indexes(
+        conn,
+        "ix_orders_master_date",
+        "ix_orders_date",
+        "ix_order_extra_services_order_id",
+        "ix_clients_phone",
+        "ix_clients_full_name",
+        "ix_pets_client_id",
+    )
+
+
+@migration(2, "Повторяющиеся серии: orders.series_id")
+def add_order_series(conn: Connection):
+    add_column(conn, "orders", "series_id", "INTEGER REFERENCES order_series(id)")
+    create_indexes(conn, "ux_orders_series_date")
+
+
+@migration(3, "Полнотекстовый поиск клиентов (FTS5) и триггеры")
+def add_client_search(conn: Connection):
+    for ddl in SEARCH_DDL:
+        conn.exec_driver_sql(ddl)
+    conn.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    conn.execute(text(SEARCH_BACKFILL))
+
+
+@migration(4, "Нормализованный телефон клиента: clients.phone_key")
+def add_client_phone_key(conn: Connection):
+    add_column(conn, "clients", "phone_key", "TEXT")
+
+    # при дублях номера ключ получает самый ранний клиент,
+    # остальные остаются доступны поиском по имени
+    seen = {
+        r.phone_key
+        for r in conn.execute(text(
+            "SELECT phone_key FROM clients WHERE phone_key IS NOT NULL"
+        ))
+    }
+    updates = []
+    for r in conn.execute(text(
+        "SELECT id, phone FROM clients"
+        " WHERE phone IS NOT NULL AND phone_key IS NULL ORDER BY id"
+    )):
+        key = normalize_phone(r.phone)
+        if key and key not in seen:
+            seen.add(key)
+            updates.append({"id": r.id, "key": key})
+
+    if updates:
+        conn.execute(text("UPDATE clients SET phone_key = :key WHERE id = :id"), updates)
+
+    conn.execute(text("DROP INDEX IF EXISTS ix_clients_phone"))
+    create_indexes(conn, "ux_clients_phone_key")
+
+
+@migration(5, "Счётчики изменений таблиц и orders.version для ETag")
+def add_change_counters(conn: Connection):
+    add_column(conn, "orders", "version", "INTEGER NOT NULL DEFAULT 0")
+    create_indexes(conn, "ix_orders_date_version")
+
+    for ddl in CHANGES_DDL:
+        conn.exec_driver_sql(ddl)
+    conn.execute(text(CHANGES_SEED), [{"name": t} for t in TRACKED_TABLES])
+
+
+@migration(6, "Удалённые и перенесённые заявки: order_tombstones")
+def add_order_tombstones(conn: Connection):
+    for trigger in CHANGES_REPLACED_TRIGGERS:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    for ddl in CHANGES_DDL:
+        conn.exec_driver_sql(ddl)
+
+
+@migration(7, "Индексы по номеру изменения для опроса push-уведомлений")
+def add_orders_version_index(conn: Connection):
+    create_indexes(conn, "ix_orders_version")
+    for ddl in CHANGES_DDL:
+        conn.exec_driver_sql(ddl)
+
+
+@migration(8, "Дневная сводка заявок daily_order_stats и триггеры")
+def add_daily_rollup(conn: Connection):
+    # таблицу создаёт create_all
+    for ddl in ROLLUP_DDL:
+        conn.exec_driver_sql(ddl)
+    rebuild_rollup(conn)
+
+
+@migration(9, "Счётчик изменений order_extra_services")
+def add_report_counters(conn: Connection):
+    for ddl in CHANGES_DDL:
+        conn.exec_driver_sql(ddl)
+    conn.execute(text(CHANGES_SEED), [{"name": t} for t in TRACKED_TABLES])
+
+
+@migration(10, "Счётчики клиентов и питомцев — без вставок")
+def drop_insert_counters(conn: Connection):
+    for trigger in CHANGES_DROPPED_TRIGGERS:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+
+
+@migration(11, "Правка доп. услуг меняет версию заявки")
+def add_extras_order_stamp(conn: Connection):
+    for ddl in CHANGES_DDL:
+        conn.exec_driver_sql(ddl)
+
+
+@migration(12, "Счётчик изменений users для кэша токенов")
+def add_users_counter(conn: Connection):
+    for ddl in CHANGES_DDL:
+        conn.exec_driver_sql(ddl)
+    conn.execute(text(CHANGES_SEED), [{"name": t} for t in TRACKED_TABLES])
+
+
+# =====================================================
+# RUNNER
+# =====================================================
+def run_migrations(engine: Engine = default_engine) -> list:
+    """
+    Применить недостающие миграции по порядку, каждую в своей транзакции.
+    Возвращает список применённых версий.
+    """
+    applied = []
+
+    for version, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        # версия проверяется под блокировкой записи: параллельный процесс
+        # ждёт здесь и пропускает уже применённую миграцию
+        with begin_immediate(engine) as conn:
+            if version in applied_versions(conn):
+                continue
+
+            fn(conn)
+            conn.execute(
+                text(
+                    "INSERT OR IGNORE INTO schema_migrations "
+                    "(version, description, applied_at) "
+                    "VALUES (:version, :description, :applied_at)"
+                ),
+                {
+                    "version": version,
+                    "description": description,
+                    "applied_at": datetime.utcnow().isoformat(),
+                },
+            )
+        applied.append(version)
+
+    return applied
+
+
+def upgrade_database(engine: Engine = default_engine) -> list:
+    """
+    Создать недостающие таблицы и применить миграции.
+    Возвращает список применённых версий.
+    """
+    with begin_immediate(engine) as conn:
+        Base.metadata.create_all(bind=conn)
+    return run_migrations(engine)
+
+
+# =====================================================
+# QUERY PLAN CHECK
+# =====================================================
+HOT_QUERIES = {
+    "schedule_range": (
+        "SELECT id FROM orders WHERE date >= :date_from AND date <= :date_to",
+        {"date_from": "2026-01-05", "date_to": "2026-01-11"},
+    ),
+    "schedule_range_master": (
+        "SELECT id FROM orders WHERE date >= :date_from AND date <= :date_to"
+        " AND master_id = :master_id",
+        {"date_from": "2026-01-05", "date_to": "2026-01-11", "master_id": 1},
+    ),
+    "conflict_check": (
+        "SELECT id FROM orders WHERE master_id = :master_id AND date = :date"
+        " AND status != 'canceled' AND start_time < :end AND end_time > :start",
+        {"master_id": 1, "date": "2026-01-05",
+         "start": "10:00:00.000000", "end": "11:30:00.000000"},
+    ),
+    "double_submit": (
+        "SELECT id FROM orders WHERE client_id = :client_id AND pet_id = :pet_id"
+        " AND master_id = :master_id AND service_id = :service_id"
+        " AND date = :date AND start_time = :start AND end_time = :end",
+        {"client_id": 1, "pet_id": 1, "master_id": 1, "service_id": 1,
+         "date": "2026-01-05", "start": "10:00:00.000000", "end": "11:30:00.000000"},
+    ),
+    "schedule_validator": (
+        "SELECT max(version), count(*) FROM orders"
+        " WHERE date >= :date_from AND date <= :date_to",
+        {"date_from": "2026-01-05", "date_to": "2026-01-11"},
+    ),
+    "schedule_changes": (
+        "SELECT id FROM orders WHERE date >= :date_from AND date <= :date_to"
+        " AND version > :since",
+        {"date_from": "2026-01-05", "date_to": "2026-01-11", "since": 100},
+    ),
+    "schedule_tombstones": (
+        "SELECT DISTINCT order_id FROM order_tombstones"
+        " WHERE date >= :date_from AND date <= :date_to AND version > :since",
+        {"date_from": "2026-01-05", "date_to": "2026-01-11", "since": 100},
+    ),
+    "order_events_poll": (
+        "SELECT id, date, master_id, status FROM orders"
+        " WHERE version > :since AND version <= :seq ORDER BY version",
+        {"since": 100, "seq": 110},
+    ),
+    "rollup_range": (
+        "SELECT master_id, sum(booked_minutes) FROM daily_order_stats"
+        " WHERE date >= :date_from AND date <= :date_to GROUP BY master_id",
+        {"date_from": "2026-01-01", "date_to": "2026-12-31"},
+    ),
+    "order_extras": (
+        "SELECT id FROM order_extra_services WHERE order_id = :order_id",
+        {"order_id": 1},
+    ),
+    "client_by_phone": (
+        "SELECT id FROM clients WHERE phone_key = :phone_key",
+        {"phone_key": "79001234567"},
+    ),
+    "client_by_name": (
+        "SELECT id FROM clients WHERE full_name = :full_name",
+        {"full_name": "Иванова Светлана"},
+    ),
+    "pet_lookup": (
+        "SELECT id FROM pets WHERE client_id = :client_id AND name = :name"
+        " AND species = :species",
+        {"client_id": 1, "name": "Бобик", "species": "dog"},
+    ),
+    "client_search": (
+        "SELECT rowid FROM client_search WHERE client_search MATCH :q"
+        " ORDER BY rowid DESC LIMIT 201",
+        {"q": '"иван"* "свет"*'},
+    ),
+}
+
+
+def check_query_plans(engine: Engine = default_engine) -> dict:
+    """
+    EXPLAIN QUERY PLAN для горячих запросов.
+    Возвращает {имя: (использует_индекс, [строки плана])}; запрос считается
+    плохим, если в плане есть SCAN таблицы без индекса.
+    """
+    result = {}
+
+    with engine.connect() as conn:
+        for name, (sql, params) in HOT_QUERIES.items():
+            plan = [
+                row[-1]
+                for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql), params)
+            ]
+            full_scan = any(
+                line.startswith("SCAN")
+                and "USING" not in line
+                and "VIRTUAL TABLE INDEX" not in line
+                for line in plan
+            )
+            result[name] = (not full_scan, plan)
+
+    return result
+
+
+if __name__ == "__main__":
+    print("applied:", upgrade_database() or "nothing")
+
+    if "--check" in sys.argv:
+        ok = True
+        for name, (uses_index, plan) in check_query_plans().items():
+            ok = ok and uses_index
+            print(f"{'OK  ' if uses_index else 'SCAN'} {name}: {'; '.join(plan)}")
+        sys.exit(0 if ok else 1)
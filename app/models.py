@@ -1,10 +1,12 @@
 from sqlalchemy import (
     Column, Integer, String, Boolean,
-    ForeignKey, Date, Time, Enum
+    ForeignKey, Date, Time, Enum, Index
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
+from typing import Optional
 from app.database import Base
 import enum
+import re
 
 
 # ===================== ENUMS =====================
@@ -109,15 +111,39 @@ class Breed(Base):
 
 # ===================== CLIENTS & PETS =====================
 
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """
+    Канонический вид номера — только цифры, российский номер с 7:
+    "+7 (900) 123-45-67", "89001234567" и "9001234567" -> "79001234567"
+    """
+    digits = re.sub(r"\D", "", phone or "")
+    if len(digits) == 11 and digits[0] == "8":
+        digits = "7" + digits[1:]
+    elif len(digits) == 10:
+        digits = "7" + digits
+    return digits or None
+
+
 class Client(Base):
     __tablename__ = "clients"
 
     id = Column(Integer, primary_key=True)
     full_name = Column(String, nullable=False)
-    phone = Column(String, nullable=True)
+    phone = Column(String, nullable=True)  # как ввели
+    phone_key = Column(String, nullable=True)  # normalize_phone(phone)
 
     pets = relationship("Pet", back_populates="client")
 
+    __table_args__ = (
+        Index("ux_clients_phone_key", "phone_key", unique=True),
+        Index("ix_clients_full_name", "full_name"),
+    )
+
+    @validates("phone")
+    def _set_phone_key(self, key, phone):
+        self.phone_key = normalize_phone(phone)
+        return phone
+
 
 class Pet(Base):
     __tablename__ = "pets"
@@ -138,6 +164,10 @@ class Pet(Base):
     breed = relationship("Breed")
     age_group = relationship("AgeGroup")
 
+    __table_args__ = (
+        Index("ix_pets_client_id", "client_id", "name"),
+    )
+
 
 # ===================== ORDERS =====================
 
@@ -160,6 +190,51 @@ class Order(Base):
     status = Column(Enum(OrderStatus), default=OrderStatus.planned)
     comment = Column(String, nullable=True)
 
+    # заявка, созданная из повторяющейся серии
+    series_id = Column(Integer, ForeignKey("order_series.id"), nullable=True)
+
+    # номер изменения, проставляется триггером (app/changes.py)
+    version = Column(Integer, nullable=False, server_default="0")
+
+    client = relationship("Client")
+    pet = relationship("Pet")
+    master = relationship("Master")
+    service = relationship("Service")
+
+    __table_args__ = (
+        # проверка пересечений и защита от двойной отправки
+        Index("ix_orders_master_date", "master_id", "date", "start_time"),
+        # расписание по диапазону дат
+        Index("ix_orders_date", "date", "start_time"),
+        # одна заявка на вхождение серии
+        Index("ux_orders_series_date", "series_id", "date", unique=True),
+        # валидатор расписания: max(version) и count(*) за период
+        Index("ix_orders_date_version", "date", "master_id", "version"),
+        # опрос изменений для push-уведомлений (EVENTS_BROKER=sqlite)
+        Index("ix_orders_version", "version"),
+    )
+
+
+# -------- DAILY ROLLUP --------
+
+class DailyOrderStats(Base):
+    """
+    Сводка заявок за день по мастеру и услуге; поддерживается
+    триггерами на orders (app/rollup.py)
+    """
+    __tablename__ = "daily_order_stats"
+
+    date = Column(Date, primary_key=True)
+    master_id = Column(Integer, ForeignKey("masters.id"), primary_key=True)
+    service_id = Column(Integer, ForeignKey("services.id"), primary_key=True)
+
+    orders = Column(Integer, nullable=False, default=0)
+    done = Column(Integer, nullable=False, default=0)
+    canceled = Column(Integer, nullable=False, default=0)
+    # без отменённых
+    revenue = Column(Integer, nullable=False, default=0)
+    booked_minutes = Column(Integer, nullable=False, default=0)
+
 
 # -------- ORDER <-> EXTRA SERVICES --------
 
@@ -172,3 +247,65 @@ class OrderExtraService(Base):
 
     order = relationship("Order", backref="extra_services")
     extra_service = relationship("ExtraService")
+
+    __table_args__ = (
+        Index("ix_order_extra_services_order_id", "order_id"),
+    )
+
+
+# ===================== RECURRING SERIES =====================
+
+class OrderSeries(Base):
+    """
+    Повторяющаяся запись: «каждые N недель, тот же мастер и услуга».
+    Вхождения не хранятся — они вычисляются по правилу и превращаются
+    в Order только на ближайшие дни (materialized_until).
+    """
+    __tablename__ = "order_series"
+
+    id = Column(Integer, primary_key=True)
+
+    client_id = Column(Integer, ForeignKey("clients.id"), nullable=False)
+    pet_id = Column(Integer, ForeignKey("pets.id"), nullable=False)
+    master_id = Column(Integer, ForeignKey("masters.id"), nullable=False)
+    service_id = Column(Integer, ForeignKey("services.id"), nullable=False)
+
+    price = Column(Integer, nullable=False)
+
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=True)
+    interval_weeks = Column(Integer, nullable=False)
+
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+
+    comment = Column(String, nullable=True)
+    active = Column(Boolean, default=True)
+
+    # последняя дата, до которой вхождения уже созданы как Order
+    materialized_until = Column(Date, nullable=True)
+
+    client = relationship("Client")
+    pet = relationship("Pet")
+    exceptions = relationship(
+        "OrderSeriesException", cascade="all, delete-orphan"
+    )
+
+    __table_args__ = (
+        Index("ix_order_series_master", "master_id", "active"),
+    )
+
+
+class OrderSeriesException(Base):
+    """
+    Пропущенное вхождение серии
+    """
+    __tablename__ = "order_series_exceptions"
+
+    id = Column(Integer, primary_key=True)
+    series_id = Column(Integer, ForeignKey("order_series.id"), nullable=False)
+    date = Column(Date, nullable=False)
+
+    __table_args__ = (
+        Index("ux_order_series_exceptions", "series_id", "date", unique=True),
+    )
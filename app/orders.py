@@ -1,65 +1,148 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta, time, date
-from typing import Optional, List
-
-from app.database import SessionLocal
+from datetime import datetime, timedelta, date
+from typing import Optional
+import csv
+import io
+import json
+
+from app.database import (
+    SessionLocal,
+    begin_write,
+    get_db,
+    get_runner,
+    write_transaction,
+)
 from app.models import (
+    PetSize,
     Client,
     Pet,
     Master,
     Service,
-    ServiceTariff,
-    ExtraService,
     Order,
-    OrderExtraService
+    OrderExtraService,
+    OrderSeries,
+    OrderStatus,
+    normalize_phone,
 )
-from app.schemas import OrderCreate, OrderRead, OrderUpdate, OrderStatusUpdate
-from app.auth import oauth2_scheme
-from jose import jwt, JWTError
-
+from app.intervals import DayIntervals, order_intervals, to_minutes
+from app.catalog import Catalog, get_catalog
+from app.events import broker, order_event
+from app.changes import (
+    CATALOG_TABLES,
+    SCHEDULE_TABLES,
+    Validator,
+    counters_state,
+    deleted_order_ids,
+    prune_tombstones,
+    read_counters,
+    tombstones_floor,
+)
+from app.recurrence import materialize_due, pending_occurrences
+from app.availability import WORK_START, WORK_END, busy_mask, day_availability
+from app.schemas import (
+    OrderCreate,
+    OrderRead,
+    OrderUpdate,
+    OrderStatusUpdate,
+    OrderBulkCreate,
+    OrderBulkItem,
+    OrderBulkResult,
+    QuoteItem,
+    QuoteLine,
+    QuoteRequest,
+    ScheduleChanges,
+)
+from app.auth import get_current_user
 
-SECRET_KEY = "SECRET_KEY_CHANGE_ME"
-ALGORITHM = "HS256"
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
+# статусы, принимаемые API
+STATUSES = {
+    "planned": OrderStatus.planned,
+    "done": OrderStatus.done,
+    "cancelled": OrderStatus.canceled,
+}
+
 
 # =====================================================
-# DB
+# HELPERS
 # =====================================================
-def get_db():
-    db = SessionLocal()
+def booking_window(
+    day: date, start_time: str, duration: int, now: datetime,
+    past_error: str = "Нельзя создать заявку в прошлом",
+):
+    """
+    Начало и конец услуги; HTTPException, если время недопустимо.
+    past_error — текст ошибки для времени в прошлом (у переноса свой)
+    """
     try:
-        yield db
-    finally:
-        db.close()
+        start_dt = datetime.strptime(start_time, "%H:%M")
+    except ValueError:
+        raise HTTPException(400, "Некорректное время услуги")
 
+    end_dt = start_dt + timedelta(minutes=duration)
 
-# =====================================================
-# AUTH
-# =====================================================
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+    if start_dt.time() >= end_dt.time():
+        raise HTTPException(400, "Некорректное время услуги")
 
+    if datetime.combine(day, start_dt.time()) < now:
+        raise HTTPException(400, past_error)
 
-# =====================================================
-# CREATE ORDER
-# =====================================================
-@router.post("", response_model=OrderRead)
-def create_order(
-    data: OrderCreate,
-    db: Session = Depends(get_db),
-    user=Depends(get_current_user),
-):
+    if start_dt.time() < WORK_START or end_dt.time() > WORK_END:
+        raise HTTPException(400, "Вне рабочего времени")
+
+    return start_dt.time(), end_dt.time()
+
+
+_materialized_on: Optional[date] = None
+
+
+def materialize_series(db: Session, force: bool = False):
+    """
+    Создать заявки из ближайших вхождений серий — не чаще раза в день
+    на процесс (или сразу, если force). Там же раз в день удаляются
+    старые надгробия заявок
+    """
+    global _materialized_on
+
+    today = date.today()
+    if _materialized_on == today and not force:
+        return
+
+    for master_id in materialize_due(db, today):
+        order_intervals.invalidate(master_id)
+    prune_tombstones(db)
+    _materialized_on = today
+
+
+def pet_reference_error(catalog: Catalog, pet) -> Optional[str]:
+    """
+    Проверка ссылок нового питомца на справочники
+    """
+    if not pet.age_group_id:
+        return "Не указана возрастная группа"
+    if pet.age_group_id not in catalog.age_groups:
+        return "Некорректная возрастная группа"
+    if pet.breed_id is not None and pet.breed_id not in catalog.breeds_by_id:
+        return "Некорректная порода"
+    return None
+
+
+def resolve_client_pet(db: Session, data: OrderCreate, catalog: Catalog):
+    """
+    Найти или создать (flush, без commit) клиента и питомца заявки
+    """
     # ---------- CLIENT ----------
     client = None
 
-    if data.phone:
-        client = db.query(Client).filter(Client.phone == data.phone).first()
+    phone_key = normalize_phone(data.phone)
+    if phone_key:
+        client = db.query(Client).filter(Client.phone_key == phone_key).first()
 
     if not client:
         client = db.query(Client).filter(
@@ -71,9 +154,14 @@ def create_order(
             full_name=data.full_name,
             phone=data.phone
         )
-        db.add(client)
-        db.commit()
-        db.refresh(client)
+        # SAVEPOINT — только внутри открытой транзакции заявки
+        begin_write(db)
+        try:
+            with db.begin_nested():
+                db.add(client)
+        except IntegrityError:
+            # тот же номер только что записал параллельный запрос
+            client = db.query(Client).filter(Client.phone_key == phone_key).one()
 
     # ---------- PET ----------
     pet = db.query(Pet).filter(
@@ -83,6 +171,10 @@ def create_order(
     ).first()
 
     if not pet:
+        error = pet_reference_error(catalog, data.pet)
+        if error:
+            raise HTTPException(400, error)
+
         pet = Pet(
             name=data.pet.name,
             species=data.pet.species,
@@ -92,165 +184,863 @@ def create_order(
             client_id=client.id
         )
         db.add(pet)
-        db.commit()
-        db.refresh(pet)
+        db.flush()
 
+    return client, pet
+
+
+# =====================================================
+# CREATE ORDER
+# =====================================================
+@router.post("", response_model=OrderRead)
+def create_order(
+    data: OrderCreate,
+    db: Session = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
+    user=Depends(get_current_user),
+):
     # ---------- MASTER ----------
-    master = db.query(Master).get(data.master_id)
+    master = catalog.masters.get(data.master_id)
     if not master or not master.active:
         raise HTTPException(400, "Некорректный мастер")
 
-    # ---------- SERVICE & TARIFF ----------
-    tariff = db.query(ServiceTariff).filter(
-        ServiceTariff.service_id == data.service_id,
-        ServiceTariff.size == pet.size
-    ).first()
-
-    if not tariff:
-        raise HTTPException(400, "Нет тарифа для выбранной услуги и размера")
+    # вся запись — одна транзакция под блокировкой мастера: сначала
+    # блокировка мастера, затем блокировка записи SQLite, и только
+    # потом первая запись (клиент и питомец)
+    with order_intervals.master_lock(master.id), write_transaction(db):
+        client, pet = resolve_client_pet(db, data, catalog)
 
-    start_dt = datetime.strptime(data.start_time, "%H:%M")
-    end_dt = start_dt + timedelta(minutes=tariff.duration)
+        # ---------- SERVICE, TARIFF & PRICE ----------
+        quote = catalog.prices.quote(
+            data.service_id, pet.size, pet.age_group_id, data.extra_service_ids
+        )
 
-    # ---------- TIME VALIDATION ----------
-    if start_dt.time() >= end_dt.time():
-        raise HTTPException(400, "Некорректное время услуги")
+        if not quote:
+            raise HTTPException(400, "Нет тарифа для выбранной услуги и размера")
 
-    order_datetime = datetime.combine(data.date, start_dt.time())
-    now = datetime.now()
+        # ---------- TIME VALIDATION ----------
+        start, end = booking_window(
+            data.date, data.start_time, quote.duration, datetime.now()
+        )
 
-    if order_datetime < now:
-        raise HTTPException(400, "Нельзя создать заявку в прошлом")
+        extras = catalog.extras_by_ids(data.extra_service_ids)
 
-    if start_dt.time() < time(9, 0) or end_dt.time() > time(20, 0):
-        raise HTTPException(400, "Вне рабочего времени")
+        # ---------- CONFLICT CHECK ----------
+        # индекс догоняет заявки других процессов внутри транзакции записи
+        order_intervals.sync(db)
+        conflict = order_intervals.find_conflict(
+            db, master.id, data.date, start, end
+        )
 
-    # ---------- CONFLICT CHECK ----------
-    conflict = db.query(Order).filter(
-        Order.master_id == master.id,
-        Order.date == data.date,
-        Order.status != "cancelled",
-        Order.start_time < end_dt.time(),
-        Order.end_time > start_dt.time()
-    ).first()
+        if conflict:
+            raise HTTPException(400, "Время занято")
+
+        # ---------- DOUBLE SUBMIT PROTECTION ----------
+        existing_same_order = db.query(Order).filter(
+            Order.client_id == client.id,
+            Order.pet_id == pet.id,
+            Order.master_id == master.id,
+            Order.service_id == data.service_id,
+            Order.date == data.date,
+            Order.start_time == start,
+            Order.end_time == end,
+        ).first()
 
-    if conflict:
-        raise HTTPException(400, "Время занято")
-
-    # ---------- DOUBLE SUBMIT PROTECTION ----------
-    existing_same_order = db.query(Order).filter(
-        Order.client_id == client.id,
-        Order.pet_id == pet.id,
-        Order.master_id == master.id,
-        Order.service_id == data.service_id,
-        Order.date == data.date,
-        Order.start_time == start_dt.time(),
-        Order.end_time == end_dt.time(),
-    ).first()
+        if existing_same_order:
+            raise HTTPException(
+                status_code=409,
+                detail="Такая заявка уже существует"
+            )
+
+        # ---------- CREATE ORDER ----------
+        order = Order(
+            client_id=client.id,
+            pet_id=pet.id,
+            master_id=master.id,
+            service_id=data.service_id,
+            price=data.price or quote.price,
+            date=data.date,
+            start_time=start,
+            end_time=end,
+            status=OrderStatus.planned,
+            comment=data.comment
+        )
 
-    if existing_same_order:
-        raise HTTPException(
-            status_code=409,
-            detail="Такая заявка уже существует"
+        db.add(order)
+        db.flush()
+
+        # ---------- LINK EXTRA SERVICES ----------
+        if extras:
+            db.execute(insert(OrderExtraService), [
+                {"order_id": order.id, "extra_service_id": extra.id}
+                for extra in extras
+            ])
+
+        # ответ собираем до commit, пока объекты не expired
+        result = OrderRead(
+            id=order.id,
+            date=order.date,
+            start_time=order.start_time.strftime("%H:%M"),
+            end_time=order.end_time.strftime("%H:%M"),
+            price=order.price,
+            status=order.status,
+            client_name=client.full_name,
+            pet_name=pet.name,
+            service_name=catalog.services[data.service_id].name,
+            master_id=master.id,
+            master_name=master.name
         )
 
-    # ---------- PRICE CALCULATION ----------
-    final_price = tariff.price
+        order_intervals.add(order)
+        try:
+            db.commit()
+        except Exception:
+            order_intervals.remove(order.id)
+            raise
 
-    # возраст
-    if pet.age_group:
-        final_price = int(
-            final_price * pet.age_group.price_factor / 100
-        )
+    broker.publish(order_event(result.id, result.date, result.master_id, result.status))
+    return result
 
-    # доп. услуги
-    extras: List[ExtraService] = []
-    if data.extra_service_ids:
-        extras = db.query(ExtraService).filter(
-            ExtraService.id.in_(data.extra_service_ids)
-        ).all()
 
-        final_price += sum(e.price for e in extras)
+# =====================================================
+# BULK CREATE
+# =====================================================
+MAX_BULK_ORDERS = 500
 
-    # ---------- CREATE ORDER ----------
-    order = Order(
-        client_id=client.id,
-        pet_id=pet.id,
-        master_id=master.id,
-        service_id=data.service_id,
-        price=data.price or final_price,
-        date=data.date,
-        start_time=start_dt.time(),
-        end_time=end_dt.time(),
-        comment=data.comment
-    )
+# корректная заявка из пакета, отклонённого целиком
+REJECTED_IN_BATCH = (424, "Пакет отклонён из-за ошибок в других заявках")
 
-    db.add(order)
-    db.commit()
-    db.refresh(order)
 
-    # ---------- LINK EXTRA SERVICES ----------
-    for extra in extras:
-        db.add(OrderExtraService(
-            order_id=order.id,
-            extra_service_id=extra.id
-        ))
+@router.post("/bulk", response_model=OrderBulkResult)
+def create_orders_bulk(
+    data: OrderBulkCreate,
+    response: Response,
+    db: Session = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
+    user=Depends(get_current_user),
+):
+    """
+    Пакетное создание заявок: те же проверки, что в create_order,
+    но поиск клиентов, питомцев и занятости — по запросу на таблицу,
+    а запись — одной транзакцией
+    """
+    items = data.orders
+    if not items:
+        raise HTTPException(400, "Пустой список заявок")
+    if len(items) > MAX_BULK_ORDERS:
+        raise HTTPException(400, f"Не более {MAX_BULK_ORDERS} заявок за раз")
+
+    errors = {}
+
+    # ---------- CLIENTS ----------
+    phones = {normalize_phone(i.phone) for i in items} - {None}
+    names = {i.full_name for i in items}
+
+    by_phone = {}
+    for c in db.query(Client).filter(Client.phone_key.in_(phones)):
+        by_phone[c.phone_key] = c
+
+    by_name = {}
+    for c in db.query(Client).filter(Client.full_name.in_(names)).order_by(Client.id):
+        by_name.setdefault(c.full_name, c)
+
+    # новые клиенты и питомцы пока не добавляются в сессию:
+    # в БД попадут только те, чьи заявки прошли проверки
+    clients = []
+    for i in items:
+        phone_key = normalize_phone(i.phone)
+        client = (phone_key and by_phone.get(phone_key)) or by_name.get(i.full_name)
+        if not client:
+            client = Client(full_name=i.full_name, phone=i.phone)
+            if phone_key:
+                by_phone[phone_key] = client
+            by_name.setdefault(i.full_name, client)
+        clients.append(client)
+
+    # ---------- PETS ----------
+    known_ids = {c.id for c in clients if c.id}
+    pets_by_key = {
+        (p.client_id, p.name, p.species): p
+        for p in db.query(Pet).filter(Pet.client_id.in_(known_ids)).order_by(Pet.id.desc())
+    }
+
+    pets = []
+    pet_owner = {}
+    # ошибка нового питомца относится ко всем заявкам с ним
+    pet_errors = {}
+    for index, (i, client) in enumerate(zip(items, clients)):
+        key = (client.id or id(client), i.pet.name, i.pet.species)
+        pet = pets_by_key.get(key)
+        if not pet:
+            error = pet_reference_error(catalog, i.pet)
+            if error:
+                pet_errors[key] = error
+            pet = Pet(
+                name=i.pet.name,
+                species=i.pet.species,
+                breed_id=i.pet.breed_id,
+                age_group_id=i.pet.age_group_id,
+                size=i.pet.size,
+            )
+            pets_by_key[key] = pet
+            pet_owner[id(pet)] = client
+        if key in pet_errors:
+            errors[index] = (400, pet_errors[key])
+        pets.append(pet)
+
+    # ---------- CATALOG & TIME ----------
+    now = datetime.now()
+    plans = {}
+    for index, (i, pet) in enumerate(zip(items, pets)):
+        if index in errors:
+            continue
+        try:
+            master = catalog.masters.get(i.master_id)
+            if not master or not master.active:
+                raise HTTPException(400, "Некорректный мастер")
+
+            quote = catalog.prices.quote(
+                i.service_id, pet.size, pet.age_group_id, i.extra_service_ids
+            )
+            if not quote:
+                raise HTTPException(400, "Нет тарифа для выбранной услуги и размера")
+
+            start, end = booking_window(i.date, i.start_time, quote.duration, now)
+        except HTTPException as e:
+            errors[index] = (e.status_code, e.detail)
+            continue
+
+        extras = catalog.extras_by_ids(i.extra_service_ids)
+        plans[index] = (master, start, end, extras, quote.price)
+
+    # ---------- CONFLICTS ----------
+    master_ids = {plan[0].id for plan in plans.values()}
+
+    with order_intervals.master_lock(*master_ids), write_transaction(db):
+        order_intervals.sync(db)
+        order_intervals.preload(db, {(plan[0].id, items[index].date) for index, plan in plans.items()})
+
+        # повторная отправка — только для уже существующих клиента и питомца
+        existing = set()
+        pet_ids = {pet.id for pet in pets if pet.id}
+        if pet_ids and plans:
+            existing = set(db.query(
+                Order.pet_id, Order.master_id, Order.service_id,
+                Order.date, Order.start_time, Order.end_time,
+            ).filter(
+                Order.master_id.in_(master_ids),
+                Order.date.in_({items[index].date for index in plans}),
+                Order.pet_id.in_(pet_ids),
+            ))
+
+        batch = {}
+        for index in sorted(plans):
+            i, pet = items[index], pets[index]
+            master, start, end = plans[index][:3]
+
+            if order_intervals.find_conflict(db, master.id, i.date, start, end):
+                errors[index] = (400, "Время занято")
+            # в пакетном индексе id — номер заявки в пакете, в том числе 0
+            elif (master.id, i.date) in batch and batch[(master.id, i.date)].find_conflict(
+                to_minutes(start), to_minutes(end)
+            ) is not None:
+                errors[index] = (400, "Время занято в этом же пакете")
+            elif pet.id and (pet.id, master.id, i.service_id, i.date, start, end) in existing:
+                errors[index] = (409, "Такая заявка уже существует")
+            else:
+                batch.setdefault((master.id, i.date), DayIntervals()).add(
+                    to_minutes(start), to_minutes(end), index
+                )
+                continue
+            del plans[index]
+
+        if errors and data.mode == "all_or_nothing":
+            db.rollback()
+            response.status_code = 400
+            return OrderBulkResult(
+                created=0,
+                failed=len(errors),
+                items=[
+                    OrderBulkItem(
+                        index=index,
+                        ok=False,
+                        status_code=code,
+                        error=error,
+                    )
+                    for index in range(len(items))
+                    for code, error in [errors.get(index, REJECTED_IN_BATCH)]
+                ],
+            )
+
+        # ---------- WRITE ----------
+        new_clients = {
+            id(clients[index]): clients[index]
+            for index in plans if clients[index].id is None
+        }
+        db.add_all(new_clients.values())
+        db.flush()
+
+        new_pets = {id(pets[index]): pets[index] for index in plans if pets[index].id is None}
+        for pet in new_pets.values():
+            pet.client_id = pet_owner[id(pet)].id
+        db.add_all(new_pets.values())
+        db.flush()
+
+        orders = {}
+        for index, (master, start, end, extras, price) in plans.items():
+            i = items[index]
+            orders[index] = Order(
+                client_id=clients[index].id,
+                pet_id=pets[index].id,
+                master_id=master.id,
+                service_id=i.service_id,
+                price=i.price or price,
+                date=i.date,
+                start_time=start,
+                end_time=end,
+                status=OrderStatus.planned,
+                comment=i.comment,
+            )
+        db.add_all(orders.values())
+        db.flush()
+
+        links = [
+            {"order_id": orders[index].id, "extra_service_id": extra.id}
+            for index, plan in plans.items()
+            for extra in plan[3]
+        ]
+        if links:
+            db.execute(insert(OrderExtraService), links)
+
+        result_items = []
+        for index in range(len(items)):
+            if index in errors:
+                code, error = errors[index]
+                result_items.append(OrderBulkItem(
+                    index=index, ok=False, status_code=code, error=error
+                ))
+                continue
+
+            order, master = orders[index], plans[index][0]
+            result_items.append(OrderBulkItem(index=index, ok=True, order=OrderRead(
+                id=order.id,
+                date=order.date,
+                start_time=order.start_time.strftime("%H:%M"),
+                end_time=order.end_time.strftime("%H:%M"),
+                price=order.price,
+                status=order.status,
+                client_name=clients[index].full_name,
+                pet_name=pets[index].name,
+                service_name=catalog.services[order.service_id].name,
+                master_id=master.id,
+                master_name=master.name,
+            )))
+
+        for order in orders.values():
+            order_intervals.add(order)
+        try:
+            db.commit()
+        except Exception:
+            for order in orders.values():
+                order_intervals.remove(order.id)
+            raise
+
+    for item in result_items:
+        if item.order:
+            broker.publish(order_event(
+                item.order.id, item.order.date, item.order.master_id, item.order.status
+            ))
+
+    return OrderBulkResult(
+        created=len(orders),
+        failed=len(errors),
+        items=result_items,
+    )
 
-    db.commit()
 
-    service = db.query(Service).get(data.service_id)
+# =====================================================
+# QUOTE
+# =====================================================
+MAX_QUOTE_ITEMS = 500
+
+
+def pet_price_refs(db: Session, pet_ids) -> dict:
+    """
+    {id питомца: (размер, возрастная группа)}
+    """
+    rows = db.query(Pet.id, Pet.size, Pet.age_group_id).filter(Pet.id.in_(pet_ids))
+    return {r.id: (r.size, r.age_group_id) for r in rows}
+
+
+def quote_line(catalog: Catalog, index: int, item: QuoteItem, pets: dict) -> QuoteLine:
+    if item.pet_id:
+        if item.pet_id not in pets:
+            return QuoteLine(index=index, ok=False, error="Питомец не найден")
+        size, age_group_id = pets[item.pet_id]
+    else:
+        size, age_group_id = item.size, item.age_group_id
+
+    if size is None:
+        return QuoteLine(index=index, ok=False, error="Не указан размер питомца")
+    if age_group_id is not None and age_group_id not in catalog.age_groups:
+        return QuoteLine(index=index, ok=False, error="Некорректная возрастная группа")
+
+    quote = catalog.prices.quote(item.service_id, size, age_group_id, item.extra_service_ids)
+    if not quote:
+        return QuoteLine(
+            index=index, ok=False, error="Нет тарифа для выбранной услуги и размера"
+        )
 
-    return OrderRead(
-        id=order.id,
-        date=order.date,
-        start_time=order.start_time.strftime("%H:%M"),
-        end_time=order.end_time.strftime("%H:%M"),
-        price=order.price,
-        status=order.status,
-        client_name=client.full_name,
-        pet_name=pet.name,
-        service_name=service.name,
-        master_name=master.name
+    return QuoteLine(
+        index=index,
+        ok=True,
+        price=quote.price,
+        extras_price=quote.extras_price,
+        duration=quote.duration,
     )
 
 
+@router.post("/quote", response_model=list[QuoteLine])
+async def quote_orders(
+    data: QuoteRequest,
+    db=Depends(get_runner),
+    catalog: Catalog = Depends(get_catalog),
+    user=Depends(get_current_user),
+):
+    """
+    Цена и длительность для списка вариантов записи, без создания
+    заявок: тот же расчёт, что при создании и изменении заявки
+    """
+    items = data.items
+    if not items:
+        raise HTTPException(400, "Пустой список вариантов")
+    if len(items) > MAX_QUOTE_ITEMS:
+        raise HTTPException(400, f"Не более {MAX_QUOTE_ITEMS} вариантов за раз")
+
+    pet_ids = {i.pet_id for i in items if i.pet_id}
+    pets = await db.run(pet_price_refs, pet_ids) if pet_ids else {}
+
+    return [quote_line(catalog, index, item, pets) for index, item in enumerate(items)]
+
+
 # =====================================================
 # GET ORDERS FOR SCHEDULE
 # =====================================================
+def schedule_query(db: Session):
+    """
+    Плоская выборка заявок для расписания: один SELECT с JOIN
+    вместо ленивой загрузки client / pet / service / master по строкам
+    """
+    return (
+        db.query(
+            Order.id,
+            Order.date,
+            Order.start_time,
+            Order.end_time,
+            Order.price,
+            Order.status,
+            Order.master_id,
+            Order.series_id,
+            Client.full_name.label("client_name"),
+            Pet.name.label("pet_name"),
+            Service.name.label("service_name"),
+            Master.name.label("master_name"),
+        )
+        .join(Client, Client.id == Order.client_id)
+        .join(Pet, Pet.id == Order.pet_id)
+        .join(Service, Service.id == Order.service_id)
+        .join(Master, Master.id == Order.master_id)
+    )
+
+
+def schedule_row(row) -> dict:
+    return {
+        "id": row.id,
+        "date": row.date,
+        "start_time": row.start_time.strftime("%H:%M"),
+        "end_time": row.end_time.strftime("%H:%M"),
+        "price": row.price,
+        "status": row.status,
+        "master_id": row.master_id,
+        "series_id": row.series_id,
+        "client_name": row.client_name,
+        "pet_name": row.pet_name,
+        "service_name": row.service_name,
+        "master_name": row.master_name,
+    }
+
+
+def occurrence_row(series: OrderSeries, day: date, catalog: Catalog) -> dict:
+    return {
+        "id": None,
+        "date": day,
+        "start_time": series.start_time.strftime("%H:%M"),
+        "end_time": series.end_time.strftime("%H:%M"),
+        "price": series.price,
+        "status": OrderStatus.planned,
+        "master_id": series.master_id,
+        "series_id": series.id,
+        "client_name": series.client.full_name,
+        "pet_name": series.pet.name,
+        "service_name": catalog.services[series.service_id].name,
+        "master_name": catalog.masters[series.master_id].name,
+    }
+
+
+def schedule_rows(
+    db: Session,
+    date_from: date,
+    date_to: date,
+    master_id: Optional[int],
+    catalog: Catalog,
+) -> list:
+    materialize_series(db)
+
+    q = schedule_query(db).filter(
+        Order.date >= date_from,
+        Order.date <= date_to
+    )
+
+    if master_id:
+        q = q.filter(Order.master_id == master_id)
+
+    q = q.order_by(Order.date, Order.start_time, Order.id)
+    result = [schedule_row(row) for row in q]
+
+    # повторяющиеся записи, ещё не созданные как заявки
+    occurrences = pending_occurrences(
+        db, date_from, date_to, [master_id] if master_id else None, with_names=True
+    )
+    if occurrences:
+        result.extend(occurrence_row(s, day, catalog) for s, day in occurrences)
+        result.sort(key=lambda r: (r["date"], r["start_time"]))
+
+    return result
+
+
+def schedule_counters(db: Session):
+    """
+    (номер изменения заявок, версия остальных таблиц расписания,
+    время последнего изменения)
+    """
+    counters = read_counters(db, ("orders",) + SCHEDULE_TABLES + CATALOG_TABLES)
+    seq, changed_at = counters.pop("orders")
+    refs, refs_changed_at = counters_state(counters)
+    return seq, refs, max(changed_at, refs_changed_at or changed_at)
+
+
+def schedule_validator(
+    db: Session,
+    date_from: date,
+    date_to: date,
+    master_id: Optional[int],
+) -> Validator:
+    """
+    ETag расписания за период: версии заявок периода и счётчики таблиц,
+    из которых берутся имена и вхождения серий. Новый клиент или питомец
+    счётчики не меняет (UPDATE_ONLY_TABLES): запись на другой период
+    не сбрасывает ETag
+    """
+    materialize_series(db)
+    seq, refs, last_modified = schedule_counters(db)
+
+    q = db.query(func.max(Order.version), func.count()).filter(
+        Order.date >= date_from,
+        Order.date <= date_to
+    )
+    if master_id:
+        q = q.filter(Order.master_id == master_id)
+    max_version, count = q.one()
+
+    return Validator(
+        ("schedule", date_from, date_to, master_id, max_version, count, refs),
+        last_modified,
+        {"X-Schedule-Seq": str(seq), "X-Schedule-Refs": str(refs)},
+    )
+
+
+def modified_schedule_rows(
+    db: Session,
+    date_from: date,
+    date_to: date,
+    master_id: Optional[int],
+    catalog: Catalog,
+    request: Request,
+):
+    """
+    (валидатор, строки); строки None, если у клиента актуальная версия
+    """
+    validator = schedule_validator(db, date_from, date_to, master_id)
+    if validator.matches(request):
+        return validator, None
+    return validator, schedule_rows(db, date_from, date_to, master_id, catalog)
+
+
 @router.get("/schedule", response_model=list[OrderRead])
-def get_orders_for_schedule(
+async def get_orders_for_schedule(
+    request: Request,
+    response: Response,
     date_from: date = Query(...),
     date_to: date = Query(...),
     master_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    db=Depends(get_runner),
+    catalog: Catalog = Depends(get_catalog),
     user=Depends(get_current_user),
 ):
-    q = db.query(Order).filter(
+    validator, rows = await db.run(
+        modified_schedule_rows, date_from, date_to, master_id, catalog, request
+    )
+    return validator.apply(request, response) or rows
+
+
+def schedule_changes(
+    db: Session,
+    since: int,
+    refs: Optional[int],
+    date_from: date,
+    date_to: date,
+    master_id: Optional[int],
+) -> dict:
+    materialize_series(db)
+    seq, current_refs, _ = schedule_counters(db)
+
+    # since из другой базы или изменились имена / серии / справочники
+    if since > seq or (refs is not None and refs != current_refs):
+        return {"seq": seq, "refs": current_refs, "reload": True}
+
+    q = schedule_query(db).filter(
+        Order.version > since,
         Order.date >= date_from,
         Order.date <= date_to
     )
-
     if master_id:
         q = q.filter(Order.master_id == master_id)
 
-    orders = q.all()
-    result = []
-
-    for o in orders:
-        result.append({
-            "id": o.id,
-            "date": o.date,
-            "start_time": o.start_time.strftime("%H:%M"),
-            "end_time": o.end_time.strftime("%H:%M"),
-            "price": o.price,
-            "status": o.status,
-            "client_name": o.client.full_name,
-            "pet_name": o.pet.name,
-            "service_name": o.service.name,
-            "master_name": o.master.name
-        })
+    orders = [schedule_row(row) for row in q.order_by(Order.date, Order.start_time)]
+    deleted = deleted_order_ids(db, since, date_from, date_to, master_id)
+
+    # надгробия после since уже удалены; граница читается после них —
+    # чистка между запросами тоже приводит к reload
+    if since < tombstones_floor(db):
+        return {"seq": seq, "refs": current_refs, "reload": True}
+
+    return {"seq": seq, "refs": current_refs, "orders": orders, "deleted": deleted}
+
+
+@router.get("/schedule/changes", response_model=ScheduleChanges)
+async def get_schedule_changes(
+    since: int = Query(..., ge=0),
+    date_from: date = Query(...),
+    date_to: date = Query(...),
+    refs: Optional[int] = None,
+    master_id: Optional[int] = None,
+    db=Depends(get_runner),
+    user=Depends(get_current_user),
+):
+    """
+    Заявки периода, созданные или изменённые после since, и id удалённых
+    (перенесённых) из него. Клиент сначала убирает deleted, затем
+    заменяет заявки из orders; при reload — загружает период целиком.
+    reload приходит и для since старше хранимых надгробий.
+    """
+    return await db.run(schedule_changes, since, refs, date_from, date_to, master_id)
+
+
+@router.get("/events")
+async def order_events(
+    request: Request,
+    date_from: date = Query(...),
+    date_to: date = Query(...),
+    master_id: Optional[int] = None,
+    # EventSource не умеет передавать заголовок Authorization
+    token: str = Query(...),
+):
+    """
+    Server-Sent Events: уведомления об изменении заявок периода
+    """
+    await get_current_user(token)
+
+    subscription = broker.subscribe(date_from, date_to, master_id)
+    return StreamingResponse(
+        subscription.stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# =====================================================
+# EXPORT
+# =====================================================
+EXPORT_CHUNK = 1000
+
+EXPORT_COLUMNS = [
+    "id", "date", "start_time", "end_time", "status", "price",
+    "master_id", "master_name", "client_name", "pet_name", "service_name",
+    "series_id",
+]
+
+
+def export_rows(date_from: date, date_to: date, master_id: Optional[int]):
+    """
+    Строки выгрузки порциями по EXPORT_CHUNK через серверный курсор.
+    Сессия своя: генератор живёт дольше обработчика запроса.
+    """
+    db = SessionLocal()
+    try:
+        q = schedule_query(db).filter(
+            Order.date >= date_from,
+            Order.date <= date_to
+        )
+        if master_id:
+            q = q.filter(Order.master_id == master_id)
+
+        chunk = []
+        for row in q.order_by(Order.date, Order.start_time, Order.id).yield_per(EXPORT_CHUNK):
+            item = schedule_row(row)
+            item["date"] = row.date.isoformat()
+            item["status"] = row.status.value if row.status else None
+            chunk.append(item)
+
+            if len(chunk) == EXPORT_CHUNK:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+    finally:
+        db.close()
+
+
+def export_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+
+    # BOM — чтобы Excel открыл кириллицу без мастера импорта
+    buffer.write("\ufeff")
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+
+
+def export_ndjson(chunks):
+    for chunk in chunks:
+        yield "".join(
+            json.dumps({c: item[c] for c in EXPORT_COLUMNS}, ensure_ascii=False) + "\n"
+            for item in chunk
+        )
+
+
+@router.get("/export")
+def export_orders(
+    date_from: date = Query(...),
+    date_to: date = Query(...),
+    export_format: str = Query("csv", alias="format"),
+    master_id: Optional[int] = None,
+    user=Depends(get_current_user),
+):
+    """
+    Потоковая выгрузка заявок (csv или ndjson) без сборки всего
+    результата в памяти
+    """
+    if date_to < date_from:
+        raise HTTPException(400, "Некорректный период")
+
+    chunks = export_rows(date_from, date_to, master_id)
+    filename = f"orders_{date_from}_{date_to}.{export_format}"
+
+    if export_format == "csv":
+        body, media_type = export_csv(chunks), "text/csv; charset=utf-8"
+    elif export_format == "ndjson":
+        body, media_type = export_ndjson(chunks), "application/x-ndjson"
+    else:
+        raise HTTPException(400, "Формат выгрузки: csv или ndjson")
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# =====================================================
+# AVAILABILITY
+# =====================================================
+MAX_AVAILABILITY_DAYS = 62
+
+
+@router.get("/availability")
+def get_availability(
+    date_from: date = Query(...),
+    date_to: date = Query(...),
+    service_id: int = Query(...),
+    size: PetSize = Query(...),
+    group: Optional[str] = None,
+    db: Session = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
+    user=Depends(get_current_user),
+):
+    """
+    Все допустимые времена начала услуги по мастерам и дням
+    """
+    if date_to < date_from:
+        raise HTTPException(400, "Некорректный период")
+    if (date_to - date_from).days >= MAX_AVAILABILITY_DAYS:
+        raise HTTPException(400, "Слишком большой период")
+
+    tariff = catalog.tariff(service_id, size)
+
+    if not tariff:
+        raise HTTPException(400, "Нет тарифа для выбранной услуги и размера")
+
+    masters = [
+        m for m in catalog.active_masters()
+        if not group or m.group == group
+    ]
+
+    # занятость всех мастеров за период — одним запросом
+    busy = {m.id: {} for m in masters}
+    rows = db.query(
+        Order.master_id, Order.date, Order.start_time, Order.end_time
+    ).filter(
+        Order.date >= date_from,
+        Order.date <= date_to,
+        Order.status != OrderStatus.canceled,
+        Order.master_id.in_(busy),
+    )
+
+    for r in rows:
+        days = busy[r.master_id]
+        days[r.date] = days.get(r.date, 0) | busy_mask(r.start_time, r.end_time)
+
+    for s, day in pending_occurrences(db, date_from, date_to, busy):
+        days = busy[s.master_id]
+        days[day] = days.get(day, 0) | busy_mask(s.start_time, s.end_time)
+
+    all_days = [
+        date_from + timedelta(days=i)
+        for i in range((date_to - date_from).days + 1)
+    ]
+    now = datetime.now()
+
+    return {
+        "service_id": service_id,
+        "size": size,
+        "duration": tariff.duration,
+        "masters": [
+            {
+                "master_id": m.id,
+                "master_name": m.name,
+                "group": m.group,
+                "days": day_availability(busy[m.id], all_days, tariff.duration, now),
+            }
+            for m in masters
+        ],
+    }
 
-    return result
 
 # =====================================================
 # UPDATE ORDER
@@ -260,6 +1050,7 @@ def update_order(
     order_id: int,
     data: OrderUpdate,
     db: Session = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
     # user=Depends(get_current_user),
 ):
     order = db.query(Order).get(order_id)
@@ -267,85 +1058,69 @@ def update_order(
         raise HTTPException(404, "Заявка не найдена")
 
     # мастер
-    master = db.query(Master).get(data.master_id)
+    master = catalog.masters.get(data.master_id)
     if not master or not master.active:
         raise HTTPException(400, "Некорректный мастер")
 
-    # услуга и тариф
-    tariff = db.query(ServiceTariff).filter(
-        ServiceTariff.service_id == data.service_id,
-        ServiceTariff.size == order.pet.size
-    ).first()
+    # услуга, тариф и цена
+    quote = catalog.prices.quote(
+        data.service_id, order.pet.size, order.pet.age_group_id, data.extra_service_ids
+    )
 
-    if not tariff:
+    if not quote:
         raise HTTPException(400, "Нет тарифа для выбранной услуги")
 
-    start_dt = datetime.strptime(data.start_time, "%H:%M")
-    end_dt = start_dt + timedelta(minutes=tariff.duration)
-
     # ---------- TIME VALIDATION ----------
-    if start_dt.time() >= end_dt.time():
-        raise HTTPException(400, "Некорректное время")
-
-    order_datetime = datetime.combine(data.date, start_dt.time())
-    if order_datetime < datetime.now():
-        raise HTTPException(400, "Нельзя перенести заявку в прошлое")
+    start, end = booking_window(
+        data.date, data.start_time, quote.duration, datetime.now(),
+        past_error="Нельзя перенести заявку в прошлое",
+    )
 
-    if start_dt.time() < time(9, 0) or end_dt.time() > time(20, 0):
-        raise HTTPException(400, "Вне рабочего времени")
+    extras = catalog.extras_by_ids(data.extra_service_ids)
+
+    # проверка и запись под блокировкой старого и нового мастера
+    with order_intervals.master_lock(order.master_id, master.id), write_transaction(db):
+        # ---------- CONFLICT CHECK ----------
+        if order.status != OrderStatus.canceled:
+            order_intervals.sync(db)
+            conflict = order_intervals.find_conflict(
+                db, master.id, data.date, start, end,
+                exclude_id=order.id
+            )
+
+            if conflict:
+                raise HTTPException(400, "Время занято")
+
+        previous = (order.date, order.master_id)
+
+        # ---------- UPDATE ORDER ----------
+        order.date = data.date
+        order.start_time = start
+        order.end_time = end
+        order.master_id = master.id
+        order.service_id = data.service_id
+        order.price = data.price or quote.price
+        order.comment = data.comment
+
+        # ---------- UPDATE EXTRA SERVICES ----------
+        db.query(OrderExtraService).filter(
+            OrderExtraService.order_id == order.id
+        ).delete()
+
+        for extra in extras:
+            db.add(OrderExtraService(
+                order_id=order.id,
+                extra_service_id=extra.id
+            ))
 
-    # ---------- CONFLICT CHECK ----------
-    conflict = db.query(Order).filter(
-        Order.id != order.id,
-        Order.master_id == master.id,
-        Order.date == data.date,
-        Order.status != "cancelled",
-        Order.start_time < end_dt.time(),
-        Order.end_time > start_dt.time()
-    ).first()
-
-    if conflict:
-        raise HTTPException(400, "Время занято")
+        db.commit()
+        db.refresh(order)
 
-    # ---------- PRICE RECALCULATION ----------
-    final_price = tariff.price
+        order_intervals.add(order)
 
-    if order.pet.age_group:
-        final_price = int(
-            final_price * order.pet.age_group.price_factor / 100
-        )
+    broker.publish(order_event(order.id, order.date, order.master_id, order.status, previous))
 
-    extras: List[ExtraService] = []
-    if data.extra_service_ids:
-        extras = db.query(ExtraService).filter(
-            ExtraService.id.in_(data.extra_service_ids)
-        ).all()
-        final_price += sum(e.price for e in extras)
-
-    # ---------- UPDATE ORDER ----------
-    order.date = data.date
-    order.start_time = start_dt.time()
-    order.end_time = end_dt.time()
-    order.master_id = master.id
-    order.service_id = data.service_id
-    order.price = data.price or final_price
-    order.comment = data.comment
-
-    # ---------- UPDATE EXTRA SERVICES ----------
-    db.query(OrderExtraService).filter(
-        OrderExtraService.order_id == order.id
-    ).delete()
-
-    for extra in extras:
-        db.add(OrderExtraService(
-            order_id=order.id,
-            extra_service_id=extra.id
-        ))
-
-    db.commit()
-    db.refresh(order)
-
-    service = db.query(Service).get(order.service_id)
+    service = catalog.services[order.service_id]
 
     return OrderRead(
         id=order.id,
@@ -357,6 +1132,7 @@ def update_order(
         client_name=order.client.full_name,
         pet_name=order.pet.name,
         service_name=service.name,
+        master_id=master.id,
         master_name=master.name
     )
 
@@ -369,25 +1145,42 @@ def update_order_status(
     order_id: int,
     data: OrderStatusUpdate,
     db: Session = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
     # user=Depends(get_current_user),
 ):
     order = db.query(Order).get(order_id)
     if not order:
         raise HTTPException(404, "Заявка не найдена")
 
-    allowed_statuses = {"planned", "done", "cancelled"}
-    if data.status not in allowed_statuses:
+    status = STATUSES.get(data.status)
+    if not status:
         raise HTTPException(400, "Недопустимый статус")
 
     # запрещаем отменять выполненную
-    if order.status == "done" and data.status == "cancelled":
+    if order.status == OrderStatus.done and status == OrderStatus.canceled:
         raise HTTPException(400, "Нельзя отменить выполненную заявку")
 
-    order.status = data.status
-    db.commit()
-    db.refresh(order)
+    with order_intervals.master_lock(order.master_id), write_transaction(db):
+        # возвращаем отменённую заявку — время могли уже занять
+        if order.status == OrderStatus.canceled and status != OrderStatus.canceled:
+            order_intervals.sync(db)
+            conflict = order_intervals.find_conflict(
+                db, order.master_id, order.date, order.start_time, order.end_time,
+                exclude_id=order.id
+            )
+
+            if conflict:
+                raise HTTPException(400, "Время занято")
+
+        order.status = status
+        db.commit()
+        db.refresh(order)
+
+        order_intervals.add(order)
+
+    broker.publish(order_event(order.id, order.date, order.master_id, order.status))
 
-    service = db.query(Service).get(order.service_id)
+    service = catalog.services[order.service_id]
 
     return OrderRead(
         id=order.id,
@@ -399,5 +1192,6 @@ def update_order_status(
         client_name=order.client.full_name,
         pet_name=order.pet.name,
         service_name=service.name,
-        master_name=order.master.name
+        master_id=order.master_id,
+        master_name=catalog.masters[order.master_id].name
     )
@@ -0,0 +1,41 @@
+"""
+Keyset-пагинация: вместо OFFSET клиент передаёт непрозрачный курсор
+next — ключ сортировки последней строки предыдущей страницы.
+"""
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def encode_cursor(*key) -> str:
+    raw = json.dumps(key, ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: Optional[str], size: int) -> Optional[list]:
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        key = json.loads(raw)
+    except ValueError:
+        raise HTTPException(400, "Некорректный курсор")
+    if not isinstance(key, list) or len(key) != size:
+        raise HTTPException(400, "Некорректный курсор")
+    return key
+
+
+def page(rows: list, limit: int, key) -> tuple:
+    """
+    rows выбраны с limit + 1: лишняя строка означает, что есть
+    следующая страница. Возвращает (строки страницы, курсор или None).
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
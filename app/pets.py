@@ -1,47 +1,73 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from jose import jwt, JWTError
+from typing import Optional
 
-from app.database import SessionLocal
+from app.database import get_runner
 from app.models import Pet
-from app.schemas import PetRead
-from app.auth import oauth2_scheme
-
-SECRET_KEY = "SECRET_KEY_CHANGE_ME"
-ALGORITHM = "HS256"
+from app.schemas import PetPage
+from app.auth import get_current_user
+from app.catalog import Catalog, get_catalog
+from app.pagination import DEFAULT_LIMIT, MAX_LIMIT, decode_cursor, page
 
 router = APIRouter(prefix="/pets", tags=["Pets"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def pet_read(pet: Pet, catalog: Catalog) -> dict:
+    # порода — из кэша справочников, без ленивой загрузки pet.breed
+    return {
+        "id": pet.id,
+        "name": pet.name,
+        "species": pet.species,
+        "breed": catalog.breed_name(pet.breed_id),
+        "size": pet.size,
+    }
+
+
+def pets_page(
+    db: Session,
+    client_id: Optional[int],
+    limit: int,
+    next: Optional[str],
+    catalog: Catalog,
+) -> dict:
+    q = db.query(Pet)
+    if client_id is not None:
+        q = q.filter(Pet.client_id == client_id)
+
+    cursor = decode_cursor(next, 1)
+    if cursor:
+        q = q.filter(Pet.id > cursor[0])
 
+    pets, next_cursor = page(
+        q.order_by(Pet.id).limit(limit + 1).all(), limit, lambda p: (p.id,)
+    )
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+    return {
+        "items": [pet_read(p, catalog) for p in pets],
+        "next": next_cursor,
+    }
 
 
 # 🔍 Получить всех питомцев (для справки / отладки)
-@router.get("", response_model=list[PetRead])
-def get_pets(
-    db: Session = Depends(get_db),
+@router.get("", response_model=PetPage)
+async def get_pets(
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    next: Optional[str] = None,
+    db=Depends(get_runner),
+    catalog: Catalog = Depends(get_catalog),
     user=Depends(get_current_user),
 ):
-    return db.query(Pet).all()
+    return await db.run(pets_page, None, limit, next, catalog)
 
 
 # 🔍 Получить питомцев конкретного клиента
-@router.get("/by-client/{client_id}", response_model=list[PetRead])
-def get_pets_by_client(
+@router.get("/by-client/{client_id}", response_model=PetPage)
+async def get_pets_by_client(
     client_id: int,
-    db: Session = Depends(get_db),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    next: Optional[str] = None,
+    db=Depends(get_runner),
+    catalog: Catalog = Depends(get_catalog),
     user=Depends(get_current_user),
 ):
-    return db.query(Pet).filter(Pet.client_id == client_id).all()
+    return await db.run(pets_page, client_id, limit, next, catalog)
@@ -0,0 +1,59 @@
+"""
+Цена и длительность заявки.
+
+Цена = тариф (услуга, размер) × коэффициент возрастной группы / 100
++ доп. услуги. PriceTable заранее считает базовую цену и длительность
+для каждой тройки (услуга, размер, возрастная группа) и держит словарь
+цен доп. услуг, поэтому расчёт — два обращения к словарю без запросов.
+
+Таблица строится вместе со снимком справочников (app/catalog.py) и
+сбрасывается вместе с ним при изменении тарифов, групп или доп. услуг.
+"""
+from collections import namedtuple
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.models import PetSize
+
+# price — с учётом возраста и доп. услуг
+Quote = namedtuple("Quote", "tariff_id price duration extras_price")
+
+# возрастная группа не указана или неизвестна — без коэффициента
+NO_AGE_GROUP = None
+
+
+class PriceTable:
+    def __init__(self, catalog):
+        factors = {NO_AGE_GROUP: 100}
+        factors.update((a.id, a.price_factor) for a in catalog.age_groups.values())
+
+        self.base: Dict[Tuple[int, PetSize, Optional[int]], Quote] = {
+            (service_id, size, age_group_id): Quote(
+                tariff.id, int(tariff.price * factor / 100), tariff.duration, 0
+            )
+            for (service_id, size), tariff in catalog.tariffs.items()
+            for age_group_id, factor in factors.items()
+        }
+        self.extras: Dict[int, int] = {e.id: e.price for e in catalog.extras.values()}
+        self._age_groups = frozenset(factors)
+
+    def quote(
+        self,
+        service_id: int,
+        size,
+        age_group_id: Optional[int] = NO_AGE_GROUP,
+        extra_service_ids: Iterable[int] = (),
+    ) -> Optional[Quote]:
+        """
+        None — нет тарифа для услуги и размера; неизвестные доп. услуги
+        пропускаются, повторы считаются один раз
+        """
+        if age_group_id not in self._age_groups:
+            age_group_id = NO_AGE_GROUP
+        # PetSize — str Enum: ключ находится и по значению "Средний"
+        base = self.base.get((service_id, size, age_group_id))
+        if base is None or not extra_service_ids:
+            return base
+
+        extras = self.extras
+        extras_price = sum(extras.get(i, 0) for i in set(extra_service_ids))
+        return Quote(base.tariff_id, base.price + extras_price, base.duration, extras_price)
@@ -0,0 +1,171 @@
+"""
+Развёртывание повторяющихся серий (OrderSeries) в вхождения.
+
+Вхождения серии вычисляются по правилу на лету: расписание, проверка
+пересечений и поиск свободного времени видят их как занятое время, хотя
+в orders их ещё нет. Строки Order создаются только для ближайших
+MATERIALIZE_DAYS дней (materialize_due).
+
+Новая серия сверяется с другими сериями мастера только на
+SERIES_CHECK_DAYS вперёд, а заявки могут попасть в базу и мимо
+проверок приложения. Поэтому при создании Order вхождение ещё раз
+сверяется с заявками мастера: занятый день не создаётся, а
+записывается исключением серии (пропущенным вхождением).
+"""
+from datetime import date, timedelta
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from app.models import Order, OrderSeries, OrderSeriesException, OrderStatus
+
+MATERIALIZE_DAYS = 14
+
+
+def occurrence_dates(
+    series: OrderSeries,
+    date_from: date,
+    date_to: date,
+    skipped: Iterable[date] = (),
+) -> Iterator[date]:
+    """
+    Несозданные вхождения серии в диапазоне [date_from, date_to]
+    """
+    step = 7 * series.interval_weeks
+    first = max(date_from, series.start_date)
+    if series.materialized_until:
+        first = max(first, series.materialized_until + timedelta(days=1))
+    last = min(date_to, series.end_date or date_to)
+
+    if first > last:
+        return
+
+    offset = (first - series.start_date).days
+    day = series.start_date + timedelta(days=-(-offset // step) * step)
+    skipped = set(skipped)
+
+    while day <= last:
+        if day not in skipped:
+            yield day
+        day += timedelta(days=step)
+
+
+def active_series(
+    db: Session,
+    date_from: date,
+    date_to: date,
+    master_ids: Optional[Iterable[int]] = None,
+):
+    q = db.query(OrderSeries).options(
+        selectinload(OrderSeries.exceptions)
+    ).filter(
+        OrderSeries.active == True,
+        OrderSeries.start_date <= date_to,
+        or_(OrderSeries.end_date.is_(None), OrderSeries.end_date >= date_from),
+        or_(
+            OrderSeries.materialized_until.is_(None),
+            OrderSeries.materialized_until < date_to,
+        ),
+    )
+
+    if master_ids is not None:
+        q = q.filter(OrderSeries.master_id.in_(set(master_ids)))
+
+    return q
+
+
+def pending_occurrences(
+    db: Session,
+    date_from: date,
+    date_to: date,
+    master_ids: Optional[Iterable[int]] = None,
+    with_names: bool = False,
+) -> List[Tuple[OrderSeries, date]]:
+    """
+    Все несозданные вхождения активных серий за период
+    """
+    q = active_series(db, date_from, date_to, master_ids)
+    if with_names:
+        q = q.options(joinedload(OrderSeries.client), joinedload(OrderSeries.pet))
+
+    return [
+        (s, day)
+        for s in q
+        for day in occurrence_dates(
+            s, date_from, date_to, (e.date for e in s.exceptions)
+        )
+    ]
+
+
+def occupied_days(db: Session, series: OrderSeries, days: List[date]) -> set:
+    """
+    Дни из days, где время серии пересекается с заявкой мастера
+    """
+    if not days:
+        return set()
+
+    q = db.query(Order.date).filter(
+        Order.master_id == series.master_id,
+        Order.date >= days[0],
+        Order.date <= days[-1],
+        Order.status != OrderStatus.canceled,
+        Order.start_time < series.end_time,
+        Order.end_time > series.start_time,
+    )
+    return {r.date for r in q} & set(days)
+
+
+def materialize_due(db: Session, today: Optional[date] = None) -> set:
+    """
+    Создать Order для вхождений ближайших MATERIALIZE_DAYS дней.
+    Возвращает множество затронутых мастеров.
+
+    materialized_until сдвигается условным UPDATE: если серию уже
+    обработал другой процесс, она пропускается. Проверка пересечений
+    идёт после него, в той же транзакции записи, и видит заявки,
+    созданные из предыдущих серий этого прохода.
+    """
+    horizon = (today or date.today()) + timedelta(days=MATERIALIZE_DAYS)
+    masters = set()
+
+    for s in active_series(db, date.min, horizon).all():
+        previous = s.materialized_until
+        days = list(occurrence_dates(
+            s, s.start_date, horizon, (e.date for e in s.exceptions)
+        ))
+
+        claimed = db.query(OrderSeries).filter(
+            OrderSeries.id == s.id,
+            OrderSeries.materialized_until.is_(None) if previous is None
+            else OrderSeries.materialized_until == previous,
+        ).update({"materialized_until": horizon}, synchronize_session=False)
+
+        if not claimed:
+            continue
+
+        taken = occupied_days(db, s, days)
+        db.add_all(
+            OrderSeriesException(series_id=s.id, date=day) for day in sorted(taken)
+        )
+        db.add_all(
+            Order(
+                client_id=s.client_id,
+                pet_id=s.pet_id,
+                master_id=s.master_id,
+                service_id=s.service_id,
+                price=s.price,
+                date=day,
+                start_time=s.start_time,
+                end_time=s.end_time,
+                status=OrderStatus.planned,
+                comment=s.comment,
+                series_id=s.id,
+            )
+            for day in days
+            if day not in taken
+        )
+        masters.add(s.master_id)
+
+    db.commit()
+    return masters
@@ -0,0 +1,206 @@
+"""
+Отчёты для руководителя.
+
+Выручка и загрузка читают только дневную сводку daily_order_stats
+(app/rollup.py): отчёт за год — это несколько тысяч строк сводки, а не
+вся таблица orders. Разовые срезы по питомцам, доп. услугам и часам
+считаются на NumPy по колоночному снимку заявок (app/analytics.py).
+"""
+from datetime import date, datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.analytics import analytics_cache
+from app.auth import require_roles
+from app.availability import WORK_END, WORK_START
+from app.catalog import Catalog, get_catalog
+from app.database import get_runner
+from app.models import DailyOrderStats, UserRole
+from app.schemas import (
+    AverageTicket,
+    CancellationCell,
+    ExtrasReport,
+    MasterUtilization,
+    RevenueMonth,
+)
+
+router = APIRouter(prefix="/reports", tags=["Reports"])
+
+REPORT_ROLES = (UserRole.admin.value, UserRole.manager.value)
+
+# рабочих минут у мастера в день
+WORKDAY_MINUTES = (
+    datetime.combine(date.min, WORK_END) - datetime.combine(date.min, WORK_START)
+).seconds // 60
+
+
+def check_period(date_from: date, date_to: date):
+    if date_from > date_to:
+        raise HTTPException(400, "Начало периода позже конца")
+
+
+# =====================================================
+# QUERIES
+# =====================================================
+def revenue_by_month(
+    db: Session,
+    date_from: date,
+    date_to: date,
+    master_id: Optional[int],
+) -> list:
+    month = func.strftime("%Y-%m", DailyOrderStats.date)
+    q = db.query(
+        month.label("month"),
+        func.sum(DailyOrderStats.orders).label("orders"),
+        func.sum(DailyOrderStats.done).label("done"),
+        func.sum(DailyOrderStats.canceled).label("canceled"),
+        func.sum(DailyOrderStats.revenue).label("revenue"),
+        func.sum(DailyOrderStats.booked_minutes).label("booked_minutes"),
+    ).filter(
+        DailyOrderStats.date >= date_from,
+        DailyOrderStats.date <= date_to,
+    )
+    if master_id:
+        q = q.filter(DailyOrderStats.master_id == master_id)
+
+    return [row._asdict() for row in q.group_by(month).order_by(month)]
+
+
+def master_utilization(
+    db: Session,
+    date_from: date,
+    date_to: date,
+    catalog: Catalog,
+) -> list:
+    booked = {
+        row.master_id: row
+        for row in db.query(
+            DailyOrderStats.master_id,
+            func.sum(DailyOrderStats.orders - DailyOrderStats.canceled).label("orders"),
+            func.sum(DailyOrderStats.booked_minutes).label("booked_minutes"),
+        ).filter(
+            DailyOrderStats.date >= date_from,
+            DailyOrderStats.date <= date_to,
+        ).group_by(DailyOrderStats.master_id)
+    }
+
+    capacity = ((date_to - date_from).days + 1) * WORKDAY_MINUTES
+    master_ids = [m.id for m in catalog.active_masters()]
+    master_ids += sorted(set(booked) - set(master_ids))
+
+    result = []
+    for master_id in master_ids:
+        row = booked.get(master_id)
+        minutes = row.booked_minutes if row else 0
+        master = catalog.masters.get(master_id)
+        result.append({
+            "master_id": master_id,
+            "master_name": master.name if master else str(master_id),
+            "orders": row.orders if row else 0,
+            "booked_minutes": minutes,
+            "capacity_minutes": capacity,
+            "utilization": round(minutes / capacity, 4),
+        })
+    return result
+
+
+# =====================================================
+# ENDPOINTS
+# =====================================================
+@router.get("/revenue", response_model=List[RevenueMonth])
+async def get_revenue(
+    date_from: date = Query(...),
+    date_to: date = Query(...),
+    master_id: Optional[int] = None,
+    db=Depends(get_runner),
+    user=Depends(require_roles(*REPORT_ROLES)),
+):
+    """
+    Выручка, заявки и занятые минуты по месяцам
+    """
+    check_period(date_from, date_to)
+    return await db.run(revenue_by_month, date_from, date_to, master_id)
+
+
+@router.get("/utilization", response_model=List[MasterUtilization])
+async def get_utilization(
+    date_from: date = Query(...),
+    date_to: date = Query(...),
+    db=Depends(get_runner),
+    catalog: Catalog = Depends(get_catalog),
+    user=Depends(require_roles(*REPORT_ROLES)),
+):
+    """
+    Загрузка мастеров: занятые минуты к рабочему времени 9:00–20:00
+    за каждый день периода
+    """
+    check_period(date_from, date_to)
+    return await db.run(master_utilization, date_from, date_to, catalog)
+
+
+# =====================================================
+# ANALYTICS
+# =====================================================
+async def analytics_report(name: str, catalog: Catalog, **params):
+    """
+    Отчёт из app/analytics.py. Векторные расчёты держат GIL и не
+    отпускают event loop, поэтому всегда в threadpool, а не через db.run
+    """
+    if params.get("date_from") and params.get("date_to"):
+        check_period(params["date_from"], params["date_to"])
+    return await run_in_threadpool(analytics_cache.report, name, catalog, **params)
+
+
+@router.get("/average-ticket", response_model=List[AverageTicket])
+async def get_average_ticket(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    master_id: Optional[int] = None,
+    catalog: Catalog = Depends(get_catalog),
+    user=Depends(require_roles(*REPORT_ROLES)),
+):
+    """
+    Средний чек по размеру и возрастной группе питомца
+    """
+    return await analytics_report(
+        "average_ticket", catalog,
+        date_from=date_from, date_to=date_to, master_id=master_id,
+    )
+
+
+@router.get("/extras", response_model=ExtrasReport)
+async def get_extras(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    master_id: Optional[int] = None,
+    catalog: Catalog = Depends(get_catalog),
+    user=Depends(require_roles(*REPORT_ROLES)),
+):
+    """
+    Доля заявок с доп. услугами
+    """
+    return await analytics_report(
+        "extras_attach", catalog,
+        date_from=date_from, date_to=date_to, master_id=master_id,
+    )
+
+
+@router.get("/cancellations", response_model=List[CancellationCell])
+async def get_cancellations(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    master_id: Optional[int] = None,
+    catalog: Catalog = Depends(get_catalog),
+    user=Depends(require_roles(*REPORT_ROLES)),
+):
+    """
+    Доля отмен по дню недели и часу начала
+    """
+    return await analytics_report(
+        "cancellations", catalog,
+        date_from=date_from, date_to=date_to, master_id=master_id,
+    )
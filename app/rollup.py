@@ -0,0 +1,104 @@
+"""
+Дневная сводка по заявкам: daily_order_stats.
+
+Строка на (дата, мастер, услуга): число заявок, выполненных и
+отменённых, выручка и занятые минуты (без отменённых). Сводку
+поддерживают триггеры на orders (миграция 8): вставка прибавляет
+заявку, удаление вычитает, изменение вычитает старую строку и
+прибавляет новую. Поэтому она актуальна при любой записи — из
+эндпоинтов, пакетной вставки, серий и прямого SQL.
+
+Отчёты читают только сводку. Пересобрать её с нуля:
+
+    python -m app.rollup --rebuild
+"""
+import sys
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.models import DailyOrderStats
+
+ROLLUP_TABLE = DailyOrderStats.__tablename__
+
+# изменения, влияющие на сводку; version не входит — его
+# проставляет триггер счётчиков
+ROLLUP_COLUMNS = "date, master_id, service_id, status, price, start_time, end_time"
+
+
+# =====================================================
+# DDL (миграция 8)
+# =====================================================
+def _minutes(t: str) -> str:
+    # время хранится как 'HH:MM:SS.ffffff'
+    return f"(CAST(substr({t}, 1, 2) AS INTEGER) * 60 + CAST(substr({t}, 4, 2) AS INTEGER))"
+
+
+def _active(row: str) -> str:
+    return f"({row}.status IS NOT 'canceled')"
+
+
+def _apply(row: str, sign: int) -> str:
+    """
+    Прибавить (sign=1) или вычесть (sign=-1) заявку row в сводке
+    """
+    return (
+        f"INSERT INTO {ROLLUP_TABLE} (date, master_id, service_id,"
+        f" orders, done, canceled, revenue, booked_minutes)\n"
+        f"VALUES ({row}.date, {row}.master_id, {row}.service_id, {sign},"
+        f" {sign} * ({row}.status = 'done'),"
+        f" {sign} * ({row}.status = 'canceled'),"
+        f" {sign} * {_active(row)} * {row}.price,"
+        f" {sign} * {_active(row)} * ({_minutes(f'{row}.end_time')} - {_minutes(f'{row}.start_time')}))\n"
+        f"ON CONFLICT (date, master_id, service_id) DO UPDATE SET"
+        f" orders = orders + excluded.orders,"
+        f" done = done + excluded.done,"
+        f" canceled = canceled + excluded.canceled,"
+        f" revenue = revenue + excluded.revenue,"
+        f" booked_minutes = booked_minutes + excluded.booked_minutes;"
+    )
+
+
+ROLLUP_DDL = [
+    f"CREATE TRIGGER IF NOT EXISTS orders_rollup_ai AFTER INSERT ON orders BEGIN\n"
+    f"{_apply('new', 1)}\nEND",
+
+    f"CREATE TRIGGER IF NOT EXISTS orders_rollup_au"
+    f" AFTER UPDATE OF {ROLLUP_COLUMNS} ON orders BEGIN\n"
+    f"{_apply('old', -1)}\n{_apply('new', 1)}\nEND",
+
+    f"CREATE TRIGGER IF NOT EXISTS orders_rollup_ad AFTER DELETE ON orders BEGIN\n"
+    f"{_apply('old', -1)}\nEND",
+]
+
+ROLLUP_REBUILD = [
+    f"DELETE FROM {ROLLUP_TABLE}",
+
+    f"INSERT INTO {ROLLUP_TABLE} (date, master_id, service_id,"
+    f" orders, done, canceled, revenue, booked_minutes)\n"
+    f"SELECT o.date, o.master_id, o.service_id, count(*),"
+    f" sum(o.status = 'done'),"
+    f" sum(o.status = 'canceled'),"
+    f" sum({_active('o')} * o.price),"
+    f" sum({_active('o')} * ({_minutes('o.end_time')} - {_minutes('o.start_time')}))\n"
+    f"FROM orders o GROUP BY o.date, o.master_id, o.service_id",
+]
+
+
+def rebuild_rollup(conn: Connection) -> int:
+    """
+    Пересчитать сводку по всем заявкам; возвращает число строк сводки
+    """
+    for sql in ROLLUP_REBUILD:
+        conn.execute(text(sql))
+    return conn.execute(text(f"SELECT count(*) FROM {ROLLUP_TABLE}")).scalar()
+
+
+if __name__ == "__main__":
+    from app.database import engine
+
+    if "--rebuild" not in sys.argv:
+        sys.exit("usage: python -m app.rollup --rebuild")
+
+    with engine.begin() as conn:
+        print("rows:", rebuild_rollup(conn))
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import date
 from app.models import PetSize, OrderStatus
 
@@ -20,7 +20,9 @@ class ClientRead(BaseModel):
 class PetInput(BaseModel):
     name: str
     species: str
-    breed: Optional[str]
+    breed: Optional[str] = None
+    breed_id: Optional[int] = None
+    age_group_id: Optional[int] = None
     size: PetSize
 
 
@@ -35,6 +37,11 @@ class PetRead(BaseModel):
         from_attributes = True
 
 
+class PetPage(BaseModel):
+    items: List[PetRead]
+    next: Optional[str] = None
+
+
 # ---------- SEARCH ----------
 
 class ClientSearchResult(BaseModel):
@@ -42,10 +49,15 @@ class ClientSearchResult(BaseModel):
     pets: List[PetRead]
 
 
+class ClientSearchPage(BaseModel):
+    items: List[ClientSearchResult]
+    next: Optional[str] = None
+
+
 # ---------- ORDER ----------
 
 class OrderCreate(BaseModel):
-    phone: Optional[str]
+    phone: Optional[str] = None
     full_name: str
 
     pet: PetInput
@@ -58,13 +70,14 @@ class OrderCreate(BaseModel):
 
     extra_service_ids: Optional[list[int]] = []
 
-    price: Optional[int]
-    comment: Optional[str]
+    price: Optional[int] = None
+    comment: Optional[str] = None
 
 
 
 class OrderRead(BaseModel):
-    id: int
+    # None — вхождение серии, ещё не созданное как заявка
+    id: Optional[int]
     date: date
     start_time: str
     end_time: str
@@ -74,11 +87,102 @@ class OrderRead(BaseModel):
     client_name: str
     pet_name: str
     service_name: str
+    master_id: Optional[int] = None
     master_name: str
+    series_id: Optional[int] = None
 
     class Config:
         from_attributes = True
 
+# ---------- SCHEDULE CHANGES ----------
+
+class ScheduleChanges(BaseModel):
+    # номер последнего изменения заявок: since для следующего запроса
+    seq: int
+    # версия клиентов, питомцев, серий и справочников; если она
+    # изменилась, расписание нужно загрузить целиком
+    refs: int
+    reload: bool = False
+
+    orders: List[OrderRead] = []
+    deleted: List[int] = []
+
+# ---------- BULK ORDERS ----------
+
+class OrderBulkCreate(BaseModel):
+    orders: List[OrderCreate]
+
+    # all_or_nothing — при любой ошибке ничего не создаётся
+    # best_effort — создаются все корректные заявки
+    mode: Literal["all_or_nothing", "best_effort"] = "all_or_nothing"
+
+
+class OrderBulkItem(BaseModel):
+    index: int
+    ok: bool
+    order: Optional[OrderRead] = None
+    status_code: int = 200
+    error: Optional[str] = None
+
+
+class OrderBulkResult(BaseModel):
+    created: int
+    failed: int
+    items: List[OrderBulkItem]
+
+
+# ---------- QUOTE ----------
+
+class QuoteItem(BaseModel):
+    service_id: int
+    # питомец из базы — или размер и возрастная группа нового
+    pet_id: Optional[int] = None
+    size: Optional[PetSize] = None
+    age_group_id: Optional[int] = None
+    extra_service_ids: List[int] = []
+
+
+class QuoteRequest(BaseModel):
+    items: List[QuoteItem]
+
+
+class QuoteLine(BaseModel):
+    index: int
+    ok: bool
+    # price — с доп. услугами, extras_price — их сумма
+    price: Optional[int] = None
+    extras_price: Optional[int] = None
+    duration: Optional[int] = None
+    error: Optional[str] = None
+
+# ---------- RECURRING SERIES ----------
+
+class OrderSeriesCreate(OrderCreate):
+    # date — первое вхождение
+    interval_weeks: int = 4
+    end_date: Optional[date] = None
+
+
+class OrderSeriesRead(BaseModel):
+    id: int
+    start_date: date
+    end_date: Optional[date]
+    interval_weeks: int
+    start_time: str
+    end_time: str
+    price: int
+    active: bool
+
+    client_name: str
+    pet_name: str
+    service_name: str
+    master_id: int
+    master_name: str
+
+
+class OrderSeriesSkip(BaseModel):
+    date: date
+
 # ---------- EXTRA SERVICES ----------
 
 class ExtraServiceRead(BaseModel):
@@ -101,3 +205,54 @@ class OrderUpdate(BaseModel):
 
 class OrderStatusUpdate(BaseModel):
     status: str
+
+# ---------- REPORTS ----------
+
+class RevenueMonth(BaseModel):
+    month: str
+    orders: int
+    done: int
+    canceled: int
+    revenue: int
+    booked_minutes: int
+
+
+class MasterUtilization(BaseModel):
+    master_id: int
+    master_name: str
+    orders: int
+    booked_minutes: int
+    # рабочие минуты за период: дни * (WORK_END - WORK_START)
+    capacity_minutes: int
+    utilization: float
+
+
+class AverageTicket(BaseModel):
+    size: PetSize
+    age_group_id: int
+    age_group_name: Optional[str] = None
+    orders: int
+    revenue: int
+    average_ticket: float
+
+
+class ExtraAttach(BaseModel):
+    extra_service_id: int
+    name: Optional[str] = None
+    orders: int
+    attach_rate: float
+
+
+class ExtrasReport(BaseModel):
+    orders: int
+    with_extras: int
+    attach_rate: float
+    by_service: List[ExtraAttach]
+
+
+class CancellationCell(BaseModel):
+    weekday: int  # 0 — понедельник
+    hour: int
+    orders: int
+    canceled: int
+    cancel_rate: float
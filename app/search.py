@@ -0,0 +1,206 @@
+"""
+Полнотекстовый поиск клиентов (SQLite FTS5).
+
+Таблица client_search (rowid = clients.id) хранит ФИО, телефон цифрами
+(полностью и без кода страны) и клички питомцев клиента. Её
+поддерживают триггеры на clients и pets (миграция 3), поэтому индекс
+актуален при любой записи, в том числе при массовых INSERT и правках
+вне приложения.
+
+Токенизатор unicode61 приводит регистр и кириллицы, а ё заменяется на е
+при индексации и в запросе. Каждое слово запроса ищется как префикс, в
+любом порядке: "свет иван" находит "Иванова Светлана".
+
+Подсказки (search_client_ids) берутся в порядке индекса (новые
+клиенты выше) с LIMIT RANK_WINDOW + 1: FTS5 останавливается на
+первых совпадениях, и время короткого префикса не растёт с их числом.
+Если совпадений не больше RANK_WINDOW,
+все они получены и ранжируются в Python полностью (rank). Если больше —
+запрос слишком общий, и подсказки остаются в порядке индекса: полное
+ранжирование, в том числе bm25(), просматривает все совпадения префикса
+(у короткого — десятки тысяч, сотни мс на 500 тыс. клиентов), а
+ранжирование части окна выдавало бы случайную выборку за лучшие
+совпадения. Время — bench/client_search.py.
+"""
+import re
+from typing import List
+
+from sqlalchemy import Integer, column, text
+from sqlalchemy.orm import Session
+
+SEARCH_TABLE = "client_search"
+
+# вес совпадения по столбцу: ФИО, телефон, питомцы
+RANK_WEIGHTS = {"full_name": 4, "phone": 2, "pet_names": 1}
+# больше совпадений — подсказки без ранжирования, в порядке индекса
+RANK_WINDOW = 200
+
+MIN_QUERY_LENGTH = 2
+TYPEAHEAD_LIMIT = 10
+MAX_TYPEAHEAD_LIMIT = 50
+
+
+# =====================================================
+# DDL (миграция 3)
+# =====================================================
+def _fold(expr: str) -> str:
+    return f"replace(replace({expr}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _digits(expr: str) -> str:
+    for ch in "+ -()":
+        expr = f"replace({expr}, '{ch}', '')"
+    return expr
+
+
+def _phone_terms(expr: str) -> str:
+    # 79001234567 -> "79001234567 9001234567": ищется и с кодом, и без
+    digits = _digits(f"coalesce({expr}, '')")
+    return (
+        f"CASE WHEN length({digits}) = 11 AND substr({digits}, 1, 1) IN ('7', '8')"
+        f" THEN {digits} || ' ' || substr({digits}, 2) ELSE {digits} END"
+    )
+
+
+def _pet_names(pets_alias: str) -> str:
+    return _fold(f"group_concat({pets_alias}.name, ' ')")
+
+
+def _refresh(client_id: str) -> str:
+    """
+    Пересобрать строку индекса клиента client_id (SQL-выражение)
+    """
+    return (
+        f"DELETE FROM {SEARCH_TABLE} WHERE rowid = {client_id};\n"
+        f"INSERT INTO {SEARCH_TABLE} (rowid, full_name, phone, pet_names)\n"
+        f"SELECT c.id, {_fold('c.full_name')}, {_phone_terms('c.phone')},\n"
+        f"       (SELECT {_pet_names('p')} FROM pets p"
+        f" WHERE p.client_id = c.id)\n"
+        f"FROM clients c WHERE c.id = {client_id};"
+    )
+
+
+SEARCH_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    " full_name, phone, pet_names,"
+    " tokenize = 'unicode61 remove_diacritics 2',"
+    " prefix = '2 3 4')",
+
+    f"CREATE TRIGGER IF NOT EXISTS client_search_ai AFTER INSERT ON clients BEGIN\n"
+    f"{_refresh('new.id')}\nEND",
+
+    f"CREATE TRIGGER IF NOT EXISTS client_search_au"
+    f" AFTER UPDATE OF full_name, phone ON clients BEGIN\n"
+    f"{_refresh('new.id')}\nEND",
+
+    f"CREATE TRIGGER IF NOT EXISTS client_search_ad AFTER DELETE ON clients BEGIN\n"
+    f"DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;\nEND",
+
+    f"CREATE TRIGGER IF NOT EXISTS client_search_pets_ai AFTER INSERT ON pets BEGIN\n"
+    f"{_refresh('new.client_id')}\nEND",
+
+    f"CREATE TRIGGER IF NOT EXISTS client_search_pets_au"
+    f" AFTER UPDATE OF name, client_id ON pets BEGIN\n"
+    f"{_refresh('old.client_id')}\n{_refresh('new.client_id')}\nEND",
+
+    f"CREATE TRIGGER IF NOT EXISTS client_search_pets_ad AFTER DELETE ON pets BEGIN\n"
+    f"{_refresh('old.client_id')}\nEND",
+]
+
+def search_backfill(condition: str = "1") -> str:
+    """
+    Заполнение индекса для уже существующих клиентов (condition — по c)
+    """
+    return (
+        f"INSERT INTO {SEARCH_TABLE} (rowid, full_name, phone, pet_names)\n"
+        f"SELECT c.id, {_fold('c.full_name')}, {_phone_terms('c.phone')},\n"
+        f"       {_pet_names('p')}\n"
+        f"FROM clients c LEFT JOIN pets p ON p.client_id = c.id\n"
+        f"WHERE {condition}\n"
+        f"GROUP BY c.id"
+    )
+
+
+SEARCH_BACKFILL = search_backfill()
+
+
+# =====================================================
+# QUERIES
+# =====================================================
+def query_terms(query: str) -> List[str]:
+    """
+    Слова запроса в нижнем регистре; цифры склеиваются в один номер
+    телефона без кода страны
+    """
+    tokens = re.findall(r"\w+", query.replace("ё", "е").replace("Ё", "Е").lower())
+    words = [t for t in tokens if not t.isdigit()]
+    digits = "".join(t for t in tokens if t.isdigit())
+
+    if len(digits) > 1 and digits[0] in "78":
+        digits = digits[1:]
+
+    return words + ([digits] if digits else [])
+
+
+def match_expression(query: str) -> str:
+    """
+    Строка пользователя -> выражение MATCH (каждое слово — префикс).
+    Пустая строка, если искать нечего.
+    """
+    return " ".join(f'"{t}"*' for t in query_terms(query))
+
+
+def rank(terms: List[str], row) -> int:
+    """
+    Сумма по словам запроса: вес лучшего столбца, где слово совпало,
+    вдвое больше при совпадении слова целиком, а не только префикса
+    """
+    fields = {
+        name: (getattr(row, name) or "").lower().split()
+        for name in RANK_WEIGHTS
+    }
+    score = 0
+    for term in terms:
+        score += max(
+            weight * (2 if term in fields[name] else 1)
+            if any(w.startswith(term) for w in fields[name]) else 0
+            for name, weight in RANK_WEIGHTS.items()
+        )
+    return score
+
+
+def search_client_ids(db: Session, query: str, limit: int) -> List[int]:
+    """
+    id клиентов по убыванию релевантности (при равенстве — новые выше);
+    если совпадений больше RANK_WINDOW — просто новые выше
+    """
+    terms = query_terms(query)
+    if sum(map(len, terms)) < MIN_QUERY_LENGTH:
+        return []
+
+    rows = db.execute(
+        text(
+            f"SELECT rowid, full_name, phone, pet_names FROM {SEARCH_TABLE}"
+            f" WHERE {SEARCH_TABLE} MATCH :q ORDER BY rowid DESC LIMIT :window"
+        ),
+        {"q": match_expression(query), "window": RANK_WINDOW + 1},
+    ).all()
+
+    # все совпадения получены — полное ранжирование; sort устойчивый,
+    # при равенстве новые остаются выше
+    if len(rows) <= RANK_WINDOW:
+        rows.sort(key=lambda r: rank(terms, r), reverse=True)
+    return [r.rowid for r in rows[:limit]]
+
+
+def matching_clients(query: str):
+    """
+    Подзапрос id всех совпавших клиентов — для фильтра Client.id.in_(...)
+    """
+    expression = match_expression(query)
+    if not expression:
+        return None
+
+    return text(
+        f"SELECT rowid AS id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :q"
+    ).bindparams(q=expression).columns(column("id", Integer))
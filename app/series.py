@@ -0,0 +1,211 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta, date
+from typing import Optional
+
+from app.database import get_db, write_transaction
+from app.models import Order, OrderSeries, OrderSeriesException, OrderStatus
+from app.catalog import Catalog, get_catalog
+from app.intervals import order_intervals
+from app.recurrence import pending_occurrences
+from app.auth import get_current_user
+from app.orders import (
+    resolve_client_pet,
+    booking_window,
+    materialize_series,
+)
+from app.schemas import OrderSeriesCreate, OrderSeriesRead, OrderSeriesSkip
+
+router = APIRouter(prefix="/orders/series", tags=["Orders"])
+
+MAX_INTERVAL_WEEKS = 52
+
+# насколько вперёд сверять новую серию с другими сериями мастера;
+# дальше пересечения ловит materialize_due (пропуск вхождения)
+SERIES_CHECK_DAYS = 365
+
+
+def is_occurrence(series: OrderSeries, day: date) -> bool:
+    if day < series.start_date:
+        return False
+    if series.end_date and day > series.end_date:
+        return False
+    return (day - series.start_date).days % (7 * series.interval_weeks) == 0
+
+
+def series_read(series: OrderSeries, catalog: Catalog) -> OrderSeriesRead:
+    return OrderSeriesRead(
+        id=series.id,
+        start_date=series.start_date,
+        end_date=series.end_date,
+        interval_weeks=series.interval_weeks,
+        start_time=series.start_time.strftime("%H:%M"),
+        end_time=series.end_time.strftime("%H:%M"),
+        price=series.price,
+        active=bool(series.active),
+        client_name=series.client.full_name,
+        pet_name=series.pet.name,
+        service_name=catalog.services[series.service_id].name,
+        master_id=series.master_id,
+        master_name=catalog.masters[series.master_id].name,
+    )
+
+
+# =====================================================
+# CREATE SERIES
+# =====================================================
+@router.post("", response_model=OrderSeriesRead)
+def create_series(
+    data: OrderSeriesCreate,
+    db: Session = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
+    user=Depends(get_current_user),
+):
+    """
+    Повторяющаяся запись: каждые interval_weeks недель, начиная с date.
+    Доп. услуги в серии не поддерживаются.
+    """
+    if not 1 <= data.interval_weeks <= MAX_INTERVAL_WEEKS:
+        raise HTTPException(400, "Некорректный интервал повторения")
+    if data.end_date and data.end_date < data.date:
+        raise HTTPException(400, "Некорректный период")
+
+    master = catalog.masters.get(data.master_id)
+    if not master or not master.active:
+        raise HTTPException(400, "Некорректный мастер")
+
+    # как в create_order: блокировка мастера до первой записи
+    with order_intervals.master_lock(master.id), write_transaction(db):
+        client, pet = resolve_client_pet(db, data, catalog)
+
+        quote = catalog.prices.quote(data.service_id, pet.size, pet.age_group_id)
+        if not quote:
+            raise HTTPException(400, "Нет тарифа для выбранной услуги и размера")
+
+        start, end = booking_window(
+            data.date, data.start_time, quote.duration, datetime.now()
+        )
+
+        series = OrderSeries(
+            client_id=client.id,
+            pet_id=pet.id,
+            master_id=master.id,
+            service_id=data.service_id,
+            price=data.price or quote.price,
+            start_date=data.date,
+            end_date=data.end_date,
+            interval_weeks=data.interval_weeks,
+            start_time=start,
+            end_time=end,
+            comment=data.comment,
+            active=True,
+        )
+
+        # ---------- CONFLICT CHECK ----------
+        q = db.query(Order.date).filter(
+            Order.master_id == master.id,
+            Order.date >= data.date,
+            Order.status != OrderStatus.canceled,
+            Order.start_time < end,
+            Order.end_time > start,
+        )
+        if data.end_date:
+            q = q.filter(Order.date <= data.end_date)
+
+        busy = {r.date for r in q}
+        busy.update(
+            day
+            for other, day in pending_occurrences(
+                db, data.date, data.date + timedelta(days=SERIES_CHECK_DAYS), [master.id]
+            )
+            if other.start_time < end and other.end_time > start
+        )
+
+        conflicts = sorted(day for day in busy if is_occurrence(series, day))
+        if conflicts:
+            raise HTTPException(
+                400,
+                "Время занято: " + ", ".join(d.strftime("%d.%m.%Y") for d in conflicts[:5])
+            )
+
+        db.add(series)
+        db.commit()
+
+        order_intervals.invalidate(master.id)
+
+    materialize_series(db, force=True)
+
+    return series_read(db.get(OrderSeries, series.id), catalog)
+
+
+# =====================================================
+# LIST
+# =====================================================
+@router.get("", response_model=list[OrderSeriesRead])
+def get_series(
+    master_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
+    user=Depends(get_current_user),
+):
+    q = db.query(OrderSeries).filter(OrderSeries.active == True)
+    if master_id:
+        q = q.filter(OrderSeries.master_id == master_id)
+
+    return [series_read(s, catalog) for s in q.order_by(OrderSeries.id)]
+
+
+# =====================================================
+# SKIP OCCURRENCE
+# =====================================================
+@router.post("/{series_id}/skip", response_model=OrderSeriesRead)
+def skip_occurrence(
+    series_id: int,
+    data: OrderSeriesSkip,
+    db: Session = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
+    user=Depends(get_current_user),
+):
+    series = db.get(OrderSeries, series_id)
+    if not series:
+        raise HTTPException(404, "Серия не найдена")
+
+    if not is_occurrence(series, data.date):
+        raise HTTPException(400, "В этот день нет записи по серии")
+
+    # уже созданную заявку отменяют как обычную
+    if series.materialized_until and data.date <= series.materialized_until:
+        raise HTTPException(400, "Заявка на этот день уже создана — отмените её")
+
+    if data.date not in {e.date for e in series.exceptions}:
+        series.exceptions.append(OrderSeriesException(date=data.date))
+        db.commit()
+
+    order_intervals.invalidate(series.master_id, data.date)
+
+    return series_read(series, catalog)
+
+
+# =====================================================
+# STOP SERIES
+# =====================================================
+@router.delete("/{series_id}", response_model=OrderSeriesRead)
+def stop_series(
+    series_id: int,
+    db: Session = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
+    user=Depends(get_current_user),
+):
+    """
+    Остановить серию; уже созданные заявки остаются
+    """
+    series = db.get(OrderSeries, series_id)
+    if not series:
+        raise HTTPException(404, "Серия не найдена")
+
+    series.active = False
+    db.commit()
+
+    order_intervals.invalidate(series.master_id)
+
+    return series_read(series, catalog)
@@ -1,32 +1,26 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Request, Response
 
-from app.database import SessionLocal
-from app.models import Service
 from app.auth import get_current_user
+from app.catalog import Catalog, get_catalog
 
 router = APIRouter(prefix="/services", tags=["Services"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.get("")
-def get_services(
-    db: Session = Depends(get_db),
+async def get_services(
+    request: Request,
+    response: Response,
+    catalog: Catalog = Depends(get_catalog),
     user=Depends(get_current_user),
 ):
-    services = db.query(Service).all()
+    not_modified = catalog.validator("services").apply(request, response)
+    if not_modified:
+        return not_modified
 
     return [
         {
             "id": s.id,
             "name": s.name,
         }
-        for s in services
+        for s in catalog.services.values()
     ]
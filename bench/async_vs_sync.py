@@ -0,0 +1,182 @@
+"""
+Сравнение синхронного и асинхронного (DB_ASYNC=1) режимов доступа к БД.
+
+Для каждого режима запускается uvicorn на временной базе с заявками за
+месяц, и N одновременных клиентов в течение --duration секунд читают
+недельное расписание. Печатается пропускная способность и задержки.
+
+    python bench/async_vs_sync.py
+    python bench/async_vs_sync.py --concurrency 50,200,1000 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, time as dtime, timedelta
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# понедельник через неделю после ближайшего: 4 недели заявок prepare()
+# всегда в будущем и заканчиваются раньше CREATE_FROM (bench/endpoints.py)
+MONTH = date.today() + timedelta(days=14 - date.today().weekday())
+ORDERS_PER_DAY = 40
+
+
+def prepare(db_url: str):
+    """
+    Схема, справочники и заявки за 4 недели во временной базе
+    """
+    os.environ["DATABASE_URL"] = db_url
+    sys.path.insert(0, ROOT)
+
+    from sqlalchemy import insert
+
+    from app.database import Base, SessionLocal, engine
+    from app.init_data import init_all
+    from app.migrations import run_migrations
+    from app.models import Client, Order, OrderStatus, Pet, normalize_phone
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    init_all()
+
+    db = SessionLocal()
+    # Core insert минует @validates: phone_key проставляем сами
+    db.execute(insert(Client), [
+        {"full_name": f"Клиент {i}", "phone": f"+7900{i:07d}",
+         "phone_key": normalize_phone(f"+7900{i:07d}")}
+        for i in range(500)
+    ])
+    db.execute(insert(Pet), [
+        {"name": f"Питомец {i}", "species": "dog", "age_group_id": 2,
+         "size": "medium", "client_id": i + 1}
+        for i in range(500)
+    ])
+    rows = []
+    for d in range(28):
+        for k in range(ORDERS_PER_DAY):
+            rows.append({
+                "client_id": k * 7 % 500 + 1, "pet_id": k * 7 % 500 + 1,
+                "master_id": k % 4 + 1, "service_id": 1, "price": 2000,
+                "date": MONTH + timedelta(days=d),
+                "start_time": dtime(9 + k // 4), "end_time": dtime(9 + k // 4, 50),
+                "status": OrderStatus.planned,
+            })
+    db.execute(insert(Order), rows)
+    db.commit()
+    db.close()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(db_url: str, async_mode: bool, port: int, workers: int = 1) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        DATABASE_URL=db_url,
+        DB_ASYNC="1" if async_mode else "0",
+        SEED_ON_STARTUP="0",
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/login.html", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("uvicorn не запустился")
+
+
+async def load(base: str, concurrency: int, duration: float) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, timeout=60, limits=limits) as client:
+        r = await client.post(
+            "/auth/login", data={"username": "admin1", "password": "admin123"}
+        )
+        headers = {"Authorization": "Bearer " + r.json()["access_token"]}
+
+        latencies, errors = [], 0
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                day = MONTH + timedelta(days=random.randrange(21))
+                started = time.perf_counter()
+                try:
+                    r = await client.get(
+                        "/orders/schedule",
+                        params={"date_from": day.isoformat(),
+                                "date_to": (day + timedelta(days=6)).isoformat()},
+                        headers=headers,
+                    )
+                    if r.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", default="50,200,1000")
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{tmp}/bench.db"
+        os.environ.setdefault("BCRYPT_ROUNDS", "4")
+        subprocess.run(
+            [sys.executable, "-c",
+             f"import sys; sys.path.insert(0, {ROOT!r}); "
+             f"from bench.async_vs_sync import prepare; prepare({db_url!r})"],
+            cwd=ROOT, check=True,
+        )
+
+        print(f"{'mode':<6} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>9} {'errors':>6}")
+        for async_mode in (False, True):
+            port = free_port()
+            server = start_server(db_url, async_mode, port)
+            try:
+                for concurrency in levels:
+                    r = asyncio.run(load(f"http://127.0.0.1:{port}", concurrency, args.duration))
+                    print(
+                        f"{'async' if async_mode else 'sync':<6} {concurrency:>7} "
+                        f"{r['rps']:>8.0f} {r['p50_ms']:>8.1f} {r['p99_ms']:>9.1f} {r['errors']:>6}"
+                    )
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
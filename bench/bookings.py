@@ -0,0 +1,210 @@
+"""
+Пропускная способность POST /orders: заявок в секунду до и после.
+
+Один и тот же сценарий прогоняется на рабочем дереве и на каждом
+--ref (коммит или ветка git): дерево ref выгружается git archive во
+временный каталог и запускается в отдельном процессе, поэтому
+сравнение «до / после» воспроизводится на одной машине одной командой.
+
+Сценарий: в свежую базу дерева (схема и справочники — из его же
+app.main) пишутся --clients клиентов с питомцами, затем --bookings
+заявок отправляются через TestClient в --concurrency потоков. Каждая
+заявка — существующий клиент и питомец, свободное окно мастера и
+--extras доп. услуг. С --new-clients каждая заявка создаёт нового
+клиента и питомца (старые деревья, не умеющие этого, покажут ошибки).
+
+    python bench/bookings.py --ref f81cf45
+    python bench/bookings.py --ref a04e3d5^ --ref a04e3d5 --bookings 500
+    python bench/bookings.py --new-clients --concurrency 8 --output bookings.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# окна по 2 часа: 4 мастера × 5 заявок в день
+HOURS = (9, 11, 13, 15, 17)
+MASTERS = 4
+
+
+# =====================================================
+# RUN (в процессе проверяемого дерева)
+# =====================================================
+def seed_clients(db_path: str, count: int):
+    """
+    Клиенты и питомцы прямым SQL: только колонки, общие для всех версий
+    схемы (phone_key — если есть)
+    """
+    con = sqlite3.connect(db_path)
+    try:
+        columns = {r[1] for r in con.execute("PRAGMA table_info(clients)")}
+        if "phone_key" in columns:
+            con.executemany(
+                "INSERT INTO clients (full_name, phone, phone_key) VALUES (?, ?, ?)",
+                ((f"Клиент {i}", f"+7901{i:07d}", f"7901{i:07d}") for i in range(count)),
+            )
+        else:
+            con.executemany(
+                "INSERT INTO clients (full_name, phone) VALUES (?, ?)",
+                ((f"Клиент {i}", f"+7901{i:07d}") for i in range(count)),
+            )
+        con.executemany(
+            "INSERT INTO pets (name, species, age_group_id, size, client_id)"
+            " SELECT ?, 'dog', 2, 'medium', id FROM clients WHERE full_name = ?",
+            ((f"Питомец {i}", f"Клиент {i}") for i in range(count)),
+        )
+        con.commit()
+    finally:
+        con.close()
+
+
+def booking(n: int, clients: int, extras: int, new_clients: bool) -> dict:
+    first_day = date.today() + timedelta(days=30)
+    per_day = MASTERS * len(HOURS)
+    i = n if new_clients else n % clients
+    return {
+        "phone": f"+790{2 if new_clients else 1}{i:07d}",
+        "full_name": f"{'Новый клиент' if new_clients else 'Клиент'} {i}",
+        "pet": {
+            "name": f"Питомец {i}", "species": "dog", "breed": None,
+            "age_group_id": 2, "size": "Средний",
+        },
+        "master_id": n % MASTERS + 1,
+        "service_id": 1,
+        "date": (first_day + timedelta(days=n // per_day)).isoformat(),
+        "start_time": f"{HOURS[n // MASTERS % len(HOURS)]:02d}:00",
+        "extra_service_ids": list(range(1, extras + 1)),
+        "price": None,
+        "comment": None,
+    }
+
+
+def run(args) -> dict:
+    import warnings
+
+    warnings.filterwarnings("ignore")
+    sys.path.insert(0, os.getcwd())
+
+    from fastapi.testclient import TestClient
+
+    from app.database import engine
+    from app.main import app
+
+    seed_clients(engine.url.database, args.clients)
+
+    client = TestClient(app, raise_server_exceptions=False)
+    r = client.post("/auth/login", data={"username": "admin1", "password": "admin123"})
+    headers = {"Authorization": "Bearer " + r.json()["access_token"]}
+    bodies = [
+        booking(n, args.clients, args.extras, args.new_clients) for n in range(args.bookings)
+    ]
+
+    def send(body):
+        started = time.perf_counter()
+        status = client.post("/orders", json=body, headers=headers).status_code
+        return status, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(pool.map(send, bodies))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(t for _, t in results)
+    statuses = Counter(status for status, _ in results)
+    ok = statuses.pop(200, 0)
+    return {
+        "bookings": len(results),
+        "ok": ok,
+        "error_statuses": {str(s): n for s, n in statuses.items()},
+        "seconds": round(elapsed, 2),
+        "bookings_per_s": round(ok / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+    }
+
+
+# =====================================================
+# TARGETS
+# =====================================================
+def export_ref(ref: str, target: str):
+    archive = subprocess.run(
+        ["git", "archive", ref], cwd=ROOT, check=True, capture_output=True
+    ).stdout
+    subprocess.run(["tar", "-x", "-C", target], input=archive, check=True)
+
+
+def measure(tree: str, db_dir: str, args) -> dict:
+    """
+    Прогон в отдельном процессе с cwd = tree. Старые деревья берут базу
+    из ./database.db, новые — из DATABASE_URL: обе указывают на свежий файл.
+    """
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{db_dir}/bench.db",
+        BCRYPT_ROUNDS="4",
+        PYTHONDONTWRITEBYTECODE="1",
+    )
+    command = [
+        sys.executable, os.path.abspath(__file__), "--run",
+        "--bookings", str(args.bookings), "--clients", str(args.clients),
+        "--extras", str(args.extras), "--concurrency", str(args.concurrency),
+    ]
+    if args.new_clients:
+        command.append("--new-clients")
+    out = subprocess.run(command, cwd=tree, env=env, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ref", action="append", default=[],
+                        help="коммит для сравнения; можно несколько")
+    parser.add_argument("--bookings", type=int, default=300)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--extras", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--new-clients", action="store_true")
+    parser.add_argument("--output", help="записать результат в JSON-файл")
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run(args)))
+        return
+
+    results = {}
+    for ref in args.ref + [None]:
+        with tempfile.TemporaryDirectory() as tmp:
+            tree = ROOT
+            if ref:
+                tree = os.path.join(tmp, "tree")
+                os.mkdir(tree)
+                export_ref(ref, tree)
+            name = ref or "working tree"
+            results[name] = measure(tree, tmp, args)
+            print(name, results[name], file=sys.stderr)
+
+    report = {
+        "meta": {
+            "bookings": args.bookings, "clients": args.clients, "extras": args.extras,
+            "concurrency": args.concurrency, "new_clients": args.new_clients,
+        },
+        "results": results,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
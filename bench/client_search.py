@@ -0,0 +1,102 @@
+"""
+Задержка подсказок поиска клиентов (search_client_ids) на большой базе.
+
+Во временную базу app/generate_data.py пишет --clients клиентов (по
+умолчанию 500 тыс.) с питомцами; индекс client_search заполняется тем
+же проходом. Каждый запрос из QUERIES выполняется --repeat раз, по
+нему печатается число совпадений, ранжированы ли подсказки (не больше
+RANK_WINDOW совпадений), p50 и p99. С --target-ms код выхода 1, если
+p99 какого-либо запроса больше цели.
+
+    python bench/client_search.py
+    python bench/client_search.py --clients 100000 --repeat 50
+    python bench/client_search.py --target-ms 10
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# от коротких префиксов с десятками тысяч совпадений до узких запросов
+QUERIES = (
+    "ив", "иван", "иванова", "свет иван", "смирнов дмитрий", "барсик",
+    "соколова ольга мурка", "900", "7900", "+7 (900) 123",
+)
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 2)
+
+
+def measure(fn, repeat: int) -> list:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def run(clients: int, repeat: int, limit: int) -> dict:
+    from sqlalchemy import text
+
+    from app.database import SessionLocal, engine
+    from app.generate_data import generate
+    from app.init_data import init_all
+    from app.migrations import upgrade_database
+    from app.search import RANK_WINDOW, SEARCH_TABLE, match_expression, search_client_ids
+
+    upgrade_database(engine)
+    init_all()
+    started = time.perf_counter()
+    generate(engine, clients, 0, date.today(), date.today(), 1, log=lambda _: None)
+    result = {"clients": clients, "generate_s": round(time.perf_counter() - started, 1)}
+
+    matches = text(f"SELECT count(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :q")
+
+    queries = {}
+    with SessionLocal() as db:
+        for query in QUERIES:
+            times = measure(lambda: search_client_ids(db, query, limit), repeat)
+            count = db.execute(matches, {"q": match_expression(query)}).scalar()
+            queries[query] = {
+                "matches": count,
+                "ranked": count <= RANK_WINDOW,
+                "p50_ms": percentile(times, 0.50),
+                "p99_ms": percentile(times, 0.99),
+            }
+    result["queries"] = queries
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=10, help="подсказок на запрос")
+    parser.add_argument("--target-ms", type=float, help="допустимый p99 запроса")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+        os.environ.setdefault("BCRYPT_ROUNDS", "4")
+        sys.path.insert(0, ROOT)
+        result = run(args.clients, args.repeat, args.limit)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    if args.target_ms:
+        slow = {q: r["p99_ms"] for q, r in result["queries"].items() if r["p99_ms"] > args.target_ms}
+        for query, p99 in slow.items():
+            print(f"SLOW {query!r}: p99 {p99} ms", file=sys.stderr)
+        if slow:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""
+Нагрузочный прогон основных эндпоинтов с результатом в JSON.
+
+Каждый сценарий (эндпоинт) грузится --concurrency параллельными
+клиентами в течение --duration секунд; по сценарию печатается
+пропускная способность, p50/p95/p99, ошибки и SQL-запросы на запрос.
+
+    asgi     — приложение в этом же процессе через httpx.ASGITransport,
+               без сети и без uvicorn
+    uvicorn  — uvicorn на той же временной базе (start_server из
+               bench/async_vs_sync.py)
+
+SQL-запросы считаются в процессе (before_cursor_execute): перед
+нагрузкой каждый сценарий выполняется --profile раз последовательно
+через ASGI, поэтому число запросов есть и для режима uvicorn.
+
+База — prepare() из bench/async_vs_sync.py (500 клиентов и питомцев,
+4 недели заявок), параметры запросов выбираются генератором с --seed:
+прогоны с одинаковыми аргументами сравнимы. С --baseline результат
+сравнивается с прошлым JSON, и при регрессии сверх --tolerance (меньше
+req/s, больше p95 или больше запросов) код выхода — 1.
+
+    python bench/endpoints.py --output bench.json
+    python bench/endpoints.py --mode both --concurrency 50 --duration 10
+    python bench/endpoints.py --baseline main.json --output pr.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.async_vs_sync import MONTH, free_port, prepare, start_server  # noqa: E402
+
+# новые заявки — с этого дня, 4 мастера × 5 двухчасовых окон в день
+CREATE_FROM = date.today() + timedelta(days=60)
+CREATE_HOURS = (9, 11, 13, 15, 17)
+CLIENTS = 500
+
+
+# =====================================================
+# SCENARIOS
+# =====================================================
+class State:
+    """
+    Общие для сценариев токен, генератор параметров и созданные заявки
+    """
+
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.headers = {}
+        self.slots = itertools.count()
+        self.created = []
+
+    def client_no(self) -> int:
+        return self.rng.randrange(CLIENTS)
+
+
+def login(state: State):
+    return "POST", "/auth/login", {"data": {"username": "admin1", "password": "admin123"}}
+
+
+def catalog(path: str, **params):
+    def build(state: State):
+        return "GET", path, {"params": params}
+    return build
+
+
+def schedule(days: int):
+    def build(state: State):
+        day = MONTH + timedelta(days=state.rng.randrange(28 - days + 1))
+        return "GET", "/orders/schedule", {"params": {
+            "date_from": day.isoformat(),
+            "date_to": (day + timedelta(days=days - 1)).isoformat(),
+        }}
+    return build
+
+
+def clients_search(state: State):
+    return "GET", "/clients/search", {"params": {"q": f"Клиент {state.client_no() // 10}"}}
+
+
+def clients_search_phone(state: State):
+    return "GET", "/clients/search/phone", {"params": {"phone": f"+7900{state.client_no():07d}"}}
+
+
+def clients_search_name(state: State):
+    return "GET", "/clients/search/name", {"params": {"name": f"Клиент {state.client_no() // 100}"}}
+
+
+def order_slot(n: int):
+    """
+    n-е свободное окно: (день, мастер, начало)
+    """
+    return (
+        CREATE_FROM + timedelta(days=n // 20),
+        n % 4 + 1,
+        f"{CREATE_HOURS[n // 4 % 5]:02d}:00",
+    )
+
+
+def orders_create(state: State):
+    # клиент и питомец из prepare(): средний размер, услуга 1 — 2 часа
+    i = state.client_no()
+    day, master_id, start = order_slot(next(state.slots))
+    return "POST", "/orders", {"json": {
+        "phone": f"+7900{i:07d}",
+        "full_name": f"Клиент {i}",
+        "pet": {"name": f"Питомец {i}", "species": "dog", "age_group_id": 2, "size": "Средний"},
+        "master_id": master_id,
+        "service_id": 1,
+        "date": day.isoformat(),
+        "start_time": start,
+        "extra_service_ids": [],
+    }}
+
+
+def orders_update(state: State):
+    # то же окно, меняются доп. услуги и комментарий
+    order = state.rng.choice(state.created)
+    return "PUT", f"/orders/{order['id']}", {"json": {
+        "date": order["date"],
+        "start_time": order["start_time"],
+        "master_id": order["master_id"],
+        "service_id": 1,
+        "extra_service_ids": state.rng.choice([[], [1], [1, 2]]),
+        "comment": f"bench {state.rng.randrange(1000)}",
+    }}
+
+
+SCENARIOS = {
+    "auth_login": login,
+    "masters": catalog("/masters"),
+    "services": catalog("/services"),
+    "breeds": catalog("/breeds", species="dog"),
+    "clients_search": clients_search,
+    "clients_search_phone": clients_search_phone,
+    "clients_search_name": clients_search_name,
+    "schedule_day": schedule(1),
+    "schedule_week": schedule(7),
+    "schedule_month": schedule(28),
+    # update берёт заявки, созданные create
+    "orders_create": orders_create,
+    "orders_update": orders_update,
+}
+
+
+def on_success(name: str, state: State, response: httpx.Response):
+    if name == "orders_create":
+        state.created.append(response.json())
+
+
+# =====================================================
+# RUNNER
+# =====================================================
+class QueryCounter:
+    def __init__(self, *engines):
+        self.count = 0
+        from sqlalchemy import event
+
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def percentile(values: list, q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000
+
+
+async def send(client: httpx.AsyncClient, name: str, state: State) -> int:
+    """
+    Код ответа; 0 — ошибка соединения
+    """
+    method, url, kwargs = SCENARIOS[name](state)
+    try:
+        r = await client.request(method, url, headers=state.headers, **kwargs)
+    except httpx.HTTPError:
+        return 0
+    if r.status_code == 200:
+        on_success(name, state, r)
+    return r.status_code
+
+
+async def profile(client: httpx.AsyncClient, name: str, state: State, counter: QueryCounter, n: int) -> float:
+    """
+    Запросов к БД на запрос: n последовательных запросов в процессе
+    """
+    before = counter.count
+    for _ in range(n):
+        await send(client, name, state)
+    return round((counter.count - before) / n, 2)
+
+
+async def load(client: httpx.AsyncClient, name: str, state: State, concurrency: int, duration: float) -> dict:
+    latencies, errors = [], Counter()
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            status = await send(client, name, state)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors[str(status)] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors.values()),
+        "error_statuses": dict(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+    }
+
+
+async def authenticate(client: httpx.AsyncClient, state: State):
+    method, url, kwargs = login(state)
+    r = await client.request(method, url, **kwargs)
+    r.raise_for_status()
+    state.headers = {"Authorization": "Bearer " + r.json()["access_token"]}
+
+
+def asgi_client(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60,
+    )
+
+
+def http_client(base: str, concurrency: int) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    return httpx.AsyncClient(base_url=base, timeout=60, limits=limits)
+
+
+async def run_profile(app, counter: QueryCounter, names: list, state: State, n: int) -> dict:
+    async with asgi_client(app) as client:
+        await authenticate(client, state)
+        return {name: await profile(client, name, state, counter, n) for name in names}
+
+
+async def run_load(make_client, names: list, state: State, concurrency: int, duration: float) -> dict:
+    async with make_client(concurrency) as client:
+        await authenticate(client, state)
+        return {name: await load(client, name, state, concurrency, duration) for name in names}
+
+
+# =====================================================
+# COMPARE
+# =====================================================
+def regressions(baseline: dict, current: dict, tolerance: float) -> list:
+    found = []
+    for mode, results in current["results"].items():
+        for name, now in results.items():
+            before = baseline.get("results", {}).get(mode, {}).get(name)
+            if not before:
+                continue
+            if now["rps"] < before["rps"] * (1 - tolerance):
+                found.append(f"{mode}/{name}: req/s {before['rps']} -> {now['rps']}")
+            if now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                found.append(f"{mode}/{name}: p95 {before['p95_ms']} -> {now['p95_ms']} ms")
+            if now["queries"] > before["queries"]:
+                found.append(f"{mode}/{name}: запросов {before['queries']} -> {now['queries']}")
+    return found
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", choices=("asgi", "uvicorn", "both"), default="asgi")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=5, help="секунд на сценарий")
+    parser.add_argument("--profile", type=int, default=20,
+                        help="последовательных запросов для подсчёта SQL")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help="через запятую, из: " + ", ".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--async", dest="async_mode", action="store_true",
+                        help="DB_ASYNC=1 для приложения")
+    parser.add_argument("--output", help="файл JSON (по умолчанию stdout)")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    names = args.scenarios.split(",")
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+    if "orders_update" in names and "orders_create" not in names:
+        names.insert(names.index("orders_update"), "orders_create")
+
+    modes = ("asgi", "uvicorn") if args.mode == "both" else (args.mode,)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{tmp}/bench.db"
+        os.environ.setdefault("BCRYPT_ROUNDS", "4")
+        os.environ["SEED_ON_STARTUP"] = "0"
+        os.environ["DB_ASYNC"] = "1" if args.async_mode else "0"
+        prepare(db_url)
+
+        from app.database import async_engine, engine
+        from app.main import app
+
+        counter = QueryCounter(engine, *([async_engine.sync_engine] if async_engine else []))
+        state = State(args.seed)
+        queries = asyncio.run(run_profile(app, counter, names, state, args.profile))
+
+        results = {}
+        for mode in modes:
+            if mode == "asgi":
+                make_client = lambda concurrency: asgi_client(app)  # noqa: E731
+                results[mode] = asyncio.run(
+                    run_load(make_client, names, state, args.concurrency, args.duration)
+                )
+                continue
+
+            port = free_port()
+            server = start_server(db_url, args.async_mode, port)
+            try:
+                make_client = lambda concurrency: http_client(f"http://127.0.0.1:{port}", concurrency)  # noqa: E731
+                results[mode] = asyncio.run(
+                    run_load(make_client, names, state, args.concurrency, args.duration)
+                )
+            finally:
+                server.terminate()
+                server.wait()
+
+        for mode_results in results.values():
+            for name, stats in mode_results.items():
+                stats["queries"] = queries[name]
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "seed": args.seed,
+            "db_async": args.async_mode,
+            "bcrypt_rounds": int(os.environ["BCRYPT_ROUNDS"]),
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(json.load(f), report, args.tolerance)
+        for line in found:
+            print("REGRESSION", line, file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Раздача push-уведомлений о заявках N подписчикам.
+
+broker — в одном процессе: события публикуются из потока (как из
+синхронного эндпоинта), подписчики — задачи asyncio; меряется время от
+publish до получения последним подписчиком.
+
+http — uvicorn на временной базе, N потоков GET /orders/events и
+создание заявок через POST /orders; меряется время от отправки POST
+до получения события всеми подписчиками.
+
+    python bench/events_fanout.py
+    python bench/events_fanout.py --mode http --subscribers 500 --events 20
+    python bench/events_fanout.py --mode http --broker sqlite
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.async_vs_sync import MONTH, free_port, start_server  # noqa: E402
+
+# понедельник через неделю после заявок prepare(), до CREATE_FROM
+# (bench/endpoints.py): дни без заявок
+EVENTS_DAY = MONTH + timedelta(days=35)
+
+
+def percentiles(values: list) -> dict:
+    values = sorted(values)
+    return {
+        "p50_ms": values[len(values) // 2] * 1000,
+        "p99_ms": values[int(len(values) * 0.99)] * 1000,
+        "max_ms": values[-1] * 1000,
+    }
+
+
+# =====================================================
+# BROKER
+# =====================================================
+async def run_broker(subscribers: int, events: int, slow: int) -> dict:
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    from app.events import MemoryBroker, order_event
+
+    broker = MemoryBroker()
+    received = {}
+    done = asyncio.Event()
+    published_at = {}
+
+    async def consume(subscription):
+        while True:
+            event = await subscription.queue.get()
+            received.setdefault(event["id"], []).append(time.perf_counter())
+            if event["id"] == events and len(received[events]) == subscribers - slow:
+                done.set()
+
+    tasks, slow_subscriptions = [], []
+    for i in range(subscribers):
+        subscription = broker.subscribe(EVENTS_DAY, EVENTS_DAY + timedelta(days=6))
+        # медленные подписчики не читают очередь: она переполняется,
+        # и брокер их отключает
+        if i < slow:
+            slow_subscriptions.append(subscription)
+        else:
+            tasks.append(asyncio.create_task(consume(subscription)))
+
+    def publisher():
+        for i in range(1, events + 1):
+            published_at[i] = time.perf_counter()
+            broker.publish(order_event(i, EVENTS_DAY, 1, "planned"))
+            time.sleep(0.002)
+
+    thread = threading.Thread(target=publisher)
+    started = time.perf_counter()
+    thread.start()
+    await asyncio.wait_for(done.wait(), 60)
+    elapsed = time.perf_counter() - started
+    thread.join()
+
+    for task in tasks:
+        task.cancel()
+
+    latencies = [max(received[i]) - published_at[i] for i in range(1, events + 1)]
+    return {
+        "mode": "broker",
+        "subscribers": subscribers,
+        "events": events,
+        "deliveries": sum(len(v) for v in received.values()),
+        "deliveries_per_s": sum(len(v) for v in received.values()) / elapsed,
+        "slow_dropped": sum(1 for s in slow_subscriptions if s.dropped),
+        **percentiles(latencies),
+    }
+
+
+# =====================================================
+# HTTP
+# =====================================================
+async def run_http(base: str, subscribers: int, events: int) -> dict:
+    limits = httpx.Limits(max_connections=subscribers + 10)
+    async with httpx.AsyncClient(base_url=base, timeout=60, limits=limits) as client:
+        r = await client.post(
+            "/auth/login", data={"username": "admin1", "password": "admin123"}
+        )
+        token = r.json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        received = {}
+        connected = 0
+        all_connected = asyncio.Event()
+        published = asyncio.Queue()
+
+        async def subscriber():
+            nonlocal connected
+            params = {
+                "date_from": EVENTS_DAY.isoformat(),
+                "date_to": (EVENTS_DAY + timedelta(days=6)).isoformat(),
+                "token": token,
+            }
+            async with client.stream("GET", "/orders/events", params=params) as r:
+                connected += 1
+                if connected == subscribers:
+                    all_connected.set()
+                async for line in r.aiter_lines():
+                    if line.startswith("data: "):
+                        event = json.loads(line[6:])
+                        received.setdefault(event["id"], []).append(time.perf_counter())
+                        if len(received[event["id"]]) == subscribers:
+                            await published.put(event["id"])
+
+        tasks = [asyncio.create_task(subscriber()) for _ in range(subscribers)]
+        await asyncio.wait_for(all_connected.wait(), 60)
+
+        latencies = []
+        started = time.perf_counter()
+        for i in range(events):
+            sent = time.perf_counter()
+            r = await client.post("/orders", headers=headers, json={
+                "phone": f"+7999{i:07d}",
+                "full_name": f"Подписка {i}",
+                "pet": {"name": "Бенч", "species": "dog", "age_group_id": 2, "size": "Средний"},
+                "master_id": i % 4 + 1,
+                "service_id": 1,
+                "date": (EVENTS_DAY + timedelta(days=i // 20 % 7)).isoformat(),
+                "start_time": f"{9 + i % 20 // 4 * 2:02d}:00",
+                "extra_service_ids": [],
+            })
+            if r.status_code != 200:
+                raise RuntimeError(f"POST /orders: {r.status_code} {r.text}")
+            order_id = await asyncio.wait_for(published.get(), 30)
+            latencies.append(max(received[order_id]) - sent)
+        elapsed = time.perf_counter() - started
+
+        for task in tasks:
+            task.cancel()
+
+    return {
+        "mode": "http",
+        "subscribers": subscribers,
+        "events": events,
+        "deliveries": sum(len(v) for v in received.values()),
+        "deliveries_per_s": sum(len(v) for v in received.values()) / elapsed,
+        **percentiles(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", choices=("broker", "http"), default="broker")
+    parser.add_argument("--broker", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--subscribers", type=int, default=500)
+    parser.add_argument("--events", type=int, default=100,
+                        help="событий (в режиме http — не больше 140)")
+    parser.add_argument("--slow", type=int, default=5,
+                        help="медленных подписчиков (только broker)")
+    args = parser.parse_args()
+
+    if args.mode == "broker":
+        print(json.dumps(asyncio.run(run_broker(args.subscribers, args.events, args.slow))))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{tmp}/bench.db"
+        os.environ.setdefault("BCRYPT_ROUNDS", "4")
+        os.environ["EVENTS_BROKER"] = args.broker
+        subprocess.run(
+            [sys.executable, "-c",
+             f"import sys; sys.path.insert(0, {ROOT!r}); "
+             f"from bench.async_vs_sync import prepare; prepare({db_url!r})"],
+            cwd=ROOT, check=True,
+        )
+
+        port = free_port()
+        server = start_server(db_url, False, port)
+        try:
+            result = asyncio.run(run_http(f"http://127.0.0.1:{port}", args.subscribers, args.events))
+            result["broker"] = args.broker
+            print(json.dumps(result))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
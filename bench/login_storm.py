@@ -0,0 +1,112 @@
+"""
+p99 расписания во время волны входов (POST /auth/login).
+
+Построен на bench/endpoints.py: та же база prepare(), те же сценарии
+schedule_week и auth_login и та же функция load(). uvicorn запускается
+на временной базе с настоящей стоимостью bcrypt (--bcrypt-rounds), и
+прогон идёт в две фазы по --duration секунд:
+
+    quiet  — --readers клиентов читают недельное расписание
+    storm  — те же читатели и одновременно --logins клиентов входят
+             в систему без пауз
+
+По каждой фазе печатается p50/p95/p99 расписания, по волне — принятые
+входы и отклонённые с 503. С --max-ratio код выхода 1, если p99
+расписания в волне больше p99 в тишине в max-ratio раз.
+
+    python bench/login_storm.py
+    python bench/login_storm.py --logins 300 --readers 8 --max-ratio 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.async_vs_sync import free_port, prepare, start_server  # noqa: E402
+from bench.endpoints import State, authenticate, http_client, load  # noqa: E402
+
+
+async def phase(base: str, state: State, readers: int, logins: int, duration: float) -> dict:
+    """
+    Читатели расписания и, если logins, параллельная волна входов;
+    у каждой группы свой пул соединений
+    """
+    async with http_client(base, readers) as reader, http_client(base, max(logins, 1)) as storm:
+        await authenticate(reader, state)
+        jobs = [load(reader, "schedule_week", state, readers, duration)]
+        if logins:
+            jobs.append(load(storm, "auth_login", state, logins, duration))
+        results = await asyncio.gather(*jobs)
+
+    result = {"schedule": results[0]}
+    if logins:
+        result["logins"] = results[1]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=200, help="одновременных входов в волне")
+    parser.add_argument("--duration", type=float, default=10, help="секунд на фазу")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-ratio", type=float, help="допустимый рост p99 расписания")
+    parser.add_argument("--output", help="файл JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    # хеши пользователей пишутся в prepare() с этой стоимостью
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    state = State(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{tmp}/bench.db"
+        prepare(db_url)
+
+        port = free_port()
+        server = start_server(db_url, False, port)
+        try:
+            base = f"http://127.0.0.1:{port}"
+            results = {
+                "quiet": asyncio.run(phase(base, state, args.readers, 0, args.duration)),
+                "storm": asyncio.run(
+                    phase(base, state, args.readers, args.logins, args.duration)
+                ),
+            }
+        finally:
+            server.terminate()
+            server.wait()
+
+    quiet_p99 = results["quiet"]["schedule"]["p99_ms"]
+    storm_p99 = results["storm"]["schedule"]["p99_ms"]
+    report = {
+        "meta": {
+            "readers": args.readers,
+            "logins": args.logins,
+            "duration": args.duration,
+            "bcrypt_rounds": args.bcrypt_rounds,
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+        "p99_ratio": round(storm_p99 / quiet_p99, 2) if quiet_p99 else None,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.max_ratio and report["p99_ratio"] and report["p99_ratio"] > args.max_ratio:
+        print(f"REGRESSION p99 расписания: {quiet_p99} -> {storm_p99} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
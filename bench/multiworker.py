@@ -0,0 +1,154 @@
+"""
+Несколько процессов uvicorn на одном файле SQLite: чтение и запись.
+
+uvicorn запускается с --workers процессами на временной базе prepare()
+из bench/async_vs_sync.py. В течение --duration секунд --readers
+клиентов читают недельное расписание, а --writers клиентов
+одновременно создают заявки (сценарии schedule_week и orders_create
+из bench/endpoints.py); запросы распределяются между процессами.
+
+После каждого прогона база проверяется напрямую через sqlite3:
+журнал — WAL, PRAGMA integrity_check — ok, каждая принятая заявка
+записана, пересечений заявок одного мастера нет. Код выхода 1, если
+проверка не прошла или среди ответов есть 5xx / обрывы соединения.
+
+    python bench/multiworker.py
+    python bench/multiworker.py --workers 1,4 --readers 16 --writers 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.async_vs_sync import free_port, prepare, start_server  # noqa: E402
+from bench.endpoints import State, authenticate, http_client, load  # noqa: E402
+
+OVERLAPS = """
+    SELECT COUNT(*) FROM orders a JOIN orders b
+      ON a.id < b.id AND a.master_id = b.master_id AND a.date = b.date
+     AND a.start_time < b.end_time AND b.start_time < a.end_time
+   WHERE a.status != 'canceled' AND b.status != 'canceled'
+"""
+
+
+async def mixed(base: str, state: State, readers: int, writers: int, duration: float) -> dict:
+    """
+    Читатели и писатели одновременно, у каждой группы свой пул соединений
+    """
+    async with http_client(base, readers) as reader, http_client(base, writers) as writer:
+        await authenticate(reader, state)
+        schedule, create = await asyncio.gather(
+            load(reader, "schedule_week", state, readers, duration),
+            load(writer, "orders_create", state, writers, duration),
+        )
+    return {"schedule": schedule, "create": create}
+
+
+def check(db_path: str) -> dict:
+    con = sqlite3.connect(db_path)
+    try:
+        return {
+            "journal_mode": con.execute("PRAGMA journal_mode").fetchone()[0],
+            "integrity": con.execute("PRAGMA integrity_check").fetchone()[0],
+            "orders": con.execute("SELECT COUNT(*) FROM orders").fetchone()[0],
+            "overlaps": con.execute(OVERLAPS).fetchone()[0],
+        }
+    finally:
+        con.close()
+
+
+def problems(result: dict, expected_orders: int) -> list:
+    found = []
+    for name in ("schedule", "create"):
+        for status, n in result[name]["error_statuses"].items():
+            if status == "0" or status.startswith("5"):
+                found.append(f"{name}: {n} ответов {status}")
+    db = result["db"]
+    if db["journal_mode"] != "wal":
+        found.append(f"журнал {db['journal_mode']}, а не wal")
+    if db["integrity"] != "ok":
+        found.append(f"integrity_check: {db['integrity']}")
+    if db["orders"] != expected_orders:
+        found.append(f"заявок в базе {db['orders']}, ожидалось {expected_orders}")
+    if db["overlaps"]:
+        found.append(f"пересечений заявок: {db['overlaps']}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", default="4", help="процессов uvicorn, через запятую")
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10, help="секунд на прогон")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="файл JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+    levels = [int(w) for w in args.workers.split(",")]
+
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    # один State на все прогоны: окна новых заявок не повторяются
+    state = State(args.seed)
+    results, found = {}, []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = f"{tmp}/bench.db"
+        db_url = f"sqlite:///{db_path}"
+        prepare(db_url)
+
+        for workers in levels:
+            orders_before = check(db_path)["orders"]
+            port = free_port()
+            server = start_server(db_url, False, port, workers)
+            try:
+                result = asyncio.run(mixed(
+                    f"http://127.0.0.1:{port}", state, args.readers, args.writers, args.duration,
+                ))
+            finally:
+                server.terminate()
+                server.wait()
+
+            result["db"] = check(db_path)
+            created = result["create"]["requests"] - result["create"]["errors"]
+            found += [f"workers={workers} {p}" for p in problems(result, orders_before + created)]
+            results[str(workers)] = result
+            print(
+                f"workers={workers}: schedule {result['schedule']['rps']} req/s "
+                f"p99 {result['schedule']['p99_ms']} ms, create {result['create']['rps']} req/s "
+                f"p99 {result['create']['p99_ms']} ms",
+                file=sys.stderr,
+            )
+
+    report = {
+        "meta": {
+            "readers": args.readers,
+            "writers": args.writers,
+            "duration": args.duration,
+            "seed": args.seed,
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+        "problems": found,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for line in found:
+        print("FAIL", line, file=sys.stderr)
+    if found:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Аналитические отчёты на NumPy (app/analytics.py) на синтетических заявках.
+
+Во временную базу пишется --orders заявок (по умолчанию 5 млн) с
+питомцами и доп. услугами; триггеры этих таблиц снимаются — сводка,
+поиск клиентов и счётчики бенчмарку не нужны.
+Меряется загрузка снимка колонок, расчёт каждого отчёта по готовому
+снимку, ответ из кэша, обновление снимка после правки --changes заявок
+(триггеры счётчиков к этому времени возвращаются) и, для сравнения,
+тот же средний чек по ORM-объектам на первых --orm-rows заявках.
+
+    python bench/reports_numpy.py
+    python bench/reports_numpy.py --orders 1000000 --orm-rows 100000 --changes 10000
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_DAY = date(2022, 1, 1)
+DAYS = 4 * 365
+PETS = 200_000
+BATCH = 100_000
+
+
+def generate(engine, orders: int, seed: int = 1):
+    """
+    Клиенты, питомцы, заявки и доп. услуги прямыми INSERT пачками
+    """
+    from sqlalchemy import text
+
+    from app.models import OrderStatus, PetSize
+
+    rng = np.random.default_rng(seed)
+    sizes = [s.name for s in PetSize]
+    statuses = [s.name for s in OrderStatus]
+
+    with engine.begin() as conn:
+        triggers = conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+            " AND tbl_name IN ('clients', 'pets', 'orders', 'order_extra_services')"
+        )).scalars().all()
+        for name in triggers:
+            conn.exec_driver_sql(f"DROP TRIGGER {name}")
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.executemany(
+            "INSERT INTO clients (id, full_name, phone) VALUES (?, ?, ?)",
+            ((i, f"Клиент {i}", f"+7900{i:07d}") for i in range(1, PETS + 1)),
+        )
+        cur.executemany(
+            "INSERT INTO pets (id, name, species, age_group_id, size, client_id)"
+            " VALUES (?, ?, 'dog', ?, ?, ?)",
+            (
+                (i, f"Питомец {i}", int(a), sizes[s], i)
+                for i, a, s in zip(
+                    range(1, PETS + 1),
+                    rng.integers(1, 4, PETS),
+                    rng.integers(0, len(sizes), PETS),
+                )
+            ),
+        )
+
+        extras = [r[0] for r in cur.execute("SELECT id FROM extra_services")]
+        for start in range(0, orders, BATCH):
+            n = min(BATCH, orders - start)
+            ids = np.arange(start + 1, start + n + 1)
+            pet = rng.integers(1, PETS + 1, n)
+            day = rng.integers(0, DAYS, n)
+            hour = rng.integers(9, 20, n)
+            # отмен больше в понедельник утром
+            cancel_p = 0.05 + 0.10 * ((day + FIRST_DAY.weekday()) % 7 == 0) * (hour < 12)
+            status = np.where(rng.random(n) < cancel_p, 2, rng.integers(0, 2, n))
+            price = rng.integers(10, 80, n) * 100
+            dates = [
+                date.fromordinal(FIRST_DAY.toordinal() + int(d)).isoformat() for d in day
+            ]
+            cur.executemany(
+                "INSERT INTO orders (id, client_id, pet_id, master_id, service_id,"
+                " price, date, start_time, end_time, status, version)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (
+                    (int(i), int(p), int(p), int(i % 4 + 1), int(i % 3 + 1), int(c), d,
+                     f"{h:02d}:00:00.000000", f"{h:02d}:50:00.000000", statuses[s])
+                    for i, p, c, d, h, s in zip(ids, pet, price, dates, hour, status)
+                ),
+            )
+            with_extra = ids[rng.random(n) < 0.3]
+            cur.executemany(
+                "INSERT INTO order_extra_services (order_id, extra_service_id) VALUES (?, ?)",
+                (
+                    (int(i), extras[int(e)])
+                    for i, e in zip(with_extra, rng.integers(0, len(extras), len(with_extra)))
+                ),
+            )
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def orm_average_ticket(db, limit: int):
+    """
+    Тот же средний чек по ORM-объектам: заявка и её питомец на строку
+    """
+    from sqlalchemy.orm import joinedload
+
+    from app.models import Order, OrderStatus
+
+    groups = {}
+    q = db.query(Order).options(joinedload(Order.pet)).order_by(Order.id).limit(limit)
+    for order in q.yield_per(10_000):
+        if order.status == OrderStatus.canceled:
+            continue
+        cell = groups.setdefault((order.pet.size, order.pet.age_group_id), [0, 0])
+        cell[0] += 1
+        cell[1] += order.price
+    return groups
+
+
+def run(orders: int, orm_rows: int, changes: int) -> dict:
+    from sqlalchemy import text
+
+    from app.analytics import AnalyticsCache, OrderColumns, data_counters
+    from app.catalog import reference_cache
+    from app.changes import CHANGES_DDL
+    from app.database import Base, SessionLocal, engine
+    from app.init_data import init_all
+    from app.migrations import run_migrations
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    init_all()
+
+    _, generate_s = timed(generate, engine, orders)
+    catalog = reference_cache.get()
+    result = {"orders": orders, "generate_s": round(generate_s, 1)}
+
+    with SessionLocal() as db:
+        columns, load_s = timed(OrderColumns, db, data_counters(db))
+        result["load_s"] = round(load_s, 2)
+        result["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+        result["columns_mb"] = round(
+            sum(v.nbytes for v in vars(columns).values() if isinstance(v, np.ndarray)) / 2 ** 20
+        )
+
+        cache = AnalyticsCache()
+        cache._columns = columns
+        periods = {
+            "all": {},
+            "month": {"date_from": date(2024, 3, 1), "date_to": date(2024, 3, 31)},
+        }
+        for name in ("average_ticket", "extras_attach", "cancellations"):
+            for period, params in periods.items():
+                _, seconds = timed(cache.report, name, catalog, db, master_id=None, **params)
+                result[f"{name}_{period}_ms"] = round(seconds * 1000, 1)
+        _, seconds = timed(cache.report, "average_ticket", catalog, db, master_id=None)
+        result["cached_ms"] = round(seconds * 1000, 2)
+
+        with engine.begin() as conn:
+            for ddl in CHANGES_DDL:
+                conn.exec_driver_sql(ddl)
+        db.execute(
+            text(
+                "UPDATE orders SET status = 'canceled' WHERE id IN"
+                " (SELECT id FROM orders ORDER BY random() LIMIT :n)"
+            ),
+            {"n": changes},
+        )
+        db.commit()
+        _, seconds = timed(cache.columns, db, data_counters(db))
+        result["changes"] = changes
+        result["update_ms"] = round(seconds * 1000, 1)
+
+        _, seconds = timed(orm_average_ticket, db, orm_rows)
+        result["orm_rows"] = min(orm_rows, orders)
+        result["orm_ms"] = round(seconds * 1000)
+        result["orm_full_estimate_s"] = round(seconds * orders / result["orm_rows"], 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=5_000_000)
+    parser.add_argument("--orm-rows", type=int, default=200_000)
+    parser.add_argument("--changes", type=int, default=1000, help="правок перед обновлением снимка")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+        os.environ.setdefault("BCRYPT_ROUNDS", "4")
+        sys.path.insert(0, ROOT)
+        print(json.dumps(run(args.orders, args.orm_rows, args.changes)))
+
+
+if __name__ == "__main__":
+    main()
@@ -70,9 +70,16 @@ function capitalizeInput(el) {
 
 
 /* ===================== STATE ===================== */
+let currentUser = null;
 let currentView = "week";
 let currentDate = new Date();
 let orders = [];
+// период на экране и номер изменения, до которого он актуален
+let scheduleSync = null;
+// "дата время" -> ячейка сетки
+const cells = new Map();
+let eventSource = null;
+let eventsTimer = null;
 let masters = [];
 let services = [];
 let breeds = [];
@@ -80,6 +87,10 @@ let ageGroups = [];
 let tariffs = [];
 
 /* ===================== CONSTANTS ===================== */
+// опрос — только если push-канал не подключён
+const SYNC_INTERVAL = 15000;
+const EVENTS_DEBOUNCE = 200;
+
 const roleMap = {
     admin: "Администратор",
     manager: "Руководитель",
@@ -152,18 +163,37 @@ function calculatePrice() {
 
 
 /* ===================== API ===================== */
+// url -> { etag, data }: повторный запрос с If-None-Match,
+// на 304 сервер не строит JSON, а мы берём сохранённые данные
+const responseCache = new Map();
+
 function apiGet(url) {
+    return apiFetch(url).then(r => r.data);
+}
+
+function apiFetch(url) {
+    const cached = responseCache.get(url);
+    const headers = { Authorization: `Bearer ${token}` };
+    if (cached) headers["If-None-Match"] = cached.etag;
+
     return fetch(`${API_BASE}${url}`, {
-        headers: { Authorization: `Bearer ${token}` }
+        headers,
+        cache: "no-store"
     }).then(r => {
+        if (r.status === 304 && cached) return { data: cached.data, headers: r.headers };
         if (!r.ok) throw new Error(r.status);
-        return r.json();
+
+        return r.json().then(data => {
+            const etag = r.headers.get("ETag");
+            if (etag) responseCache.set(url, { etag, data });
+            return { data, headers: r.headers };
+        });
     });
 }
 
 /* ===================== USER ===================== */
 function loadUser() {
-    apiGet("/auth/me").then(data => {
+    return apiGet("/auth/me").then(data => {
         currentUser = data;
 
         userNameEl.innerText = data.full_name;
@@ -172,8 +202,6 @@ function loadUser() {
             data.role === "admin" ? "Администратор" :
             data.role === "manager" ? "Руководитель" :
             "Мастер";
-
-        applyRoleRules();
     });
 }
 
@@ -192,18 +220,16 @@ function applyRoleRules() {
         // 🔒 фиксируем мастера (он = текущий пользователь)
         masterSelect.disabled = true;
 
-        // автоматически фильтруем расписание
-        apiGet("/masters").then(data => {
-            const myMaster = data.find(m =>
-                m.name.toLowerCase().includes(currentUser.login.toLowerCase())
-            );
+        // автоматически фильтруем расписание (мастера уже загружены)
+        const myMaster = masters.find(m =>
+            m.name.toLowerCase().includes(currentUser.login.toLowerCase())
+        );
 
-            if (myMaster) {
-                masterFilter.value = myMaster.id;
-            }
+        if (myMaster) {
+            masterFilter.value = myMaster.id;
+        }
 
-            loadOrders();
-        });
+        loadOrders();
     }
 
     // ADMIN / MANAGER
@@ -251,7 +277,7 @@ function closeModalFn() {
 
 /* ===================== LOAD DATA ===================== */
 function loadMasters() {
-    apiGet("/masters").then(data => {
+    return apiGet("/masters").then(data => {
         masters = data;
 
         masterFilter.innerHTML = `<option value="">Все мастера</option>`;
@@ -363,7 +389,7 @@ function loadAgeGroups() {
 }
 
 /* ===================== ORDERS ===================== */
-function loadOrders() {
+function currentRange() {
     const from = currentView === "week"
         ? toISODate(startOfWeek(currentDate))
         : toISODate(currentDate);
@@ -372,13 +398,97 @@ function loadOrders() {
         ? toISODate(new Date(startOfWeek(currentDate).getTime() + 6 * 86400000))
         : toISODate(currentDate);
 
-    apiGet(`/orders/schedule?date_from=${from}&date_to=${to}`)
-        .then(data => {
+    return { from, to };
+}
+
+function loadOrders() {
+    const { from, to } = currentRange();
+
+    apiFetch(`/orders/schedule?date_from=${from}&date_to=${to}`)
+        .then(({ data, headers }) => {
             orders = Array.isArray(data) ? data : [];
+            scheduleSync = {
+                from,
+                to,
+                seq: headers.get("X-Schedule-Seq"),
+                refs: headers.get("X-Schedule-Refs")
+            };
             render();
+            subscribeEvents(from, to);
         });
 }
 
+// push-уведомления об изменениях периода: по событию — syncOrders,
+// пачка событий подряд даёт один запрос
+function subscribeEvents(from, to) {
+    if (eventSource && eventSource.range === `${from} ${to}`) return;
+    if (eventSource) eventSource.close();
+
+    eventSource = new EventSource(
+        `${API_BASE}/orders/events?date_from=${from}&date_to=${to}` +
+        `&token=${encodeURIComponent(token)}`
+    );
+    eventSource.range = `${from} ${to}`;
+
+    // после переподключения догоняем пропущенное
+    eventSource.onopen = () => syncOrders();
+    eventSource.addEventListener("order", () => {
+        clearTimeout(eventsTimer);
+        eventsTimer = setTimeout(syncOrders, EVENTS_DEBOUNCE);
+    });
+}
+
+// только изменения с последней синхронизации; перерисовываются
+// ячейки затронутых заявок, а не вся сетка
+function syncOrders() {
+    const { from, to } = currentRange();
+    const sync = scheduleSync;
+
+    if (!sync || sync.seq === null || sync.from !== from || sync.to !== to) {
+        loadOrders();
+        return;
+    }
+
+    apiGet(
+        `/orders/schedule/changes?since=${sync.seq}&refs=${sync.refs}` +
+        `&date_from=${from}&date_to=${to}`
+    ).then(changes => {
+        // пока шёл запрос, пользователь перешёл на другой период
+        if (scheduleSync !== sync) return;
+
+        if (changes.reload) {
+            loadOrders();
+            return;
+        }
+
+        const changed = new Set(changes.deleted);
+        changes.orders.forEach(o => changed.add(o.id));
+
+        const slots = new Set();
+        orders = orders.filter(o => {
+            if (!changed.has(o.id)) return true;
+            slots.add(`${o.date} ${o.start_time}`);
+            return false;
+        });
+        changes.orders.forEach(o => {
+            orders.push(o);
+            slots.add(`${o.date} ${o.start_time}`);
+        });
+
+        sync.seq = changes.seq;
+        slots.forEach(renderSlot);
+    });
+}
+
+function renderSlot(slot) {
+    const cell = cells.get(slot);
+    if (!cell) return;
+
+    const [dateISO, time] = slot.split(" ");
+    cell.innerHTML = "";
+    renderOrders(cell, dateISO, time);
+}
+
 /* ===================== RENDER ===================== */
 function renderPeriodLabel() {
     periodLabel.innerText =
@@ -439,6 +549,7 @@ function renderWeek() {
         };
 
         renderOrders(cell, dateISO, time);
+        cells.set(`${dateISO} ${time}`, cell);
         grid.appendChild(cell);
     }
 
@@ -478,6 +589,7 @@ function renderWeek() {
 
 
         renderOrders(cell, toISODate(currentDate), time);
+        cells.set(`${toISODate(currentDate)} ${time}`, cell);
         grid.appendChild(cell);
     });
 
@@ -486,6 +598,7 @@ function renderWeek() {
 
     function render() {
         scheduleEl.innerHTML = "";
+        cells.clear();
         renderPeriodLabel();
         currentView === "week" ? renderWeek() : renderDay();
     }
@@ -567,7 +680,7 @@ saveOrderBtn.onclick = () => {
         .then(res => {
             if (!res.ok) throw new Error();
             closeModalFn();
-            loadOrders();
+            syncOrders();
         })
         .catch(() => {
             errorEl.innerText = "Ошибка создания заявки";
@@ -607,8 +720,8 @@ function validateForm() {
 
 
 weekBtn.classList.add("active");
-loadUser();
-loadMasters();
+// мастера нужны после пользователя: список зависит от роли
+loadUser().then(loadMasters).then(applyRoleRules);
 loadServices();
 loadBreeds();
 loadAgeGroups();
@@ -622,3 +735,8 @@ sizeSelect.onchange = calculatePrice;
 ageGroupSelect.onchange = calculatePrice;
 masterFilter.onchange = loadOrders;
 
+setInterval(() => {
+    const pushed = eventSource && eventSource.readyState === EventSource.OPEN;
+    if (!document.hidden && !pushed) syncOrders();
+}, SYNC_INTERVAL);
+
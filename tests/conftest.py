@@ -0,0 +1,44 @@
+"""
+Общие фикстуры: приложение на временной базе SQLite.
+
+DATABASE_URL задаётся до импорта app — engine создаётся при импорте
+app.database. Запуск из корня репозитория (нужен каталог static):
+
+    python -m pytest -q
+"""
+import os
+import tempfile
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp.name}/test.db"
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
+    r = client.post("/auth/login", data={"username": "admin1", "password": "admin123"})
+    assert r.status_code == 200, r.text
+    return {"Authorization": "Bearer " + r.json()["access_token"]}
+
+
+@pytest.fixture
+def db(client):
+    # схему создаёт запуск приложения
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
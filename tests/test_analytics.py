@@ -0,0 +1,75 @@
+"""
+Снимок колонок аналитики: обновление по изменениям совпадает с
+полной загрузкой
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import text
+
+from app.analytics import AnalyticsCache, OrderColumns, data_counters
+
+DAY = date.today() + timedelta(days=7 * 24)
+
+COLUMNS = (
+    "id", "pet_id", "master_id", "day", "hour", "status", "price",
+    "weekday", "size", "age_group_id", "extra_order", "extra_id",
+)
+
+
+def book(client, headers, phone: str, start: str, extras: list) -> dict:
+    r = client.post("/orders", headers=headers, json={
+        "phone": phone,
+        "full_name": f"Клиент {phone}",
+        "pet": {"name": "Шарик", "species": "dog", "age_group_id": 2, "size": "Средний"},
+        "master_id": 2,
+        "service_id": 1,
+        "date": DAY.isoformat(),
+        "start_time": start,
+        "extra_service_ids": extras,
+    })
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def assert_same(columns: OrderColumns, db):
+    fresh = OrderColumns(db, data_counters(db))
+    assert columns.version == fresh.version
+    for name in COLUMNS:
+        assert np.array_equal(getattr(columns, name), getattr(fresh, name)), name
+
+
+def test_snapshot_follows_changes(client, auth_headers, db):
+    kept = book(client, auth_headers, "+79180000001", "09:00", [1])
+    deleted = book(client, auth_headers, "+79180000002", "12:00", [])
+    cache = AnalyticsCache()
+    columns = cache.columns(db, data_counters(db))
+
+    book(client, auth_headers, "+79180000003", "15:00", [1, 2])
+    db.execute(text("DELETE FROM orders WHERE id = :id"), {"id": deleted["id"]})
+    db.execute(text("UPDATE orders SET status = 'canceled' WHERE id = :id"), {"id": kept["id"]})
+    db.commit()
+
+    updated = cache.columns(db, data_counters(db))
+    assert updated is not columns
+    assert deleted["id"] in columns.id and deleted["id"] not in updated.id
+    assert_same(updated, db)
+
+
+def test_extras_and_pets_without_order_write(client, auth_headers, db):
+    order = book(client, auth_headers, "+79180000011", "18:00", [])
+    cache = AnalyticsCache()
+    cache.columns(db, data_counters(db))
+
+    # строка заявки не меняется
+    db.execute(
+        text("INSERT INTO order_extra_services (order_id, extra_service_id) VALUES (:id, 2)"),
+        {"id": order["id"]},
+    )
+    db.execute(
+        text("UPDATE pets SET size = 'large' WHERE id = (SELECT pet_id FROM orders WHERE id = :id)"),
+        {"id": order["id"]},
+    )
+    db.commit()
+
+    assert_same(cache.columns(db, data_counters(db)), db)
@@ -0,0 +1,31 @@
+"""
+Кэш токенов: отключение пользователя мимо сессии приложения
+"""
+from sqlalchemy import text
+
+from app.auth import principal_cache
+
+
+def login(client, username: str, password: str) -> dict:
+    r = client.post("/auth/login", data={"username": username, "password": password})
+    assert r.status_code == 200, r.text
+    return {"Authorization": "Bearer " + r.json()["access_token"]}
+
+
+def set_active(db, login: str, active: bool):
+    db.execute(text("UPDATE users SET active = :active WHERE login = :login"),
+               {"active": active, "login": login})
+    db.commit()
+
+
+def test_deactivated_by_raw_sql(client, db, monkeypatch):
+    headers = login(client, "master4", "master123")
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+    # как правка из другого процесса: сессия приложения её не видит
+    set_active(db, "master4", False)
+    try:
+        monkeypatch.setattr(principal_cache, "check_interval", 0)
+        assert client.get("/auth/me", headers=headers).status_code == 403
+    finally:
+        set_active(db, "master4", True)
@@ -0,0 +1,58 @@
+"""
+Подсказки поиска клиентов: полное ранжирование узкого запроса и
+порядок индекса для слишком общего
+"""
+from sqlalchemy import insert
+
+from app.models import Client, Pet
+from app.search import RANK_WINDOW, search_client_ids
+
+
+def add_clients(db, rows: list) -> list:
+    """
+    Клиенты (ФИО, телефон, кличка питомца) в порядке rows; их id
+    """
+    first = db.query(Client).count() + 1
+    db.execute(insert(Client), [
+        {"id": first + n, "full_name": name, "phone": phone}
+        for n, (name, phone, _) in enumerate(rows)
+    ])
+    pets = [
+        {"name": pet, "species": "dog", "age_group_id": 2, "size": "medium", "client_id": first + n}
+        for n, (_, _, pet) in enumerate(rows) if pet
+    ]
+    if pets:
+        db.execute(insert(Pet), pets)
+    db.commit()
+    return list(range(first, first + len(rows)))
+
+
+def test_whole_word_in_name_ranks_first(db):
+    older, newer, by_pet = add_clients(db, [
+        ("Зябликова Ксения", "+79160000001", None),
+        ("Зябликоваль Ксения", "+79160000002", None),
+        ("Орлова Ксения", "+79160000003", "Зябликова"),
+    ])
+
+    # имя целиком важнее префикса, ФИО — клички; новее — не важнее
+    assert search_client_ids(db, "зябликова", 10) == [older, newer, by_pet]
+
+
+def test_every_word_is_a_prefix_in_any_order(db):
+    target, = add_clients(db, [("Щеглова Виолетта", "+79160000011", "Пух")])
+
+    assert search_client_ids(db, "виол щегл", 10) == [target]
+    assert search_client_ids(db, "пух щегл", 10) == [target]
+    assert search_client_ids(db, "8 916 000-00-11", 10) == [target]
+
+
+def test_common_prefix_returns_newest_first(db):
+    ids = add_clients(db, [
+        (f"Юрковский Клиент {n}", f"+7917{n:07d}", None) for n in range(RANK_WINDOW + 5)
+    ])
+
+    assert search_client_ids(db, "юрк", 5) == ids[::-1][:5]
+
+
+def test_too_short_query(db):
+    assert search_client_ids(db, "щ", 10) == []
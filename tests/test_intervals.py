@@ -0,0 +1,89 @@
+"""
+Индекс занятости: DayIntervals и проверка пересечений при записи
+"""
+from datetime import date, time, timedelta
+
+from sqlalchemy import insert
+
+from app.intervals import DayIntervals
+from app.models import Client, Order, OrderStatus, Pet
+
+DAY = date.today() + timedelta(days=7 * 20)
+
+
+def day_of(*intervals) -> DayIntervals:
+    day = DayIntervals()
+    for start, end, order_id in intervals:
+        day.add(start, end, order_id)
+    return day
+
+
+def test_free_and_touching_intervals():
+    day = day_of((540, 600, 1), (660, 720, 2))
+
+    assert day.find_conflict(600, 660) is None
+    assert day.find_conflict(480, 540) is None
+    assert day.find_conflict(720, 780) is None
+    assert day.find_conflict(590, 610) == 1
+    assert day.find_conflict(700, 800) == 2
+
+
+def test_conflict_with_long_earlier_interval():
+    # 09:00–12:00 и вложенный 10:00–10:30: 11:00 перекрыт первым
+    day = day_of((540, 720, 1), (600, 630, 2))
+
+    assert day.find_conflict(660, 780) == 1
+    assert day.find_conflict(610, 620) in (1, 2)
+    assert day.find_conflict(720, 780) is None
+
+
+def test_exclude_and_remove():
+    day = day_of((540, 720, 1), (600, 630, 2))
+
+    assert day.find_conflict(660, 780, exclude_id=2) == 1
+    assert day.find_conflict(660, 780, exclude_id=1) is None
+
+    day.remove(1)
+    assert day.find_conflict(660, 780) is None
+    assert day.find_conflict(615, 700) == 2
+
+
+def test_zero_id_is_a_conflict():
+    # bulk хранит в DayIntervals номер заявки в пакете, начиная с 0
+    day = day_of((660, 780, 0))
+
+    assert day.find_conflict(690, 810) == 0
+
+
+def test_booking_over_legacy_overlapping_orders(client, auth_headers, db):
+    db.execute(insert(Client), [
+        {"full_name": "Старый клиент", "phone": "+79120000001", "phone_key": "79120000001"}
+    ])
+    client_id = db.query(Client.id).filter(Client.phone_key == "79120000001").scalar()
+    db.execute(insert(Pet), [
+        {"name": "Старый", "species": "dog", "age_group_id": 2, "size": "medium",
+         "client_id": client_id}
+    ])
+    pet_id = db.query(Pet.id).filter(Pet.client_id == client_id).scalar()
+    # записаны до проверки под блокировкой и пересекаются между собой
+    db.execute(insert(Order), [
+        {"client_id": client_id, "pet_id": pet_id, "master_id": 1, "service_id": 1,
+         "price": 2000, "date": DAY, "start_time": start, "end_time": end,
+         "status": OrderStatus.planned}
+        for start, end in ((time(9), time(12)), (time(10), time(10, 30)))
+    ])
+    db.commit()
+
+    r = client.post("/orders", headers=auth_headers, json={
+        "phone": "+79120000002",
+        "full_name": "Новый клиент",
+        "pet": {"name": "Новый", "species": "dog", "age_group_id": 2, "size": "Средний"},
+        "master_id": 1,
+        "service_id": 1,
+        "date": DAY.isoformat(),
+        "start_time": "11:00",
+        "extra_service_ids": [],
+    })
+
+    assert r.status_code == 400, r.text
+    assert r.json()["detail"] == "Время занято"
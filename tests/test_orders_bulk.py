@@ -0,0 +1,78 @@
+"""
+POST /orders/bulk: пересечения внутри пакета и с базой, режимы пакета
+"""
+from datetime import date, timedelta
+
+from app.models import Order
+
+DAY = date.today() + timedelta(days=7 * 21)
+
+
+def item(day: date, start: str, master_id: int = 1, phone: str = "+79130000001", **pet) -> dict:
+    return {
+        "phone": phone,
+        "full_name": f"Клиент {phone}",
+        "pet": {"name": "Бим", "species": "dog", "age_group_id": 2, "size": "Средний", **pet},
+        "master_id": master_id,
+        "service_id": 1,
+        "date": day.isoformat(),
+        "start_time": start,
+        "extra_service_ids": [],
+    }
+
+
+def bulk(client, headers, items: list, mode: str):
+    return client.post("/orders/bulk", headers=headers, json={"orders": items, "mode": mode})
+
+
+def test_overlap_with_first_item_is_rejected(client, auth_headers, db):
+    # услуга 1 для среднего размера — 2 часа
+    r = bulk(client, auth_headers, [
+        item(DAY, "11:00"),
+        item(DAY, "11:30", phone="+79130000002"),
+        item(DAY, "14:00", phone="+79130000003"),
+    ], "best_effort")
+
+    assert r.status_code == 200, r.text
+    result = r.json()
+    assert [i["ok"] for i in result["items"]] == [True, False, True]
+    assert result["items"][1]["error"] == "Время занято в этом же пакете"
+    assert db.query(Order).filter(Order.date == DAY, Order.master_id == 1).count() == 2
+
+
+def test_all_or_nothing_rejects_whole_batch(client, auth_headers, db):
+    day = DAY + timedelta(days=1)
+    r = bulk(client, auth_headers, [
+        item(day, "11:00", phone="+79130000011"),
+        item(day, "12:00", phone="+79130000012"),
+    ], "all_or_nothing")
+
+    assert r.status_code == 400, r.text
+    result = r.json()
+    assert result["created"] == 0
+    assert [i["status_code"] for i in result["items"]] == [424, 400]
+    assert db.query(Order).filter(Order.date == day).count() == 0
+
+
+def test_conflict_with_existing_order(client, auth_headers):
+    day = DAY + timedelta(days=2)
+    assert bulk(client, auth_headers, [item(day, "10:00", master_id=2)], "best_effort").json()["created"] == 1
+
+    result = bulk(client, auth_headers, [
+        item(day, "11:00", master_id=2, phone="+79130000021"),
+        item(day, "11:00", master_id=3, phone="+79130000022"),
+    ], "best_effort").json()
+
+    assert [i["ok"] for i in result["items"]] == [False, True]
+    assert result["items"][0]["error"] == "Время занято"
+
+
+def test_new_pet_error_applies_to_every_item(client, auth_headers):
+    day = DAY + timedelta(days=3)
+    result = bulk(client, auth_headers, [
+        item(day, "10:00", phone="+79130000031", age_group_id=999),
+        item(day, "14:00", phone="+79130000031", age_group_id=999),
+    ], "best_effort").json()
+
+    assert result["created"] == 0
+    assert [i["status_code"] for i in result["items"]] == [400, 400]
@@ -0,0 +1,110 @@
+"""
+GET /orders/schedule/changes: новые, перенесённые и удалённые заявки,
+reload при смене имён и после чистки надгробий
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from app.changes import prune_tombstones
+
+DAY = date.today() + timedelta(days=7 * 22)
+
+
+def booking(phone: str, start: str, day: date = DAY) -> dict:
+    return {
+        "phone": phone,
+        "full_name": f"Клиент {phone}",
+        "pet": {"name": "Тузик", "species": "dog", "age_group_id": 2, "size": "Средний"},
+        "master_id": 1,
+        "service_id": 1,
+        "date": day.isoformat(),
+        "start_time": start,
+        "extra_service_ids": [],
+    }
+
+
+def changes(client, headers, since: int, refs: int) -> dict:
+    r = client.get("/orders/schedule/changes", headers=headers, params={
+        "since": since, "refs": refs,
+        "date_from": DAY.isoformat(), "date_to": DAY.isoformat(),
+    })
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def book(client, headers, phone: str, start: str, day: date = DAY) -> dict:
+    r = client.post("/orders", headers=headers, json=booking(phone, start, day))
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def current(client, headers) -> tuple:
+    state = changes(client, headers, 0, 0)
+    return state["seq"], state["refs"]
+
+
+def test_new_client_booking_is_incremental(client, auth_headers):
+    seq, refs = current(client, auth_headers)
+
+    order = book(client, auth_headers, "+79140000001", "09:00")
+    result = changes(client, auth_headers, seq, refs)
+
+    # новый клиент и питомец не меняют refs
+    assert not result["reload"]
+    assert result["refs"] == refs
+    assert [o["id"] for o in result["orders"]] == [order["id"]]
+    assert result["deleted"] == []
+
+
+def test_moved_and_deleted_orders(client, auth_headers, db):
+    moved = book(client, auth_headers, "+79140000002", "11:00")
+    deleted = book(client, auth_headers, "+79140000003", "13:00")
+    seq, refs = current(client, auth_headers)
+
+    r = client.put(f"/orders/{moved['id']}", headers=auth_headers, json={
+        "date": (DAY + timedelta(days=1)).isoformat(), "start_time": "11:00",
+        "master_id": 1, "service_id": 1, "extra_service_ids": [],
+    })
+    assert r.status_code == 200, r.text
+    db.execute(text("DELETE FROM orders WHERE id = :id"), {"id": deleted["id"]})
+    db.commit()
+
+    result = changes(client, auth_headers, seq, refs)
+    assert not result["reload"]
+    assert sorted(result["deleted"]) == sorted([moved["id"], deleted["id"]])
+
+
+def test_client_rename_forces_reload(client, auth_headers, db):
+    book(client, auth_headers, "+79140000004", "15:00")
+    seq, refs = current(client, auth_headers)
+
+    db.execute(
+        text("UPDATE clients SET full_name = 'Переименован' WHERE phone_key = '79140000004'")
+    )
+    db.commit()
+
+    result = changes(client, auth_headers, seq, refs)
+    assert result["reload"]
+    assert result["refs"] != refs
+
+
+def test_cursor_older_than_tombstones_forces_reload(client, auth_headers, db):
+    order = book(client, auth_headers, "+79140000005", "17:00")
+    seq, refs = current(client, auth_headers)
+    db.execute(text("DELETE FROM orders WHERE id = :id"), {"id": order["id"]})
+    db.commit()
+
+    assert changes(client, auth_headers, seq, refs)["deleted"] == [order["id"]]
+
+    prune_tombstones(db, keep=0)
+    new_seq = changes(client, auth_headers, 0, refs)["seq"]
+
+    assert changes(client, auth_headers, seq, refs)["reload"]
+    assert not changes(client, auth_headers, new_seq, refs)["reload"]
+
+
+def test_cursor_from_another_database(client, auth_headers):
+    seq, refs = current(client, auth_headers)
+
+    assert changes(client, auth_headers, seq + 1000, refs)["reload"]
@@ -0,0 +1,62 @@
+"""
+ETag расписания: меняется от заявок периода и имён, но не от записи
+нового клиента на другой период
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+DAY = date.today() + timedelta(days=7 * 23)
+OTHER_DAY = DAY + timedelta(days=14)
+
+
+def schedule(client, headers, etag: str = None):
+    if etag:
+        headers = {**headers, "If-None-Match": etag}
+    return client.get("/orders/schedule", headers=headers, params={
+        "date_from": DAY.isoformat(), "date_to": (DAY + timedelta(days=6)).isoformat(),
+    })
+
+
+def book(client, headers, phone: str, day: date):
+    r = client.post("/orders", headers=headers, json={
+        "phone": phone,
+        "full_name": f"Клиент {phone}",
+        "pet": {"name": "Граф", "species": "dog", "age_group_id": 2, "size": "Средний"},
+        "master_id": 2,
+        "service_id": 1,
+        "date": day.isoformat(),
+        "start_time": "10:00",
+        "extra_service_ids": [],
+    })
+    assert r.status_code == 200, r.text
+
+
+def test_new_client_elsewhere_keeps_etag(client, auth_headers):
+    etag = schedule(client, auth_headers).headers["ETag"]
+
+    book(client, auth_headers, "+79150000001", OTHER_DAY)
+
+    assert schedule(client, auth_headers, etag).status_code == 304
+
+
+def test_order_in_period_changes_etag(client, auth_headers):
+    etag = schedule(client, auth_headers).headers["ETag"]
+
+    book(client, auth_headers, "+79150000002", DAY)
+
+    r = schedule(client, auth_headers, etag)
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+
+
+def test_client_rename_changes_etag(client, auth_headers, db):
+    book(client, auth_headers, "+79150000003", DAY + timedelta(days=1))
+    etag = schedule(client, auth_headers).headers["ETag"]
+
+    db.execute(text("UPDATE clients SET full_name = 'Новое имя' WHERE phone_key = '79150000003'"))
+    db.commit()
+
+    r = schedule(client, auth_headers, etag)
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
@@ -0,0 +1,78 @@
+"""
+GET /orders/schedule: число SQL-запросов не зависит от числа заявок
+"""
+from contextlib import contextmanager
+from datetime import date, time, timedelta
+
+from sqlalchemy import event, insert
+
+from app.database import engine
+from app.models import Client, Order, OrderStatus, Pet
+
+# недели в будущем: materialize_series и проверки времени их не трогают
+SMALL_WEEK = date.today() + timedelta(days=7 * 10)
+LARGE_WEEK = date.today() + timedelta(days=7 * 12)
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+
+
+def add_orders(db, week: date, count: int):
+    """
+    count заявок разных клиентов и питомцев, по 4 мастерам на 7 дней
+    """
+    first = db.query(Client).count() + 1
+    db.execute(insert(Client), [
+        {"full_name": f"Клиент {first + i}", "phone": f"+7911{first + i:07d}",
+         "phone_key": f"7911{first + i:07d}"}
+        for i in range(count)
+    ])
+    clients = [c.id for c in db.query(Client.id).filter(Client.id >= first).order_by(Client.id)]
+    db.execute(insert(Pet), [
+        {"name": f"Питомец {c}", "species": "dog", "age_group_id": 2,
+         "size": "medium", "client_id": c}
+        for c in clients
+    ])
+    pets = [p.id for p in db.query(Pet.id).filter(Pet.client_id.in_(clients)).order_by(Pet.id)]
+    db.execute(insert(Order), [
+        {"client_id": c, "pet_id": p, "master_id": i % 4 + 1, "service_id": 1 + i % 3,
+         "price": 2000, "date": week + timedelta(days=i % 7),
+         "start_time": time(9 + i // 28 % 10), "end_time": time(9 + i // 28 % 10, 50),
+         "status": OrderStatus.planned}
+        for i, (c, p) in enumerate(zip(clients, pets))
+    ])
+    db.commit()
+
+
+def schedule_queries(client, headers, week: date) -> tuple:
+    params = {"date_from": week.isoformat(), "date_to": (week + timedelta(days=6)).isoformat()}
+    # первый запрос прогревает кэши справочников и токена
+    client.get("/orders/schedule", params=params, headers=headers)
+
+    with count_queries() as statements:
+        r = client.get("/orders/schedule", params=params, headers=headers)
+    assert r.status_code == 200, r.text
+    return len(r.json()), statements
+
+
+def test_schedule_query_count_is_constant(client, auth_headers, db):
+    add_orders(db, SMALL_WEEK, 10)
+    add_orders(db, LARGE_WEEK, 2000)
+
+    small_rows, small = schedule_queries(client, auth_headers, SMALL_WEEK)
+    large_rows, large = schedule_queries(client, auth_headers, LARGE_WEEK)
+
+    assert (small_rows, large_rows) == (10, 2000)
+    assert len(large) == len(small), large
+    assert len(large) <= 6, large